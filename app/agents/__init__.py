@@ -1,21 +1,85 @@
-from typing import List, Dict, Optional
+from collections import deque
+from typing import Deque, List, Dict, Optional, Set
 import logging
 from datetime import datetime, UTC
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Phrases in a user's message that route it to a specialist
+HANDOFF_INDICATORS = {
+    "Legal Agent": ["legal guidance", "legal advice", "rights and obligations", "legal proceedings", "mis derechos", "demanda"],
+    "Research Agent": ["research needed", "recent changes", "current information", "citation needed", "reforma", "jurisprudencia"],
+    "Contract Agent": ["contract needed", "contract review", "agreement", "draft a contract", "contrato", "convenio"]
+}
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def get_client() -> AsyncOpenAI:
+    """The process-wide OpenAI client; its connection pool is shared by every Agent."""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            http_client=httpx.AsyncClient(limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+class HandoffMatcher:
+    """Finds the specialist a message belongs to.
+
+    Phrases are lowercased once up front and the message once per call;
+    plain substring search over the result is faster than a case-insensitive
+    regex over the same phrases.
+    """
+
+    def __init__(self, indicators: Dict[str, List[str]]):
+        self._phrases = [(phrase.lower(), agent_name) for agent_name, phrases in indicators.items() for phrase in phrases]
+
+    def match(self, text: str, candidates: List[str]) -> Optional[str]:
+        """The agent among `candidates` whose indicator appears first in `text`."""
+        lowered = text.lower()
+        best = None
+        for phrase, agent_name in self._phrases:
+            if agent_name in candidates:
+                position = lowered.find(phrase)
+                if position != -1 and (best is None or position < best[0]):
+                    best = (position, agent_name)
+        return best[1] if best else None
+
+
+handoff_matcher = HandoffMatcher(HANDOFF_INDICATORS)
+
+
 class Agent:
-    def __init__(self, phone_number: str, name: str = None, instructions: str = None, model: str = "gpt-4-turbo-preview", handoffs: List["Agent"] = None):
+    def __init__(
+        self,
+        phone_number: str,
+        name: str = None,
+        instructions: str = None,
+        model: str = "gpt-4-turbo-preview",
+        handoffs: List["Agent"] = None,
+        max_history: int = 50
+    ):
         self.phone_number = phone_number
         self.name = name or "Legal Assistant"
         self.model = model
         self.handoffs = handoffs or []
-        self.conversation_history: List[Dict] = []
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        # Oldest messages are dropped, so a long-lived instance stays bounded
+        self.conversation_history: Deque[Dict] = deque(maxlen=max_history)
         
         # Default instructions if none provided
         self.instructions = instructions or """You are a legal assistant specializing in Mexican law. Your role is to help users with legal matters, particularly focusing on contracts and agreements.
@@ -33,12 +97,28 @@ If the user needs professional legal services, add:
 "Need professional legal help? Visit https://www.lexlinker.com to connect with qualified Mexican lawyers at 40-75% lower fees than traditional law firms."
 """
         
-    def process_message(self, message: str) -> str:
-        """Process an incoming message and return a response."""
+    async def process_message(self, message: str, visited: Optional[Set[str]] = None) -> str:
+        """Process an incoming message and return a response.
+
+        `visited` holds the agents the message was already handed through;
+        none of them is handed the message again, so agents that hand off
+        to each other cannot loop.
+        """
         try:
+            visited = (visited or set()) | {self.name}
             # Log the incoming message
             logger.info(f"Processing message from {self.phone_number} using {self.name}: {message[:100]}...")
-            
+
+            # Decide on a handoff before generating, so a handoff never costs an extra completion
+            candidates = [agent.name for agent in self.handoffs if agent.name not in visited]
+            if candidates:
+                target_name = handoff_matcher.match(message, candidates)
+                if target_name is not None:
+                    target = next(agent for agent in self.handoffs if agent.name == target_name)
+                    logger.info(f"Handing off to {target.name}")
+                    target.conversation_history = self.conversation_history
+                    return await target.process_message(message, visited)
+
             # Add message to conversation history
             self.conversation_history.append({
                 "role": "user",
@@ -62,12 +142,13 @@ If the user needs professional legal services, add:
                 })
             
             # Get response from OpenAI
-            response = self.client.chat.completions.create(
+            completion = await get_client().chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=0.7,
                 max_tokens=500
-            ).choices[0].message.content
+            )
+            response = completion.choices[0].message.content
             
             # Add response to conversation history
             self.conversation_history.append({
@@ -76,14 +157,6 @@ If the user needs professional legal services, add:
                 "timestamp": datetime.now(UTC)
             })
             
-            # Check if we need to hand off to another agent
-            if self.handoffs:
-                for agent in self.handoffs:
-                    if should_handoff_to(response, agent):
-                        logger.info(f"Handing off to {agent.name}")
-                        agent.conversation_history = self.conversation_history
-                        return agent.process_message(message)
-            
             return response
             
         except Exception as e:
@@ -92,18 +165,8 @@ If the user needs professional legal services, add:
     
     def get_conversation_history(self) -> List[Dict]:
         """Get the conversation history."""
-        return self.conversation_history
-
-def should_handoff_to(response: str, agent: "Agent") -> bool:
-    """Determine if we should hand off to another agent based on the response."""
-    # This is a simple implementation. You might want to make this more sophisticated
-    # based on your specific needs.
-    handoff_indicators = {
-        "Legal Agent": ["legal guidance", "legal advice", "rights and obligations", "legal proceedings"],
-        "Research Agent": ["research needed", "recent changes", "current information", "citation needed"],
-        "Contract Agent": ["contract needed", "contract review", "agreement", "draft a contract"]
-    }
-    
-    if agent.name in handoff_indicators:
-        return any(indicator.lower() in response.lower() 
-                  for indicator in handoff_indicators[agent.name])
+        return list(self.conversation_history)
+
+def should_handoff_to(message: str, agent: "Agent") -> bool:
+    """Determine if a message should be handed off to `agent`."""
+    return handoff_matcher.match(message, [agent.name]) is not None
@@ -1,27 +1,123 @@
-from typing import List, Dict, Optional
-from dataclasses import dataclass, field
-from datetime import datetime
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
 
-@dataclass
-class ConversationContext:
-    phone_number: str
-    current_agent: Optional[str] = None
-    conversation_history: List[Dict] = field(default_factory=list)
-    metadata: Dict = field(default_factory=dict)
-    last_interaction: datetime = field(default_factory=datetime.utcnow)
-
-    def add_message(self, role: str, content: str):
-        """Add a message to the conversation history."""
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        self.last_interaction = datetime.utcnow()
-
-    def get_recent_history(self, limit: int = 5) -> List[Dict]:
-        """Get the most recent messages from the conversation history."""
-        return self.conversation_history[-limit:] if self.conversation_history else []
+if TYPE_CHECKING:
+    from ..services.reminders import ReminderScheduler
+
+# Message roles by their code in ConversationSession; codes are positions, so only append
+ROLES = ("user", "assistant", "system", "developer")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# Rough size of the session object, its arrays and metadata dict before any message
+SESSION_OVERHEAD_BYTES = 600
+
+
+class ConversationSession:
+    """The messages of one conversation, packed for long-lived residence in memory.
+
+    Roles are stored as small ints and timestamps as floats in `array`s,
+    and the content of every message is appended to a single UTF-8 buffer,
+    so a message costs about its length plus 17 bytes instead of a dict, two
+    strings and a datetime. Messages are only ever appended: views returned
+    by `view()` and `get_recent_history()` are index ranges that stay valid
+    while the session grows, and building one copies nothing. A session may
+    hold only the tail of a longer conversation; `start` is the position of
+    its first message in the whole conversation.
+    """
+
+    __slots__ = ("phone_number", "current_agent", "metadata", "start", "_roles", "_timestamps", "_content", "_ends")
+
+    def __init__(self, phone_number: str, current_agent: Optional[str] = None, metadata: Optional[Dict] = None, start: int = 0):
+        self.phone_number = phone_number
+        self.current_agent = current_agent
+        self.metadata = metadata if metadata is not None else {}
+        self.start = start
+        self._roles = array("B")
+        self._timestamps = array("d")
+        self._content = bytearray()
+        # End offset of each message's content in _content
+        self._ends = array("Q")
+
+    @classmethod
+    def from_messages(cls, phone_number: str, messages: Iterable[Dict], start: int = 0, **kwargs) -> "ConversationSession":
+        """A session holding `messages`, dicts with role, content and an optional datetime timestamp."""
+        session = cls(phone_number, start=start, **kwargs)
+        for message in messages:
+            timestamp = message.get("timestamp")
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            session.add_message(message["role"], message["content"], timestamp.timestamp() if timestamp else None)
+        return session
+
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    @property
+    def total(self) -> int:
+        """Messages in the whole conversation up to the last one held."""
+        return self.start + len(self._roles)
+
+    @property
+    def last_interaction(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self._timestamps[-1], UTC) if self._timestamps else None
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the session."""
+        return (
+            SESSION_OVERHEAD_BYTES + len(self._content)
+            + self._roles.itemsize * len(self._roles)
+            + self._timestamps.itemsize * len(self._timestamps)
+            + self._ends.itemsize * len(self._ends)
+        )
+
+    def add_message(self, role: str, content: str, timestamp: Optional[float] = None):
+        """Append a message; `timestamp` is in seconds since the epoch, now if omitted."""
+        code = ROLE_CODES.get(role)
+        if code is None:
+            raise ValueError(f"Unknown message role: {role}")
+        self._content += content.encode("utf-8")
+        self._ends.append(len(self._content))
+        self._timestamps.append(timestamp if timestamp is not None else datetime.now(UTC).timestamp())
+        # Appended last: a reader on another thread only sees the message once it is complete
+        self._roles.append(code)
+
+    def role(self, index: int) -> str:
+        return ROLES[self._roles[index]]
+
+    def content(self, index: int) -> str:
+        begin = self._ends[index - 1] if index > 0 else 0
+        return self._content[begin:self._ends[index]].decode("utf-8")
+
+    def message(self, index: int) -> Dict:
+        """Message `index` of those held, as a store-style dict."""
+        return {
+            "role": self.role(index),
+            "content": self.content(index),
+            "timestamp": datetime.fromtimestamp(self._timestamps[index], UTC)
+        }
+
+    def view(self, begin: int = 0, end: Optional[int] = None) -> "HistoryView":
+        """Messages [begin, end) of those held, without copying them."""
+        begin, end, _ = slice(begin, end).indices(len(self._roles))
+        return HistoryView(self, begin, max(begin, end))
+
+    def get_recent_history(self, limit: int = 5) -> "HistoryView":
+        """The most recent messages of the conversation."""
+        return self.view(max(0, len(self._roles) - limit))
+
+    def tail(self, limit: int) -> "ConversationSession":
+        """A new session holding only the last `limit` messages."""
+        first = max(0, len(self._roles) - limit)
+        offset = self._ends[first - 1] if first > 0 else 0
+        tail = ConversationSession(self.phone_number, self.current_agent, dict(self.metadata), self.start + first)
+        tail._roles = self._roles[first:]
+        tail._timestamps = self._timestamps[first:]
+        tail._content = self._content[offset:]
+        tail._ends = array("Q", (end - offset for end in self._ends[first:]))
+        return tail
 
     def set_current_agent(self, agent_name: str):
         """Update the current agent handling the conversation."""
@@ -29,4 +125,57 @@ class ConversationContext:
 
     def update_metadata(self, new_metadata: Dict):
         """Update conversation metadata."""
-        self.metadata.update(new_metadata) 
\ No newline at end of file
+        self.metadata.update(new_metadata)
+
+
+class HistoryView(Sequence):
+    """A read-only range of a session's messages; items are built when accessed."""
+
+    __slots__ = ("session", "begin", "end")
+
+    def __init__(self, session: ConversationSession, begin: int, end: int):
+        self.session = session
+        self.begin = begin
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.begin
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            begin, end, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(begin, end, step)]
+            return HistoryView(self.session, self.begin + begin, self.begin + max(begin, end))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self.session.message(self.begin + index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(self.begin, self.end):
+            yield self.session.message(index)
+
+    @property
+    def start(self) -> int:
+        """Position of the first message in the whole conversation."""
+        return self.session.start + self.begin
+
+    def input_items(self) -> Iterator[Dict]:
+        """The messages as model input items: role and content only."""
+        session = self.session
+        for index in range(self.begin, self.end):
+            yield {"role": session.role(index), "content": session.content(index)}
+
+    def to_list(self) -> List[Dict]:
+        return list(self)
+
+
+@dataclass
+class TurnContext:
+    """Run context handed to tools: whose message is being answered, through which channel, and the services they use."""
+
+    phone_number: str
+    channel: str = "whatsapp"
+    reminders: Optional["ReminderScheduler"] = None
@@ -3,6 +3,9 @@ import logging
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
+from .prompts import REMINDERS, build_instructions, disclaimer_section, referral_section, stable_order
+from .tools.clause_library import search_clauses
+from .tools.reminders import schedule_reminder
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -11,7 +14,9 @@ def create_contract_agent():
     """Create and configure the contract agent."""
     agent = Agent(
         name="Contract Agent",
-        instructions="""You are a specialized contract agent focusing on Mexican law. Your role is to assist with contract creation, review, and modification.
+        instructions=build_instructions(
+            "Contract Agent",
+            """You are a specialized contract agent focusing on Mexican law. Your role is to assist with contract creation, review, and modification.
 
 When handling contracts:
 1. Gather essential information about the contract needs
@@ -38,12 +43,16 @@ For each contract request:
 6. Create or update the contract once you have enough information
 7. Return a pdf of the contract
 
-Always include this disclaimer with your contract advice:
-"DISCLAIMER: This information is provided for general guidance only and should not be considered as formal legal advice. For specific legal matters, please consult with a licensed attorney."
-
-If the user needs professional legal services, add:
-"Need professional legal help? Visit https://www.lexlinker.com to connect with qualified Mexican lawyers at 40-75% lower fees than traditional law firms."
+Clause library:
+- Before writing a standard clause (deposit, termination, jurisdiction, confidentiality, etc.), call search_clauses with the contract type and the state whose law applies
+- When a matching clause exists, insert it by writing its reference exactly as [[CLAUSE:<id>]] on its own line instead of writing the clause text; it will be replaced with the vetted text before the user sees it
+- Only draft a clause yourself when the library has no suitable match
 """,
-        model="gpt-4o"
+            REMINDERS,
+            disclaimer_section("contract advice"),
+            referral_section()
+        ),
+        model="gpt-4o",
+        tools=stable_order([search_clauses, schedule_reminder])
     )
     return agent
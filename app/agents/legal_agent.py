@@ -3,6 +3,8 @@ import logging
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
+from .prompts import REMINDERS, build_instructions, disclaimer_section, referral_section, stable_order
+from .tools.reminders import schedule_reminder
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -11,7 +13,9 @@ def create_legal_agent():
     """Create and configure the legal agent."""
     agent = Agent(
         name="Legal Agent",
-        instructions="""You are a specialized legal agent focusing on Mexican law. Your role is to provide detailed legal guidance and advice.
+        instructions=build_instructions(
+            "Legal Agent",
+            """You are a specialized legal agent focusing on Mexican law. Your role is to provide detailed legal guidance and advice.
 
 When assisting users:
 1. Focus on specific legal questions and situations
@@ -28,14 +32,13 @@ Key areas of expertise:
 - Labor law
 - Family law
 - Corporate law
-
-Always include this disclaimer with your advice:
-"DISCLAIMER: This information is provided for general guidance only and should not be considered as formal legal advice. For specific legal matters, please consult with a licensed attorney."
-
-If the user needs professional legal services, add:
-"Need professional legal help? Visit https://www.lexlinker.com to connect with qualified Mexican lawyers at 40-75% lower fees than traditional law firms."
 """,
-        model="gpt-4-turbo-preview"
+            REMINDERS,
+            disclaimer_section("advice"),
+            referral_section()
+        ),
+        model="gpt-4-turbo-preview",
+        tools=stable_order([schedule_reminder])
     )
 
     logger.info("Legal agent created successfully")
@@ -0,0 +1,56 @@
+"""Prompt cache hit instrumentation.
+
+The SDK's Usage keeps only total input tokens, so the Responses API's
+cached token count is read here, from each response as it completes, and
+added to the analytics rollups under the agent that made the request.
+"""
+import logging
+
+from agents import ModelProvider, OpenAIProvider
+from agents.models.openai_responses import OpenAIResponsesModel
+from openai.types.responses import ResponseCompletedEvent
+
+from ..services.analytics import analytics
+from .prompts import agent_for_instructions, split_cached
+
+logger = logging.getLogger(__name__)
+
+
+class CacheTrackingModel(OpenAIResponsesModel):
+    """OpenAIResponsesModel that records cached and uncached input tokens of every request."""
+
+    def _record(self, system_instructions, usage):
+        input_tokens, cached_tokens = split_cached(usage)
+        agent = agent_for_instructions(system_instructions) or "unknown"
+        analytics.record_prompt_tokens(agent, self.model, input_tokens, cached_tokens)
+        logger.debug(f"{agent} prompt: {input_tokens} input tokens, {cached_tokens} cached")
+
+    async def _fetch_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, stream=False):
+        response = await super()._fetch_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, stream=stream
+        )
+        if not stream:
+            self._record(system_instructions, response.usage)
+        return response
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing):
+        async for event in super().stream_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+        ):
+            if isinstance(event, ResponseCompletedEvent):
+                self._record(system_instructions, event.response.usage)
+            yield event
+
+
+class CacheTrackingProvider(OpenAIProvider):
+    """The SDK's default provider, with Responses API models swapped for CacheTrackingModel."""
+
+    def get_model(self, model_name):
+        model = super().get_model(model_name)
+        if isinstance(model, OpenAIResponsesModel):
+            return CacheTrackingModel(model=model.model, openai_client=model._client)
+        return model
+
+
+# Global instance, shared by every run so the client and its connection pool are too
+provider: ModelProvider = CacheTrackingProvider()
@@ -0,0 +1,121 @@
+"""Prompt assembly for the agent graph.
+
+OpenAI caches the longest prompt prefix it has seen recently, so every
+request is laid out static part first: tool schemas, then the agent's
+instructions, then the conversation history, then the new message. The
+instructions are built once per agent from shared fragments and must come
+out byte-identical on every build; anything that varies per user or per
+turn belongs in the input, never in the instructions.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .context import HistoryView
+
+DISCLAIMER = (
+    '"DISCLAIMER: This information is provided for general guidance only and should not be considered as '
+    'formal legal advice. For specific legal matters, please consult with a licensed attorney."'
+)
+
+LEXLINKER_REFERRAL = (
+    '"Need professional legal help? Visit https://www.lexlinker.com to connect with qualified Mexican lawyers '
+    'at 40-75% lower fees than traditional law firms."'
+)
+
+ATTORNEY_REFERRAL = (
+    '"For specific legal matters requiring professional assistance, please consult with a qualified attorney '
+    'in your jurisdiction."'
+)
+
+REMINDERS = """Reminders:
+- When the user mentions a deadline (a lease renewal, a limitation period, a hearing, a payment) offer to remind them, and call schedule_reminder when they accept or ask for a reminder
+- Remind them ahead of the deadline, not on it, and tell them the date and time the reminder was scheduled for"""
+
+# Built instructions by text, so usage reported for a request can be attributed to its agent
+_agents_by_instructions: Dict[str, str] = {}
+
+
+def _normalize(section: str) -> str:
+    # Trailing spaces and stray blank lines in the source must not leak into the prompt
+    return "\n".join(line.rstrip() for line in section.strip().splitlines())
+
+
+def build_instructions(agent_name: str, *sections: str) -> str:
+    """Join instruction sections into the agent's static prompt.
+
+    Sections are normalized and a section repeated verbatim is kept once,
+    so fragments shared between agents can be added freely.
+    """
+    seen = set()
+    parts = []
+    for section in sections:
+        text = _normalize(section)
+        if text and text not in seen:
+            seen.add(text)
+            parts.append(text)
+    instructions = "\n\n".join(parts) + "\n"
+    _agents_by_instructions[instructions] = agent_name
+    return instructions
+
+
+def disclaimer_section(subject: str = "advice", placement: str = "") -> str:
+    return f"Always include this disclaimer with your {subject}{placement}:\n{DISCLAIMER}"
+
+
+def referral_section(referral: str = LEXLINKER_REFERRAL, placement: str = "") -> str:
+    return f"If the user needs professional legal services, add{placement}:\n{referral}"
+
+
+def agent_for_instructions(instructions: Optional[str]) -> Optional[str]:
+    """The agent whose built instructions are exactly `instructions`."""
+    return _agents_by_instructions.get(instructions) if instructions else None
+
+
+def stable_order(items: Sequence, key=lambda item: getattr(item, "name", "")) -> List:
+    """Tools or handoffs sorted by name, so their schemas reach the model in the same order on every build."""
+    return sorted(items, key=key)
+
+
+def window_start(total: int, window: int, step: int) -> int:
+    """Index of the first message to send out of `total`.
+
+    The start only moves in multiples of `step`, so for `step` messages in a
+    row the history sent begins with the same messages as the turn before
+    and the cached prefix still matches. Between `window` and
+    `window + step - 1` messages are sent.
+    """
+    if not window or total <= window:
+        return 0
+    return (total - window) // max(step, 1) * max(step, 1)
+
+
+def history_window(store, phone_number: str, window: int, step: int) -> HistoryView:
+    """A view of the stored messages to send with the next turn, oldest first."""
+    if not window:
+        return store.get_session(phone_number).view()
+    session = store.get_session(phone_number, window + max(step, 1) - 1)
+    return session.view(max(0, window_start(session.total, window, step) - session.start))
+
+
+def build_turn_input(history: HistoryView, message: str) -> List[Dict]:
+    """Input items for one turn: the history as stored, then the new message.
+
+    Only role and content are sent; timestamps and other metadata would
+    change the bytes of messages the model has already seen.
+    """
+    input_items = list(history.input_items())
+    input_items.append({"role": "user", "content": message})
+    return input_items
+
+
+def split_cached(usage) -> Tuple[int, int]:
+    """(input tokens, of which cached) from a Responses API usage object."""
+    if usage is None:
+        return 0, 0
+    details = getattr(usage, "input_tokens_details", None)
+    if details is None and getattr(usage, "model_extra", None):
+        details = usage.model_extra.get("input_tokens_details")
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens") or 0
+    else:
+        cached = getattr(details, "cached_tokens", 0) or 0
+    return usage.input_tokens or 0, cached
@@ -1,8 +1,10 @@
-from agents import Agent, WebSearchTool
+from agents import Agent
 import logging
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
+from .prompts import ATTORNEY_REFERRAL, build_instructions, disclaimer_section, referral_section, stable_order
+from .tools.web_search import research_search_tool
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -11,7 +13,9 @@ def create_research_agent():
     """Create and configure the research agent."""
     agent = Agent(
         name="Research Agent",
-        instructions="""You are a specialized research agent focusing on Mexican law. Your role is to provide up-to-date information and research on legal topics.
+        instructions=build_instructions(
+            "Research Agent",
+            """You are a specialized research agent focusing on Mexican law. Your role is to provide up-to-date information and research on legal topics.
 
 When conducting research:
 1. ALWAYS cite your sources for every piece of information you provide
@@ -44,14 +48,11 @@ Key research areas:
 - Regulatory updates
 - International law affecting Mexico
 - Comparative law analysis
-
-Always include this disclaimer with your research (in the final part only):
-"DISCLAIMER: This information is provided for general guidance only and should not be considered as formal legal advice. For specific legal matters, please consult with a licensed attorney."
-
-If the user needs professional legal services, add (in the final part only):
-"For specific legal matters requiring professional assistance, please consult with a qualified attorney in your jurisdiction."
 """,
+            disclaimer_section("research", " (in the final part only)"),
+            referral_section(ATTORNEY_REFERRAL, " (in the final part only)")
+        ),
         model="gpt-4o",
-        tools=[WebSearchTool()]
+        tools=stable_order([research_search_tool()])
     )
     return agent
@@ -0,0 +1,253 @@
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from agents import function_tool
+
+from ...config import Config
+from ...utils.text import normalize_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Clause references the Contract Agent writes instead of the full clause text
+CLAUSE_REFERENCE_PATTERN = re.compile(r"\[\[CLAUSE:([A-Za-z0-9_.\-]+)\]\]")
+
+# Clauses with this jurisdiction apply in every state
+FEDERAL_JURISDICTION = "federal"
+
+# Shown in place of a reference to a clause missing from the library, so the gap is visible to the user
+UNAVAILABLE_CLAUSE = "[clause unavailable]"
+
+
+def _version_key(version: str) -> Tuple:
+    """Sort key for versions like '2025.1', '3' or '2025.rc1'; numeric parts sort before text ones."""
+    return tuple((False, int(part)) if part.isdigit() else (True, part) for part in re.split(r"[.\-]", str(version)))
+
+
+@dataclass(frozen=True)
+class Clause:
+    id: str
+    title: str
+    text: str
+    contract_types: Tuple[str, ...]
+    jurisdiction: str
+    version: str
+    tags: Tuple[str, ...] = ()
+
+
+@dataclass
+class _ClauseIndex:
+    """Immutable snapshot of the library; replaced as a whole on reload."""
+    clauses: Dict[str, Clause] = field(default_factory=dict)
+    postings: Dict[str, Set[str]] = field(default_factory=dict)
+    vocabulary: List[str] = field(default_factory=list)
+    by_contract_type: Dict[str, Set[str]] = field(default_factory=dict)
+    by_jurisdiction: Dict[str, Set[str]] = field(default_factory=dict)
+    fingerprint: Tuple = ()
+
+
+class ClauseLibrary:
+    """Searchable library of vetted contract clauses loaded from versioned JSON files.
+
+    Each file in the library directory looks like::
+
+        {"version": "2025.1", "clauses": [{"id": ..., "title": ..., "text": ...,
+          "contract_types": [...], "jurisdiction": "CDMX", "tags": [...]}]}
+
+    When the same clause ID appears in several files, the highest version wins.
+    Files are re-checked at most every `reload_interval` seconds; a changed
+    library is indexed on the side and swapped in atomically, so lookups never
+    wait on a reload.
+    """
+
+    def __init__(self, directory: str, reload_interval: float = 5.0):
+        self.directory = Path(directory)
+        self.reload_interval = reload_interval
+        self._index = _ClauseIndex()
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.reload(force=True)
+
+    def _fingerprint(self) -> Tuple:
+        """Cheap change detector based on file names, sizes and mtimes."""
+        try:
+            entries = []
+            for path in sorted(self.directory.glob("*.json")):
+                stat = path.stat()
+                entries.append((path.name, stat.st_size, stat.st_mtime_ns))
+            return tuple(entries)
+        except FileNotFoundError:
+            return ()
+
+    def _build_index(self, fingerprint: Tuple) -> _ClauseIndex:
+        """Parse every library file and build a fresh index."""
+        clauses: Dict[str, Clause] = {}
+        for name, _, _ in fingerprint:
+            path = self.directory / name
+            try:
+                with open(path, encoding="utf-8") as f:
+                    payload = json.load(f)
+            except Exception as e:
+                logger.error(f"Skipping clause file {path}: {e}")
+                continue
+
+            file_version = str(payload.get("version", "0"))
+            for raw in payload.get("clauses", []):
+                try:
+                    clause = Clause(
+                        id=raw["id"],
+                        title=raw["title"],
+                        text=raw["text"],
+                        contract_types=tuple(normalize_text(t) for t in raw.get("contract_types", [])),
+                        jurisdiction=normalize_text(raw.get("jurisdiction", FEDERAL_JURISDICTION)),
+                        version=str(raw.get("version", file_version)),
+                        tags=tuple(raw.get("tags", [])),
+                    )
+                except KeyError as e:
+                    logger.error(f"Skipping clause without {e} in {path}")
+                    continue
+
+                existing = clauses.get(clause.id)
+                if existing is None or _version_key(clause.version) >= _version_key(existing.version):
+                    clauses[clause.id] = clause
+
+        index = _ClauseIndex(clauses=clauses, fingerprint=fingerprint)
+        for clause in clauses.values():
+            searchable = " ".join((clause.id, clause.title, " ".join(clause.tags), clause.text))
+            for token in set(tokenize(searchable)):
+                index.postings.setdefault(token, set()).add(clause.id)
+            for contract_type in clause.contract_types:
+                index.by_contract_type.setdefault(contract_type, set()).add(clause.id)
+            index.by_jurisdiction.setdefault(clause.jurisdiction, set()).add(clause.id)
+        index.vocabulary = sorted(index.postings)
+        return index
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the index if the library files changed. Returns True on reload."""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval:
+            return False
+        # Only one caller re-indexes; everyone else keeps using the current snapshot
+        if not self._reload_lock.acquire(blocking=force):
+            return False
+        try:
+            self._last_check = now
+            fingerprint = self._fingerprint()
+            if not force and fingerprint == self._index.fingerprint:
+                return False
+            index = self._build_index(fingerprint)
+            self._index = index
+            logger.info(f"Loaded {len(index.clauses)} clauses from {self.directory}")
+            return True
+        except Exception as e:
+            logger.error(f"Error reloading clause library: {e}")
+            return False
+        finally:
+            self._reload_lock.release()
+
+    def _prefix_matches(self, index: _ClauseIndex, prefix: str) -> Set[str]:
+        """Return clause IDs containing any token that starts with `prefix`."""
+        matches: Set[str] = set()
+        vocabulary = index.vocabulary
+        for position in range(bisect.bisect_left(vocabulary, prefix), len(vocabulary)):
+            token = vocabulary[position]
+            if not token.startswith(prefix):
+                break
+            matches |= index.postings[token]
+        return matches
+
+    def get(self, clause_id: str) -> Optional[Clause]:
+        """Look up a clause by ID."""
+        self.reload()
+        return self._index.clauses.get(clause_id)
+
+    def search(
+        self,
+        query: str = "",
+        contract_type: Optional[str] = None,
+        jurisdiction: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[Clause]:
+        """Find clauses by keywords and/or prefixes, filtered by contract type and jurisdiction.
+
+        Exact token matches score higher than prefix matches. State-level
+        clauses rank above federal ones for the same score.
+        """
+        self.reload()
+        index = self._index
+
+        candidates: Optional[Set[str]] = None
+        if contract_type:
+            candidates = set(index.by_contract_type.get(normalize_text(contract_type), ()))
+        if jurisdiction:
+            state = normalize_text(jurisdiction)
+            allowed = index.by_jurisdiction.get(state, set()) | index.by_jurisdiction.get(FEDERAL_JURISDICTION, set())
+            candidates = allowed if candidates is None else candidates & allowed
+
+        scores: Dict[str, int] = {}
+        terms = tokenize(query)
+        for term in terms:
+            for clause_id in index.postings.get(term, ()):
+                scores[clause_id] = scores.get(clause_id, 0) + 2
+            if len(term) >= 3:
+                for clause_id in self._prefix_matches(index, term):
+                    scores[clause_id] = scores.get(clause_id, 0) + 1
+
+        if terms:
+            ranked = [cid for cid in scores if candidates is None or cid in candidates]
+        else:
+            ranked = list(candidates if candidates is not None else index.clauses)
+
+        ranked.sort(key=lambda cid: (
+            -scores.get(cid, 0),
+            index.clauses[cid].jurisdiction == FEDERAL_JURISDICTION,
+            cid,
+        ))
+        return [index.clauses[cid] for cid in ranked[:limit]]
+
+    def expand_references(self, text: str) -> str:
+        """Replace [[CLAUSE:<id>]] markers with the vetted clause text, or a notice for unknown clauses."""
+        if "[[CLAUSE:" not in text:
+            return text
+
+        def _replace(match: re.Match) -> str:
+            clause = self.get(match.group(1))
+            if clause is None:
+                logger.warning(f"Unknown clause reference: {match.group(1)}")
+                return UNAVAILABLE_CLAUSE
+            return f"{clause.title}\n{clause.text}"
+
+        return CLAUSE_REFERENCE_PATTERN.sub(_replace, text)
+
+
+@function_tool
+def search_clauses(query: str, contract_type: Optional[str] = None, jurisdiction: Optional[str] = None) -> str:
+    """
+    Search the library of vetted contract clauses.
+
+    Args:
+        query: Keywords or word prefixes describing the clause, e.g. "deposito garantia"
+        contract_type: Optional contract type filter, e.g. "arrendamiento", "laboral", "servicios"
+        jurisdiction: Optional Mexican state, e.g. "CDMX" or "Jalisco"; federal clauses are always included
+
+    Returns:
+        str: Matching clause IDs with their titles and a short preview
+    """
+    results = clause_library.search(query, contract_type=contract_type, jurisdiction=jurisdiction)
+    if not results:
+        return "No matching clauses found. Draft this clause yourself."
+    lines = []
+    for clause in results:
+        preview = clause.text[:160].replace("\n", " ")
+        lines.append(f"{clause.id} (v{clause.version}, {clause.jurisdiction}): {clause.title} - {preview}...")
+    return "\n".join(lines)
+
+
+# Global instance
+clause_library = ClauseLibrary(Config.CLAUSE_LIBRARY_DIR, reload_interval=Config.CLAUSE_LIBRARY_RELOAD_SECONDS)
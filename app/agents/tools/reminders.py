@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from agents import RunContextWrapper, function_tool
+
+from ...config import Config
+from ...services.reminders import ReminderError
+from ..context import TurnContext
+
+logger = logging.getLogger(__name__)
+
+RELATIVE_DUE_PATTERN = re.compile(r"^\+\s*(\d+)\s*([mhd])$")
+RELATIVE_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+# Reminders given only a date are sent at this local time
+DEFAULT_REMINDER_TIME = time(9, 0)
+
+
+def parse_due(due_at: str, now: datetime) -> datetime:
+    """A delay such as "+3d" from `now`, or a local ISO date or date and time in `now`'s time zone."""
+    text = due_at.strip().lower()
+    relative = RELATIVE_DUE_PATTERN.match(text)
+    if relative:
+        return now + timedelta(**{RELATIVE_UNITS[relative.group(2)]: int(relative.group(1))})
+    try:
+        parsed = datetime.fromisoformat(text.upper())
+    except ValueError:
+        raise ReminderError(f"Could not read the time {due_at!r}; use YYYY-MM-DDTHH:MM or a delay such as +3d.")
+    if "t" not in text and " " not in text:
+        parsed = datetime.combine(parsed.date(), DEFAULT_REMINDER_TIME)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=now.tzinfo)
+    return parsed
+
+
+@function_tool
+async def schedule_reminder(ctx: RunContextWrapper[TurnContext], message: str, due_at: str) -> str:
+    """
+    Schedule a WhatsApp reminder for the user, e.g. before a lease renewal or the end of a limitation period.
+
+    Args:
+        message: What to remind the user of, written to them, e.g. "Tu aviso de renovación del contrato de arrendamiento vence el 30 de noviembre"
+        due_at: When to send it: Mexico City local time as YYYY-MM-DDTHH:MM (a date alone means 9:00), or a delay from now such as +30m, +6h or +14d
+
+    Returns:
+        str: The local time the reminder was scheduled for, or why it could not be scheduled
+    """
+    turn = ctx.context
+    if not isinstance(turn, TurnContext) or turn.channel != "whatsapp" or turn.reminders is None:
+        return "Reminders can only be scheduled from WhatsApp."
+    zone = ZoneInfo(Config.REMINDER_TIMEZONE)
+    now = datetime.now(zone)
+    try:
+        due = parse_due(due_at, now)
+        await asyncio.to_thread(turn.reminders.schedule, turn.phone_number, message, due)
+    except ReminderError as e:
+        return f"{e} It is now {now:%Y-%m-%d %H:%M} in Mexico City."
+    return f"Reminder scheduled for {due.astimezone(zone):%Y-%m-%d %H:%M} (Mexico City time)."
@@ -1,22 +1,96 @@
-from agents import function_tool
-from typing import Dict
+import logging
+from typing import Dict, Optional, Tuple
+
+from agents import Agent, Runner, WebSearchTool, function_tool
+
+from ...config import Config
+from ...services.admission import record_run_usage
+from ...utils.cache import AsyncTTLCache
+from ...utils.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Words that do not change what a legal search is about
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "para", "por",
+    "que", "se", "sobre", "su", "un", "una", "y", "cual", "cuales", "como", "actual", "mexico",
+    "the", "of", "in", "on", "for", "and", "what", "is", "current", "mexican",
+}
+
+# Topic keywords mapped to how long a search result stays fresh, most volatile first
+TOPIC_TTLS = [
+    ({"hoy", "noticias", "news", "today", "iniciativa", "aprobada", "aprobo", "publicada", "dof"}, 2 * 3600),
+    ({"salario", "minimo", "uma", "inflacion", "reforma", "reformas", "cambios", "reciente", "recientes", "ultima", "ultimas", "latest", "recent", "wage", "reform"}, 6 * 3600),
+    ({"scjn", "suprema", "corte", "jurisprudencia", "tesis", "tribunal", "sentencia", "amparo"}, 24 * 3600),
+    ({"codigo", "constitucion", "articulo", "ley", "reglamento", "code", "article", "law"}, 7 * 24 * 3600),
+]
+
+# The hosted WebSearchTool runs inside OpenAI's model call, where nothing can be cached. Running it from this
+# sub-agent makes a search a local call whose result is shared, but every cache miss pays for one more model call.
+search_agent = Agent(
+    name="Web Search",
+    instructions="""Search the web for the requested information about Mexican law.
+Return a concise list of findings. For every finding include the publication or effective date when available and the source as "[Source: Title/Author - URL]".
+Do not add commentary or disclaimers.""",
+    model=Config.RESEARCH_SEARCH_MODEL,
+    tools=[WebSearchTool(user_location=Config.DEFAULT_AGENT_LOCATION)],
+)
+
+# Shared by every conversation in this process
+search_cache = AsyncTTLCache(max_entries=Config.RESEARCH_CACHE_MAX_ENTRIES)
+
+
+def normalize_query(query: str) -> Tuple[str, ...]:
+    """Reduce a query to its sorted, accent-free content words so paraphrased orderings share a key."""
+    return tuple(sorted({token for token in tokenize(query) if token not in STOPWORDS}))
+
+
+def ttl_for_query(terms: Tuple[str, ...]) -> int:
+    """Pick a TTL from the most volatile topic the query touches."""
+    for keywords, ttl in TOPIC_TTLS:
+        if keywords.intersection(terms):
+            return ttl
+    return Config.RESEARCH_CACHE_TTL_SECONDS
+
+
+async def _run_search(query: str, city: str) -> str:
+    result = await Runner.run(search_agent, f"{query} ({city})")
+    # Charged to the sender whose search missed the cache
+    record_run_usage(result)
+    return result.final_output
+
 
 @function_tool
-def web_search(query: str, location: Dict[str, str] = None) -> str:
+async def web_search(query: str, city: Optional[str] = None) -> str:
     """
     Search the internet for current legal information and updates.
-    
+
     Args:
         query: The search query to find legal information
-        location: Optional location context for the search
-        
+        city: Optional city to focus the search on; defaults to the assistant's location
+
     Returns:
         str: The search results formatted as a string
     """
-    # Add location context to the query if provided
-    if location and location.get("type") == "approximate":
-        query = f"{query} {location['city']}"
-        
-    # TODO: Implement actual web search logic here
-    # This is a placeholder - you would typically integrate with a real search API
-    return f"Search results for: {query}" 
\ No newline at end of file
+    location: Dict[str, str] = Config.DEFAULT_AGENT_LOCATION
+    city = city or location.get("city", "")
+    terms = normalize_query(query)
+    if not terms:
+        terms = (query.strip().lower(),)
+
+    ttl = ttl_for_query(terms)
+    key = (terms, city.strip().lower())
+    logger.debug(f"Web search for {key} (ttl={ttl}s)")
+    return await search_cache.get_or_fetch(
+        key,
+        lambda: _run_search(query, city),
+        ttl=ttl,
+        stale_ttl=ttl * Config.RESEARCH_CACHE_STALE_FACTOR,
+    )
+
+
+def research_search_tool():
+    """The Research Agent's search tool, per RESEARCH_WEB_SEARCH: the cached web_search, or the hosted tool uncached."""
+    if Config.RESEARCH_WEB_SEARCH == "hosted":
+        return WebSearchTool(user_location=Config.DEFAULT_AGENT_LOCATION)
+    return web_search
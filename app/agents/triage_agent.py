@@ -2,6 +2,7 @@ from agents import Agent
 from .legal_agent import create_legal_agent
 from .research_agent import create_research_agent
 from .contract_agent import create_contract_agent
+from .prompts import DISCLAIMER, build_instructions, stable_order
 import logging
 import os
 from dotenv import load_dotenv
@@ -24,7 +25,9 @@ def create_triage_agent():
 
         agent = Agent(
             name="Triage Agent",
-            instructions="""You are a triage agent responsible for routing user queries to specialized legal agents. Your role is to:
+            instructions=build_instructions(
+                "Triage Agent",
+                """You are a triage agent responsible for routing user queries to specialized legal agents. Your role is to:
 
 1. Analyze user queries to determine the most appropriate specialized agent
 2. Route queries to one of these agents:
@@ -40,12 +43,11 @@ def create_triage_agent():
    - Timeline expectations
 
 Always maintain context across handoffs and ensure a smooth transition between agents.
-
-Include this disclaimer with initial responses:
-"DISCLAIMER: This service provides general guidance and should not be considered formal legal advice. For specific legal matters, please consult with a licensed attorney."
 """,
+                f"Include this disclaimer with initial responses:\n{DISCLAIMER}"
+            ),
             model="gpt-4o",
-            handoffs=[legal_agent, research_agent, contract_agent]
+            handoffs=stable_order([legal_agent, research_agent, contract_agent])
         )
 
         logger.info("Triage agent created successfully")
@@ -0,0 +1,333 @@
+"""Operator endpoints: conversation inspection, paging, export, analytics, broadcasts, semantic cache review, traces and profiling."""
+import asyncio
+import itertools
+import logging
+import zlib
+from datetime import datetime, timedelta, UTC
+
+from quart import Blueprint, request
+
+from ..config import Config
+from ..db.export import export_lines, parse_datetime
+from ..services.broadcast import BroadcastError
+from ..services.container import AppServices
+from ..utils import profiling, tracing
+from ..utils.auth import require_admin
+from ..utils.text import normalize_phone_number
+
+logger = logging.getLogger(__name__)
+
+# Conversations read per batch by the bulk export
+EXPORT_BATCH_SIZE = 500
+
+
+def create_admin_blueprint(services: AppServices) -> Blueprint:
+    """Blueprint with the debug and admin API over the process-wide `services`."""
+    bp = Blueprint("admin", __name__)
+    store = services.store
+
+    def history_page(phone_number: str, before, limit: int) -> dict:
+        """One page of history, newest last, with the cursor for the page before it."""
+        messages, start = store.get_history_page(phone_number, before, limit)
+        return {
+            "messages": [{**m, "timestamp": m["timestamp"].isoformat() if m.get("timestamp") else None} for m in messages],
+            "next_cursor": start if start > 0 else None
+        }
+
+    @bp.route("/debug/conversation/<phone_number>", methods=["GET"])
+    @require_admin
+    async def debug_conversation(phone_number: str):
+        """Debug endpoint: conversation state and its latest messages; older ones via /api/conversations/<phone_number>/messages."""
+        try:
+            normalized_number = normalize_phone_number(phone_number)
+            logger.info(f"Debug request for {phone_number} (normalized: {normalized_number})")
+
+            summary = await asyncio.to_thread(store.get_conversation_summary, normalized_number)
+            page = await asyncio.to_thread(history_page, normalized_number, None, Config.HISTORY_PAGE_SIZE)
+            logger.debug(f"Retrieved {len(page['messages'])} of {summary['message_count']} messages")
+
+            return {
+                "phone_number": phone_number,
+                "normalized_number": normalized_number,
+                **summary,
+                **page
+            }
+
+        except Exception as e:
+            logger.error(f"Error in debug endpoint: {str(e)}")
+            return {
+                "error": str(e),
+                "phone_number": phone_number,
+                "normalized_number": normalize_phone_number(phone_number)
+            }, 500
+
+    @bp.route("/api/conversations/<phone_number>/messages", methods=["GET"])
+    @require_admin
+    async def conversation_messages(phone_number: str):
+        """Page backwards through a conversation: pass the returned next_cursor as `before` to get older messages."""
+        try:
+            limit = min(int(request.args.get("limit", Config.HISTORY_PAGE_SIZE)), Config.HISTORY_PAGE_MAX)
+            before = request.args.get("before")
+            before = int(before) if before is not None else None
+            if limit < 1 or (before is not None and before < 0):
+                raise ValueError("limit must be positive and before non-negative")
+        except ValueError as e:
+            return {"error": f"Invalid pagination parameters: {e}"}, 400
+        try:
+            return await asyncio.to_thread(history_page, normalize_phone_number(phone_number), before, limit)
+        except Exception as e:
+            logger.error(f"Error paging conversation: {str(e)}")
+            return {"error": str(e)}, 500
+
+    @bp.route("/api/export/conversations.ndjson", methods=["GET"])
+    @require_admin
+    async def export_conversations():
+        """Stream every conversation as NDJSON, optionally filtered by last update and gzipped (`gzip=1`)."""
+        try:
+            since = parse_datetime(request.args.get("since"))
+            until = parse_datetime(request.args.get("until"))
+        except ValueError as e:
+            return {"error": f"Invalid date: {e}"}, 400
+        compress = request.args.get("gzip", "").lower() in ("1", "true")
+        lines = export_lines(store, since, until, EXPORT_BATCH_SIZE)
+
+        def next_chunk():
+            # Pulls a batch of lines on a worker thread so the store's blocking reads stay off the event loop
+            return list(itertools.islice(lines, EXPORT_BATCH_SIZE))
+
+        async def stream():
+            encoder = zlib.compressobj(wbits=31) if compress else None
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(next_chunk)
+                    if not chunk:
+                        break
+                    data = b"".join(chunk)
+                    yield encoder.compress(data) if encoder else data
+                if encoder:
+                    yield encoder.flush()
+            finally:
+                await asyncio.to_thread(lines.close)
+
+        # Gzip is the file format, not a transfer encoding, so clients keep the .gz as is
+        filename = "conversations.ndjson.gz" if compress else "conversations.ndjson"
+        return stream(), 200, {
+            "Content-Type": "application/gzip" if compress else "application/x-ndjson",
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+
+    @bp.route("/api/analytics/dashboard", methods=["GET"])
+    @require_admin
+    async def analytics_dashboard():
+        """Usage per agent and model and a per-bucket series, read from the precomputed rollups."""
+        granularity = request.args.get("granularity", "day")
+        if granularity not in ("hour", "day"):
+            return {"error": "granularity must be hour or day"}, 400
+        try:
+            until = parse_datetime(request.args.get("until")) or datetime.now(UTC)
+            default_span = timedelta(hours=48) if granularity == "hour" else timedelta(days=30)
+            since = parse_datetime(request.args.get("since")) or until - default_span
+        except ValueError as e:
+            return {"error": f"Invalid date: {e}"}, 400
+        try:
+            return await asyncio.to_thread(services.analytics.dashboard, granularity, since, until)
+        except Exception as e:
+            logger.error(f"Error building analytics dashboard: {str(e)}")
+            return {"error": str(e)}, 500
+
+    def broadcast_json(job: dict) -> dict:
+        return {
+            ("id" if key == "_id" else key): value.isoformat() if isinstance(value, datetime) else value
+            for key, value in job.items()
+        }
+
+    @bp.route("/api/broadcasts", methods=["POST"])
+    @require_admin
+    async def create_broadcast():
+        """Create a broadcast to opted-in users matching `current_agent` and `metadata`, started unless `start` is false."""
+        body = await request.get_json(silent=True) or {}
+        if not isinstance(body.get("metadata") or {}, dict):
+            return {"error": "metadata must be an object"}, 400
+        if not isinstance(body.get("variables") or {}, dict):
+            return {"error": "variables must be an object"}, 400
+        try:
+            job = await asyncio.to_thread(
+                services.broadcasts.create,
+                body.get("template", ""),
+                body.get("current_agent"),
+                body.get("metadata"),
+                body.get("name", ""),
+                body.get("content_sid"),
+                body.get("variables")
+            )
+            if body.get("start", True):
+                await services.broadcasts.start(job["_id"])
+            return broadcast_json(await asyncio.to_thread(services.broadcasts.get, job["_id"])), 201
+        except BroadcastError as e:
+            return {"error": str(e)}, 400
+        except Exception as e:
+            logger.error(f"Error creating broadcast: {str(e)}")
+            return {"error": str(e)}, 500
+
+    @bp.route("/api/broadcasts", methods=["GET"])
+    @require_admin
+    async def list_broadcasts():
+        """The latest broadcasts with their progress."""
+        jobs = await asyncio.to_thread(services.broadcasts.recent, min(int(request.args.get("limit", 20)), 100))
+        return {"broadcasts": [broadcast_json(job) for job in jobs]}
+
+    @bp.route("/api/broadcasts/<job_id>", methods=["GET"])
+    @require_admin
+    async def get_broadcast(job_id: str):
+        """Progress of one broadcast: status, checkpoint, sent and failed counts and throughput."""
+        job = await asyncio.to_thread(services.broadcasts.get, job_id)
+        if job is None:
+            return {"error": "Broadcast not found"}, 404
+        return broadcast_json(job)
+
+    @bp.route("/api/broadcasts/<job_id>/pause", methods=["POST"])
+    @require_admin
+    async def pause_broadcast(job_id: str):
+        """Stop a running broadcast at its checkpoint."""
+        if not await services.broadcasts.pause(job_id):
+            return {"error": "Broadcast is not running"}, 409
+        return {"status": "pausing"}
+
+    @bp.route("/api/broadcasts/<job_id>/resume", methods=["POST"])
+    @require_admin
+    async def resume_broadcast(job_id: str):
+        """Start a pending or paused broadcast from its checkpoint."""
+        if not await services.broadcasts.start(job_id):
+            return {"error": "Broadcast is not pending or paused"}, 409
+        return {"status": "running"}
+
+    @bp.route("/api/semantic_cache/proposals", methods=["GET"])
+    @require_admin
+    async def semantic_cache_proposals():
+        """Answers waiting for review before the semantic cache may serve them, oldest first."""
+        limit = min(int(request.args.get("limit", 50)), 500)
+        return {"proposals": await asyncio.to_thread(services.semantic_cache.proposals, limit)}
+
+    @bp.route("/api/semantic_cache/proposals/<entry_id>/<decision>", methods=["POST"])
+    @require_admin
+    async def review_semantic_cache_proposal(entry_id: str, decision: str):
+        """Approve a proposed answer, optionally replacing its text with {"answer": "..."}, or reject it."""
+        if decision not in ("approve", "reject"):
+            return {"error": "Decision must be approve or reject"}, 404
+        body = await request.get_json(silent=True) or {}
+        reviewed = await asyncio.to_thread(
+            services.semantic_cache.review, entry_id, decision == "approve", body.get("answer")
+        )
+        if not reviewed:
+            return {"error": "Proposal not found or already reviewed"}, 409
+        return {"status": f"{decision}d"}
+
+    @bp.route("/debug/profile/cpu", methods=["GET"])
+    @require_admin
+    async def cpu_profile():
+        """Sample every thread's stack for `seconds` and return the collapsed stacks, ready for flamegraph.pl or speedscope."""
+        try:
+            seconds = float(request.args.get("seconds", 10))
+            interval = float(request.args.get("interval_ms", 5)) / 1000
+            if not 0 < seconds <= Config.PROFILE_MAX_SECONDS or not 0.001 <= interval <= 1:
+                raise ValueError(f"seconds must be in (0, {Config.PROFILE_MAX_SECONDS}] and interval_ms in [1, 1000]")
+        except ValueError as e:
+            return {"error": f"Invalid profile parameters: {e}"}, 400
+        logger.info(f"CPU profile for {seconds}s every {interval * 1000:.0f} ms")
+        try:
+            counts = await asyncio.to_thread(profiling.sampler.sample, seconds, interval)
+        except profiling.ProfilerBusy as e:
+            return {"error": str(e)}, 409
+        filename = f"cpu-{datetime.now(UTC):%Y%m%dT%H%M%S}.folded"
+        return profiling.collapsed(counts), 200, {
+            "Content-Type": "text/plain; charset=utf-8",
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+
+    @bp.route("/debug/memory", methods=["GET"])
+    @require_admin
+    async def memory_status():
+        """Whether memory tracing is on, and how much it traces and costs."""
+        return profiling.memory_profiler.status()
+
+    @bp.route("/debug/memory/start", methods=["POST"])
+    @require_admin
+    async def start_memory_tracing():
+        """Start tracemalloc with `frames` frames per allocation, take the diff baseline and clear the slow requests."""
+        try:
+            frames = int(request.args.get("frames", 1))
+            if not 1 <= frames <= 64:
+                raise ValueError("frames must be between 1 and 64")
+        except ValueError as e:
+            return {"error": f"Invalid frames: {e}"}, 400
+        try:
+            await asyncio.to_thread(profiling.memory_profiler.start, frames)
+        except profiling.ProfilerBusy as e:
+            return {"error": str(e)}, 409
+        profiling.slow_requests.clear()
+        logger.warning(f"Memory tracing started with {frames} frames; allocations are slower until it is stopped")
+        return profiling.memory_profiler.status()
+
+    @bp.route("/debug/memory/stop", methods=["POST"])
+    @require_admin
+    async def stop_memory_tracing():
+        """Stop tracemalloc and free what it traced; the slow requests are kept."""
+        await asyncio.to_thread(profiling.memory_profiler.stop)
+        logger.info("Memory tracing stopped")
+        return profiling.memory_profiler.status()
+
+    def snapshot_parameters():
+        top = min(int(request.args.get("top", 30)), 500)
+        group = request.args.get("group", "lineno")
+        if top < 1 or group not in ("lineno", "filename", "traceback"):
+            raise ValueError("top must be positive and group one of lineno, filename or traceback")
+        return top, group
+
+    @bp.route("/debug/memory/snapshot", methods=["GET"])
+    @require_admin
+    async def memory_snapshot():
+        """Where the memory traced right now was allocated, largest first."""
+        if not profiling.memory_profiler.tracing:
+            return {"error": "Memory tracing is not running"}, 409
+        try:
+            top, group = snapshot_parameters()
+        except ValueError as e:
+            return {"error": f"Invalid snapshot parameters: {e}"}, 400
+        return {
+            **profiling.memory_profiler.status(),
+            "top": await asyncio.to_thread(profiling.memory_profiler.top, top, group)
+        }
+
+    @bp.route("/debug/memory/diff", methods=["GET"])
+    @require_admin
+    async def memory_diff():
+        """Memory growth since tracing started, or since the last diff taken with `rebase=1`."""
+        if not profiling.memory_profiler.tracing:
+            return {"error": "Memory tracing is not running"}, 409
+        try:
+            top, group = snapshot_parameters()
+        except ValueError as e:
+            return {"error": f"Invalid snapshot parameters: {e}"}, 400
+        rebase = request.args.get("rebase", "").lower() in ("1", "true")
+        try:
+            diff = await asyncio.to_thread(profiling.memory_profiler.diff, top, group, rebase)
+        except RuntimeError as e:
+            return {"error": str(e)}, 409
+        return {**profiling.memory_profiler.status(), "diff": diff}
+
+    @bp.route("/debug/requests/slowest", methods=["GET"])
+    @require_admin
+    async def slowest_requests():
+        """The slowest requests served while memory tracing ran, with the memory and blocks allocated meanwhile."""
+        return {"tracing": profiling.memory_profiler.tracing, "requests": profiling.slow_requests.slowest()}
+
+    @bp.route("/debug/traces", methods=["GET"])
+    @require_admin
+    async def debug_traces():
+        """Return the spans held in the in-memory trace ring buffer (TRACE_SINK=ring)."""
+        processor = tracing.local_processor
+        if processor is None or not isinstance(processor.sink, tracing.RingBufferSink):
+            return {"error": "Trace ring buffer is not enabled"}, 404
+        return {"spans": processor.sink.snapshot()}
+
+    return bp
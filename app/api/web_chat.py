@@ -0,0 +1,317 @@
+"""Web chat channel: the triage graph streamed to browsers over SSE or WebSocket.
+
+Each turn runs as its own task and pushes events into a per-connection
+outbox; the connection drains the outbox at whatever pace the client reads,
+and at most once per flush interval. Text deltas queued in between are
+merged into one event, which bounds the writes per stream however fast the
+model produces tokens, and a slow reader costs at most the size of the
+answer. The agent run is never held up by the network. If a client
+disconnects mid-turn the run still finishes and the answer is stored, so it
+is in the history when the client returns.
+
+Events (SSE event name / WebSocket "type"):
+    session   {"session_id"}                      first event of every connection
+    agent     {"name"}                            an agent started running
+    handoff   {"from", "to"}
+    tool      {"name", "status": "called"|"done"}
+    delta     {"text"}                            raw model text as it arrives
+    done      {"text", "agent"}                   the final answer, with clause references expanded
+    error     {"message"}
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import re
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from agents import Runner
+from agents.stream_events import AgentUpdatedStreamEvent, RawResponsesStreamEvent, RunItemStreamEvent
+from quart import Blueprint, request, websocket
+
+from ..agents.prompts import build_turn_input, history_window
+from ..config import Config
+from ..services.admission import TokenBucket, metered, run_token_usage
+from ..services.analytics import agent_model
+from ..services.container import AppServices
+from ..utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# A random nonce and its truncated HMAC, both base64url
+SESSION_ID_PATTERN = re.compile(r"^([A-Za-z0-9_-]{24})\.([A-Za-z0-9_-]{22})$")
+# Conversations from this channel share the store with WhatsApp under their own keys
+SESSION_KEY_PREFIX = "web:"
+# Client addresses whose new-session rate is tracked, least recently seen dropped first
+MAX_TRACKED_CLIENTS = 100_000
+
+if not Config.WEB_CHAT_SESSION_SECRET:
+    logger.warning("WEB_CHAT_SESSION_SECRET is not set; web chat sessions will not survive a restart")
+_SESSION_SECRET = (Config.WEB_CHAT_SESSION_SECRET or secrets.token_hex(32)).encode()
+
+
+def _signature(nonce: str) -> str:
+    digest = hmac.new(_SESSION_SECRET, nonce.encode(), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue_session_id() -> str:
+    """A new session ID; only IDs issued here are accepted back, so clients cannot mint sessions."""
+    nonce = secrets.token_urlsafe(18)
+    return f"{nonce}.{_signature(nonce)}"
+
+
+def valid_session_id(session_id: str) -> bool:
+    match = SESSION_ID_PATTERN.match(session_id)
+    return match is not None and hmac.compare_digest(match.group(2), _signature(match.group(1)))
+
+
+def session_key(session_id: str) -> str:
+    return SESSION_KEY_PREFIX + session_id
+
+
+def client_address(connection) -> str:
+    """The address the first trusted proxy saw; entries further left of X-Forwarded-For are client-supplied."""
+    hops = Config.TRUSTED_PROXY_HOPS
+    if hops <= 0:
+        return connection.remote_addr or ""
+    forwarded = [part.strip() for part in connection.headers.get("X-Forwarded-For", "").split(",")]
+    forwarded = [part for part in forwarded if part]
+    if not forwarded:
+        return connection.remote_addr or ""
+    return forwarded[-min(hops, len(forwarded))]
+
+
+class EventOutbox:
+    """Bounded queue of events between one agent run and one client connection."""
+
+    def __init__(self, max_events: int = 256):
+        self.max_events = max_events
+        self.overflowed = False
+        self.closed = False
+        self._events: deque = deque()
+        self._ready = asyncio.Event()
+
+    def put(self, event: Dict):
+        if self.closed:
+            return
+        if event["type"] == "delta" and self._events and self._events[-1]["type"] == "delta":
+            # The client has not read the previous delta yet; send both as one
+            self._events[-1] = {"type": "delta", "text": self._events[-1]["text"] + event["text"]}
+        elif len(self._events) >= self.max_events:
+            self.overflowed = True
+            self.close()
+            return
+        else:
+            self._events.append(event)
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get_all(self, timeout: float) -> Optional[List[Dict]]:
+        """Every queued event, waiting up to `timeout` seconds for one.
+
+        Returns None on timeout and an empty list once the run is over and
+        everything was delivered.
+        """
+        if not self._events and not self.closed:
+            self._ready.clear()
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._ready.wait()
+            except TimeoutError:
+                return None
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+
+class _EventTranslator:
+    """Turns SDK stream events into the channel's event dicts."""
+
+    def __init__(self):
+        self._tool_names: Dict[str, str] = {}
+
+    def __call__(self, event) -> Optional[Dict]:
+        if isinstance(event, RawResponsesStreamEvent):
+            if event.data.type == "response.output_text.delta":
+                return {"type": "delta", "text": event.data.delta}
+            return None
+        if isinstance(event, AgentUpdatedStreamEvent):
+            return {"type": "agent", "name": event.new_agent.name}
+        if isinstance(event, RunItemStreamEvent):
+            if event.name == "handoff_occured":
+                return {"type": "handoff", "from": event.item.source_agent.name, "to": event.item.target_agent.name}
+            if event.name == "tool_called":
+                raw = event.item.raw_item
+                name = getattr(raw, "name", None) or raw.type
+                call_id = getattr(raw, "call_id", None) or getattr(raw, "id", None)
+                if call_id:
+                    self._tool_names[call_id] = name
+                return {"type": "tool", "name": name, "status": "called"}
+            if event.name == "tool_output":
+                raw = event.item.raw_item
+                call_id = raw.get("call_id") if isinstance(raw, dict) else getattr(raw, "call_id", None)
+                return {"type": "tool", "name": self._tool_names.get(call_id, "tool"), "status": "done"}
+        return None
+
+
+def create_web_chat_blueprint(services: AppServices, runner=Runner) -> Blueprint:
+    """Blueprint serving the web chat with the process-wide `services`; `runner` is replaceable for load tests."""
+    bp = Blueprint("web_chat", __name__)
+    agent = services.triage_agent
+    store = services.store
+    admission = services.admission
+    # Turns still running, including those whose client went away
+    turns: Dict[str, asyncio.Task] = {}
+    new_sessions: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    async def run_turn(key: str, message: str, outbox: EventOutbox):
+        started = time.monotonic()
+        try:
+            history = await asyncio.to_thread(history_window, store, key, Config.HISTORY_WINDOW, Config.HISTORY_WINDOW_STEP)
+            input_messages = build_turn_input(history, message)
+
+            with metered() as usage:
+                result = runner.run_streamed(agent, input_messages, run_config=tracing.sampled_run_config("Web chat", key))
+                translate = _EventTranslator()
+                async for event in result.stream_events():
+                    translated = translate(event)
+                    if translated is not None:
+                        outbox.put(translated)
+
+            response = services.clause_library.expand_references(result.final_output)
+            await asyncio.to_thread(store.append_to_history, key, "user", message)
+            await asyncio.to_thread(store.append_to_history, key, "assistant", response)
+            tokens = run_token_usage(result) + usage.tokens
+            await admission.record_usage(key, tokens)
+            services.analytics.record_turn(key, result.last_agent.name, agent_model(result.last_agent), time.monotonic() - started, tokens)
+            outbox.put({"type": "done", "text": response, "agent": result.last_agent.name})
+        except Exception as e:
+            logger.error(f"Error in web chat turn for {key}: {e}")
+            outbox.put({"type": "error", "message": "I'm having trouble processing your request. Please try again."})
+        finally:
+            outbox.close()
+
+    async def start_turn(session_id: str, message: str):
+        """Admit and start a turn; returns (outbox, None) or (None, (error, status))."""
+        key = session_key(session_id)
+        if not message or len(message) > Config.WEB_CHAT_MAX_MESSAGE_CHARS:
+            return None, (f"message must be 1 to {Config.WEB_CHAT_MAX_MESSAGE_CHARS} characters", 400)
+        running = turns.get(key)
+        if running is not None and not running.done():
+            return None, ("a reply is still being generated for this session", 409)
+        decision = await admission.admit(key)
+        if not decision.allowed:
+            return None, (f"{decision.reason} limit exceeded", 429)
+        outbox = EventOutbox(Config.WEB_CHAT_MAX_QUEUED_EVENTS)
+        task = asyncio.create_task(run_turn(key, message, outbox))
+        turns[key] = task
+        task.add_done_callback(lambda t: turns.pop(key, None) if turns.get(key) is t else None)
+        return outbox, None
+
+    async def batches(outbox: EventOutbox) -> AsyncIterator[List[Dict]]:
+        """Batches of events as the client can take them; an empty batch when a keepalive is due."""
+        while True:
+            events = await outbox.get_all(Config.WEB_CHAT_KEEPALIVE_SECONDS)
+            if events is None:
+                yield []
+                continue
+            if not events:
+                if outbox.overflowed:
+                    yield [{"type": "error", "message": "Connection too slow; the answer will be in your history."}]
+                return
+            yield events
+            # Lets deltas accumulate between writes
+            await asyncio.sleep(Config.WEB_CHAT_FLUSH_SECONDS)
+
+    def allow_new_session(client: str) -> bool:
+        bucket = new_sessions.get(client)
+        if bucket is None:
+            rate = max(1, Config.WEB_CHAT_NEW_SESSIONS_PER_MINUTE)
+            bucket = new_sessions[client] = TokenBucket(rate, rate / 60.0)
+            if len(new_sessions) > MAX_TRACKED_CLIENTS:
+                new_sessions.popitem(last=False)
+        else:
+            new_sessions.move_to_end(client)
+        return bucket.consume()
+
+    def resolve_session(session_id: Optional[str], connection) -> Tuple[Optional[str], Optional[Tuple[str, int]]]:
+        """The session to continue, or a new one; returns (session_id, None) or (None, (error, status))."""
+        if session_id:
+            return (session_id, None) if valid_session_id(session_id) else (None, ("invalid session_id", 400))
+        client = client_address(connection)
+        if not allow_new_session(client):
+            return None, ("too many new sessions; continue an existing one or try again later", 429)
+        return issue_session_id(), None
+
+    @bp.route("/chat/stream", methods=["POST"])
+    async def chat_stream():
+        """One turn over server-sent events. Body: {"message"}; continue a session with ?session_id=."""
+        session_id, error = resolve_session(request.args.get("session_id"), request)
+        if error:
+            return {"error": error[0]}, error[1]
+        body = await request.get_json(silent=True) or {}
+        outbox, error = await start_turn(session_id, str(body.get("message", "")).strip())
+        if error:
+            return {"error": error[0]}, error[1]
+
+        async def stream():
+            yield f"event: session\ndata: {json.dumps({'session_id': session_id})}\n\n"
+            async for events in batches(outbox):
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(
+                    f"event: {event['type']}\ndata: {json.dumps({k: v for k, v in event.items() if k != 'type'}, ensure_ascii=False)}\n\n"
+                    for event in events
+                )
+
+        return stream(), 200, {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            # Tells nginx-style proxies not to buffer the stream
+            "X-Accel-Buffering": "no"
+        }
+
+    @bp.websocket("/chat/ws")
+    async def chat_ws():
+        """A whole conversation over one WebSocket. Send {"message"}; receive the events of each turn."""
+        session_id, error = resolve_session(websocket.args.get("session_id"), websocket)
+        if error:
+            await websocket.send_json({"type": "error", "message": error[0]})
+            return
+        await websocket.send_json({"type": "session", "session_id": session_id})
+        while True:
+            try:
+                data = json.loads(await websocket.receive())
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                await websocket.send_json({"type": "error", "message": 'send each message as a JSON object: {"message": "..."}'})
+                continue
+            outbox, error = await start_turn(session_id, str(data.get("message", "")).strip())
+            if error:
+                await websocket.send_json({"type": "error", "message": error[0]})
+                continue
+            async for events in batches(outbox):
+                for event in events or [{"type": "keepalive"}]:
+                    await websocket.send_json(event)
+
+    async def drain(timeout: float):
+        """Wait for running turns to finish and store their answers, at most `timeout` seconds."""
+        pending: Set[asyncio.Task] = set(turns.values())
+        if pending:
+            logger.info(f"Waiting for {len(pending)} web chat turns to finish")
+            await asyncio.wait(pending, timeout=timeout)
+
+    bp.drain = drain
+    bp.turns = turns
+    return bp
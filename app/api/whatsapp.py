@@ -0,0 +1,291 @@
+"""WhatsApp channel: the Twilio webhook and conversation reset."""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, List
+
+from agents import Runner
+from quart import Blueprint, current_app, request
+
+from ..agents.context import ConversationSession, HistoryView, TurnContext
+from ..agents.prompts import build_turn_input, history_window
+from ..config import Config
+from ..db.base import ALERTS_OPT_IN
+from ..services.admission import metered, run_token_usage
+from ..services.analytics import agent_model
+from ..services.container import AppServices
+from ..services.document_review import DocumentReviewError
+from ..utils import tracing
+from ..utils.text import normalize_phone_number, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Replies for senders over their limits
+ADMISSION_REPLIES = {
+    "rate": "You're sending messages too quickly. Please wait a minute and try again.",
+    "tokens": "You've reached today's usage limit. Please try again tomorrow, or visit https://www.lexlinker.com to talk to a lawyer.",
+}
+
+# Messages that subscribe to or unsubscribe from law-change alerts, after tokenizing
+ALERT_KEYWORDS = {
+    "alertas si": True,
+    "alertas no": False,
+    "alerts on": True,
+    "alerts off": False,
+}
+ALERT_REPLIES = {
+    True: "You're subscribed to alerts about changes in Mexican law. Send ALERTAS NO at any time to stop them.",
+    False: "You won't receive any more law-change alerts. Send ALERTAS SI to subscribe again.",
+}
+
+
+def create_whatsapp_blueprint(services: AppServices, runner=Runner) -> Blueprint:
+    """Blueprint serving the Twilio webhook with the process-wide `services`."""
+    bp = Blueprint("whatsapp", __name__)
+    store = services.store
+    messaging = services.messaging
+
+    def get_conversation_history(phone_number: str) -> HistoryView:
+        """Retrieve a view of the recent history sent to the agents with the next message."""
+        normalized_number = normalize_phone_number(phone_number)
+        try:
+            history = history_window(store, normalized_number, Config.HISTORY_WINDOW, Config.HISTORY_WINDOW_STEP)
+            logger.debug(f"Retrieved {len(history)} messages from history for {normalized_number}")
+            return history
+        except Exception as e:
+            logger.error(f"Error retrieving conversation history: {e}")
+            return ConversationSession(normalized_number).view()
+
+    def update_conversation_history(phone_number: str, role: str, content: str):
+        """Append a message to the stored conversation."""
+        if role not in ['user', 'assistant']:
+            logger.error(f"Invalid role: {role}")
+            return
+
+        normalized_number = normalize_phone_number(phone_number)
+        try:
+            store.append_to_history(normalized_number, role, content)
+            logger.debug(f"Updated conversation history for {normalized_number}")
+        except Exception as e:
+            logger.error(f"Error updating conversation history: {e}")
+
+    def record_current_agent(phone_number: str, agent_name: str):
+        """Remember which agent answered last, so broadcasts can target users by topic."""
+        try:
+            store.update_conversation(phone_number, current_agent=agent_name)
+        except Exception as e:
+            logger.error(f"Error recording current agent: {e}")
+
+    def set_alerts_opt_in(phone_number: str, opt_in: bool):
+        """Subscribe a user to law-change alerts, or unsubscribe them, keeping the rest of the metadata."""
+        metadata = store.get_conversation_summary(phone_number)["metadata"]
+        store.update_conversation(phone_number, metadata={**metadata, ALERTS_OPT_IN: opt_in})
+        logger.info(f"Set {ALERTS_OPT_IN}={opt_in} for {phone_number}")
+
+    async def review_document(from_number: str, message_body: str, media_url: str, content_type: str):
+        """Review an attached document and send the result as a new WhatsApp message.
+
+        The review goes into the history like any reply. Follow-up questions
+        sent as text are answered by the agents from it; only messages with
+        an attachment go to the reviewer.
+        """
+        normalized_number = normalize_phone_number(from_number)
+        attachment_note = f"[Document attached: {content_type}]"
+        try:
+            with metered() as usage:
+                try:
+                    review = await services.document_reviewer.review(media_url, content_type, message_body)
+                finally:
+                    # Chunks analyzed before a failure were paid for too
+                    await services.admission.record_usage(normalized_number, usage.tokens)
+            response = services.clause_library.expand_references(review["summary"])
+            attachment_note = f"[Document attached: {content_type}, sha256 {review['hash'][:12]}]"
+        except DocumentReviewError as e:
+            logger.warning(f"Could not review document from {normalized_number}: {e}")
+            response = "I couldn't read that document. Please send the contract as a PDF or a clear photo of each page."
+        except Exception as e:
+            logger.error(f"Error reviewing document: {str(e)}")
+            response = "I apologize, but I'm having trouble reviewing your document. Please try again later."
+
+        await asyncio.to_thread(update_conversation_history, normalized_number, "user", f"{message_body}\n{attachment_note}".strip())
+        await asyncio.to_thread(update_conversation_history, normalized_number, "assistant", response)
+
+        try:
+            await messaging.send_message(from_number, response)
+        except Exception as e:
+            logger.error(f"Error sending document review: {str(e)}")
+
+    async def store_exchange(normalized_number: str, message_body: str, response: str, agent_name: str):
+        """Store the message and its reply, and which agent answered."""
+        await asyncio.to_thread(update_conversation_history, normalized_number, "user", message_body)
+        await asyncio.to_thread(update_conversation_history, normalized_number, "assistant", response)
+        await asyncio.to_thread(record_current_agent, normalized_number, agent_name)
+        logger.debug("Updated conversation history")
+
+    async def run_turn(run: Dict, input_messages: List, started: float, standalone: bool = False) -> str:
+        """Answer a journaled message with the agents, from its last checkpoint if it has one, and store the exchange."""
+        normalized_number = run["phone_number"]
+        with metered() as usage:
+            result = await services.runs.execute(
+                run,
+                services.triage_agent,
+                input_messages,
+                context=TurnContext(normalized_number, reminders=services.reminders),
+                run_config=tracing.sampled_run_config("WhatsApp message", normalized_number),
+                runner=runner
+            )
+        response = services.clause_library.expand_references(result.final_output)
+        logger.debug(f"Got response from agent: {response[:100]}...")
+        agent_name = result.last_agent.name
+        tokens = run_token_usage(result) + usage.tokens
+        await services.admission.record_usage(normalized_number, tokens)
+        services.analytics.record_turn(
+            normalized_number,
+            agent_name,
+            agent_model(result.last_agent),
+            time.monotonic() - started,
+            tokens
+        )
+
+        if standalone and agent_name in Config.SEMANTIC_CACHE_AGENTS:
+            services.semantic_cache.propose(run["message"], response, agent_name)
+
+        await store_exchange(normalized_number, run["message"], response, agent_name)
+        await asyncio.to_thread(services.runs.finish, run, response)
+        # Nobody is waiting on the webhook for this reply any more
+        if run.get("detached"):
+            await messaging.send_message(run["reply_to"], response)
+        return response
+
+    async def resume_run(run: Dict):
+        """Finish a run a stopped or crashed worker left behind and send the reply as a new message."""
+        history = await asyncio.to_thread(get_conversation_history, run["phone_number"])
+        run["detached"] = True
+        await run_turn(run, build_turn_input(history, run["message"]), time.monotonic())
+
+    services.runs.resume_handler = resume_run
+
+    async def answer_redelivery(message_sid: str) -> str:
+        """Twilio sent a message again: repeat the reply if its run finished, otherwise leave it to that run."""
+        previous = await asyncio.to_thread(services.runs.journal.get, message_sid)
+        status = previous.get("status") if previous else None
+        logger.info(f"Redelivered message {message_sid} (run {status})")
+        return str(messaging.create_response(previous["response"] if status == "done" else None))
+
+    @bp.route("/webhook", methods=["POST"])
+    async def webhook():
+        """Handle incoming WhatsApp messages."""
+        started = time.monotonic()
+        try:
+            # Get message details
+            form = await request.form
+            message_body = form["Body"]
+            from_number = form["From"]
+
+            logger.info(f"Received message from {from_number}: {message_body[:100]}...")
+
+            # Reject over-limit senders before any agent or document work
+            normalized_number = normalize_phone_number(from_number)
+            decision = await services.admission.admit(normalized_number)
+            if not decision.allowed:
+                logger.warning(f"Rejected message from {normalized_number}: {decision.reason} limit")
+                return str(messaging.create_response(ADMISSION_REPLIES[decision.reason] if decision.notify else None))
+
+            # Alert subscriptions are handled without involving the agents
+            opt_in = ALERT_KEYWORDS.get(" ".join(tokenize(message_body)))
+            if opt_in is not None:
+                await asyncio.to_thread(set_alerts_opt_in, normalized_number, opt_in)
+                return str(messaging.create_response(ALERT_REPLIES[opt_in]))
+
+            # Documents are reviewed in the background; the result arrives as a separate message
+            if int(form.get("NumMedia", 0) or 0) > 0:
+                current_app.add_background_task(
+                    review_document,
+                    from_number,
+                    message_body,
+                    form["MediaUrl0"],
+                    form.get("MediaContentType0", "")
+                )
+                return str(messaging.create_response(
+                    "I received your document and I'm reviewing it. I'll send you my analysis in a few minutes."
+                ))
+
+            # Get conversation history
+            conversation_history = await asyncio.to_thread(get_conversation_history, normalized_number)
+
+            # Standalone questions can be answered from previously approved answers
+            standalone = (
+                Config.SEMANTIC_CACHE_ENABLED
+                and not conversation_history
+                and len(message_body) <= Config.SEMANTIC_CACHE_MAX_QUESTION_CHARS
+            )
+            match = services.semantic_cache.lookup(message_body, Config.SEMANTIC_CACHE_AGENTS) if standalone else None
+
+            if match:
+                logger.info(f"Answered from semantic cache (scope={match.scope}, score={match.score:.2f})")
+                response = match.answer
+                services.analytics.record_turn(normalized_number, match.scope, "semantic_cache", time.monotonic() - started, cached=True)
+                await store_exchange(normalized_number, message_body, response, match.scope)
+            else:
+                if not services.runs.accepting:
+                    return "Server is shutting down", 503
+                # Journal the run before starting it; a redelivered message finds it there
+                message_sid = form.get("MessageSid")
+                run = await asyncio.to_thread(
+                    services.runs.begin,
+                    message_sid or uuid.uuid4().hex,
+                    normalized_number,
+                    reply_to=from_number,
+                    message=message_body
+                )
+                if run is None:
+                    return await answer_redelivery(message_sid)
+
+                # Static instructions first, then history, then the new message, so the prompt prefix stays cacheable
+                input_messages = build_turn_input(conversation_history, message_body)
+
+                # Process message with full conversation history
+                logger.debug("Processing message with triage agent...")
+                turn = services.runs.submit(run["_id"], run_turn(run, input_messages, started, standalone))
+                try:
+                    response = await asyncio.shield(turn)
+                except asyncio.CancelledError:
+                    if turn.cancelled():
+                        # Handed back by the shutdown drain; the worker that resumes it sends the reply
+                        return "Server is shutting down", 503
+                    # Twilio hung up or the server is stopping; the run goes on and sends its reply as a new message
+                    run["detached"] = True
+                    raise
+
+            # Send response through TwiML
+            try:
+                twiml_response = str(messaging.create_response(response))
+                logger.debug(f"Created TwiML response: {twiml_response[:100]}...")
+                return twiml_response
+            except Exception as e:
+                logger.error(f"Error creating/sending TwiML response: {str(e)}")
+                # Try fallback to direct message sending
+                await messaging.send_message(from_number, response)
+                logger.info("Sent response using direct message sending")
+                return "", 200
+
+        except Exception as e:
+            logger.error(f"Error in webhook: {str(e)}")
+            return "Error processing request", 500
+
+    @bp.route("/clear_conversation", methods=["POST"])
+    async def clear_conversation():
+        """Clear conversation history for a phone number."""
+        try:
+            form = await request.form
+            phone_number = form["phone_number"]
+            normalized_number = normalize_phone_number(phone_number)
+            await asyncio.to_thread(store.clear_conversation, normalized_number)
+            logger.info(f"Cleared conversation history for {normalized_number}")
+            return {"status": "success", "message": f"Conversation cleared for {phone_number}"}
+        except Exception as e:
+            logger.error(f"Error clearing conversation: {str(e)}")
+            return {"status": "error", "message": str(e)}, 500
+
+    return bp
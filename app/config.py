@@ -5,11 +5,29 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Config:
-    # Flask settings
+    # App settings
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
     PORT = int(os.getenv('PORT', 5001))
     
+    # Production server settings (python -m app.server.launcher)
+    SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', os.cpu_count() or 1))
+    SERVER_SOCKET_DIR = os.getenv('SERVER_SOCKET_DIR', '')
+    SERVER_GRACEFUL_TIMEOUT = float(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+    # Time the shutdown hooks of one worker may take in all; the launcher sets it to fit before it kills the worker
+    SHUTDOWN_BUDGET_SECONDS = float(os.getenv('SHUTDOWN_BUDGET_SECONDS', 25))
+    # Only one worker process runs periodic jobs such as retention
+    RUN_BACKGROUND_JOBS = os.getenv('RUN_BACKGROUND_JOBS', 'True').lower() == 'true'
+    # Index of this worker process, set by the launcher; empty when running a single process
+    WORKER_ID = os.getenv('WORKER_ID', '')
+    
+    # Bearer token for the admin API (conversation paging and export); unset disables it
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    # Page size of the conversation history API
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 50))
+    HISTORY_PAGE_MAX = int(os.getenv('HISTORY_PAGE_MAX', 500))
+    
     # Twilio settings
     TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
@@ -19,10 +37,131 @@ class Config:
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     
     # Logging
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json or text
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'app.db=0.05')
+    LOG_MAX_MESSAGE_CHARS = int(os.getenv('LOG_MAX_MESSAGE_CHARS', 2000))
+    LOG_REDACT_PHONES = os.getenv('LOG_REDACT_PHONES', 'True').lower() == 'true'
+    
+    # Storage settings
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')  # mongo, sqlite or memory
+    MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+    MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'lexlinker')
+    SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(__file__), 'db', 'conversations.db'))
+    # Only the most recent HISTORY_WINDOW messages are sent to the agents (0 sends all)
+    HISTORY_WINDOW = int(os.getenv('HISTORY_WINDOW', 0))
+    # The window start advances this many messages at a time, so consecutive turns share a cacheable prompt prefix
+    HISTORY_WINDOW_STEP = int(os.getenv('HISTORY_WINDOW_STEP', 10))
+    # Recent conversation windows kept in each worker's memory (0 disables)
+    HOT_CACHE_MAX_BYTES = int(os.getenv('HOT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    HOT_CACHE_MAX_AGE_SECONDS = float(os.getenv('HOT_CACHE_MAX_AGE_SECONDS', 600))
+    # Messages of at least MESSAGE_COMPRESSION_THRESHOLD bytes are stored compressed (0 disables)
+    MESSAGE_COMPRESSION_THRESHOLD = int(os.getenv('MESSAGE_COMPRESSION_THRESHOLD', 1024))
+    MESSAGE_COMPRESSION_DICTIONARY = os.getenv('MESSAGE_COMPRESSION_DICTIONARY', 'legal_es_v1')
+    COMPRESSION_DICTIONARY_DIR = os.getenv('COMPRESSION_DICTIONARY_DIR', os.path.join(os.path.dirname(__file__), 'data', 'compression'))
+    
+    # Retention settings (RETENTION_IDLE_DAYS=0 keeps every conversation hot)
+    RETENTION_IDLE_DAYS = float(os.getenv('RETENTION_IDLE_DAYS', 90))
+    RETENTION_ARCHIVE = os.getenv('RETENTION_ARCHIVE', 'mongo')  # mongo or file
+    RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', os.path.join(os.path.dirname(__file__), 'db', 'archive'))
+    RETENTION_INTERVAL_SECONDS = float(os.getenv('RETENTION_INTERVAL_SECONDS', 3600))
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 100))
+    RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv('RETENTION_BATCH_PAUSE_SECONDS', 1.0))
     
+    # Web chat channel (/chat/stream and /chat/ws)
+    WEB_CHAT_MAX_MESSAGE_CHARS = int(os.getenv('WEB_CHAT_MAX_MESSAGE_CHARS', 4000))
+    # Events queued for a slow client before it is disconnected; text deltas are merged and do not count
+    WEB_CHAT_MAX_QUEUED_EVENTS = int(os.getenv('WEB_CHAT_MAX_QUEUED_EVENTS', 256))
+    # Minimum time between writes to one client; deltas produced in between are sent together
+    WEB_CHAT_FLUSH_SECONDS = float(os.getenv('WEB_CHAT_FLUSH_SECONDS', 0.1))
+    WEB_CHAT_KEEPALIVE_SECONDS = float(os.getenv('WEB_CHAT_KEEPALIVE_SECONDS', 15))
+    # Session IDs are issued by the server and signed with this key; every worker needs the same one
+    WEB_CHAT_SESSION_SECRET = os.getenv('WEB_CHAT_SESSION_SECRET', '')
+    # New sessions a client address may open per minute; each session has its own message limits
+    WEB_CHAT_NEW_SESSIONS_PER_MINUTE = int(os.getenv('WEB_CHAT_NEW_SESSIONS_PER_MINUTE', 5))
+    # Proxies in front of the server that append to X-Forwarded-For; the launcher adds one for its workers
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+    
+    # Usage analytics: counters are flushed to hourly and daily rollups every ANALYTICS_FLUSH_SECONDS
+    ANALYTICS_FLUSH_SECONDS = float(os.getenv('ANALYTICS_FLUSH_SECONDS', 10))
+    ANALYTICS_HOURLY_RETENTION_DAYS = float(os.getenv('ANALYTICS_HOURLY_RETENTION_DAYS', 35))
+    
+    # Broadcast settings (Twilio's default WhatsApp throughput is 80 messages per second per sender)
+    BROADCAST_MESSAGES_PER_SECOND = float(os.getenv('BROADCAST_MESSAGES_PER_SECOND', 80))
+    BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 32))
+    BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 1000))
+    BROADCAST_CHECKPOINT_SECONDS = float(os.getenv('BROADCAST_CHECKPOINT_SECONDS', 5))
+
+    # Reminder settings: reminders due within REMINDER_HORIZON_SECONDS are leased every REMINDER_POLL_SECONDS
+    # and sent from an in-memory timing wheel advancing every REMINDER_TICK_SECONDS
+    REMINDER_TICK_SECONDS = float(os.getenv('REMINDER_TICK_SECONDS', 0.1))
+    REMINDER_HORIZON_SECONDS = float(os.getenv('REMINDER_HORIZON_SECONDS', 60))
+    REMINDER_POLL_SECONDS = float(os.getenv('REMINDER_POLL_SECONDS', 5))
+    REMINDER_LEASE_SECONDS = float(os.getenv('REMINDER_LEASE_SECONDS', 60))
+    REMINDER_CONCURRENCY = int(os.getenv('REMINDER_CONCURRENCY', 16))
+    REMINDER_MAX_ATTEMPTS = int(os.getenv('REMINDER_MAX_ATTEMPTS', 5))
+    REMINDER_MAX_PER_USER = int(os.getenv('REMINDER_MAX_PER_USER', 20))
+    REMINDER_MAX_DAYS_AHEAD = int(os.getenv('REMINDER_MAX_DAYS_AHEAD', 3 * 365))
+    REMINDER_MAX_CHARS = int(os.getenv('REMINDER_MAX_CHARS', 500))
+    REMINDER_HISTORY_DAYS = float(os.getenv('REMINDER_HISTORY_DAYS', 30))
+    REMINDER_TIMEZONE = os.getenv('REMINDER_TIMEZONE', 'America/Mexico_City')
+    # Approved WhatsApp content template for reminders, with the reminder text as variable {{1}}; freeform text when empty
+    REMINDER_CONTENT_SID = os.getenv('REMINDER_CONTENT_SID', '')
+
+    # Agent run checkpoints: runs cut off by a restart are resumed from their last tool call or handoff
+    RUN_LEASE_SECONDS = float(os.getenv('RUN_LEASE_SECONDS', 60))
+    RUN_HEARTBEAT_SECONDS = float(os.getenv('RUN_HEARTBEAT_SECONDS', 20))
+    RUN_POLL_SECONDS = float(os.getenv('RUN_POLL_SECONDS', 15))
+    RUN_MAX_ATTEMPTS = int(os.getenv('RUN_MAX_ATTEMPTS', 3))
+    # How long a stopping worker waits for its runs before handing them back
+    RUN_DRAIN_SECONDS = float(os.getenv('RUN_DRAIN_SECONDS', 20))
+    RUN_HISTORY_HOURS = float(os.getenv('RUN_HISTORY_HOURS', 24))
+
     # Agent settings
     DEFAULT_AGENT_LOCATION = {"type": "approximate", "city": "Mexico City"}
     
+    # Admission control settings
+    ADMISSION_MESSAGES_PER_MINUTE = int(os.getenv('ADMISSION_MESSAGES_PER_MINUTE', 10))
+    ADMISSION_TOKENS_PER_DAY = int(os.getenv('ADMISSION_TOKENS_PER_DAY', 200000))
+    ADMISSION_ALLOWLIST = [p.strip() for p in os.getenv('ADMISSION_ALLOWLIST', '').split(',') if p.strip()]
+    
+    # Research cache settings: "cached" searches through a sub-agent whose results are cached across conversations,
+    # at the cost of one extra model call per cache miss; "hosted" gives the Research Agent the hosted tool directly
+    RESEARCH_WEB_SEARCH = os.getenv('RESEARCH_WEB_SEARCH', 'cached')
+    RESEARCH_SEARCH_MODEL = os.getenv('RESEARCH_SEARCH_MODEL', 'gpt-4o')
+    RESEARCH_CACHE_TTL_SECONDS = int(os.getenv('RESEARCH_CACHE_TTL_SECONDS', 24 * 3600))
+    RESEARCH_CACHE_STALE_FACTOR = float(os.getenv('RESEARCH_CACHE_STALE_FACTOR', 0.5))
+    RESEARCH_CACHE_MAX_ENTRIES = int(os.getenv('RESEARCH_CACHE_MAX_ENTRIES', 5000))
+    
+    # Semantic answer cache settings
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'True').lower() == 'true'
+    SEMANTIC_CACHE_DIR = os.getenv('SEMANTIC_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'db', 'semantic_cache'))
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.72))
+    SEMANTIC_CACHE_REBUILD_SECONDS = float(os.getenv('SEMANTIC_CACHE_REBUILD_SECONDS', 300))
+    SEMANTIC_CACHE_AGENTS = [a.strip() for a in os.getenv('SEMANTIC_CACHE_AGENTS', 'Legal Agent').split(',') if a.strip()]
+    SEMANTIC_CACHE_MAX_QUESTION_CHARS = int(os.getenv('SEMANTIC_CACHE_MAX_QUESTION_CHARS', 300))
+    
+    # Clause library settings
+    CLAUSE_LIBRARY_DIR = os.getenv('CLAUSE_LIBRARY_DIR', os.path.join(os.path.dirname(__file__), 'data', 'clauses'))
+    CLAUSE_LIBRARY_RELOAD_SECONDS = float(os.getenv('CLAUSE_LIBRARY_RELOAD_SECONDS', 5))
+    
+    # Document review settings
+    DOCUMENT_REVIEW_MODEL = os.getenv('DOCUMENT_REVIEW_MODEL', 'gpt-4o-mini')
+    DOCUMENT_REVIEW_CONCURRENCY = int(os.getenv('DOCUMENT_REVIEW_CONCURRENCY', 8))
+    DOCUMENT_CHUNK_CHARS = int(os.getenv('DOCUMENT_CHUNK_CHARS', 6000))
+    DOCUMENT_CACHE_SIZE = int(os.getenv('DOCUMENT_CACHE_SIZE', 128))
+    DOCUMENT_MAX_BYTES = int(os.getenv('DOCUMENT_MAX_BYTES', 16 * 1024 * 1024))
+    
     # Tracing settings
-    DISABLE_TRACING = os.getenv('DISABLE_TRACING', 'False').lower() == 'true' 
\ No newline at end of file
+    DISABLE_TRACING = os.getenv('DISABLE_TRACING', 'False').lower() == 'true'
+    TRACE_SINK = os.getenv('TRACE_SINK', 'file')  # file, ring or none
+    TRACE_REMOTE_EXPORT = os.getenv('TRACE_REMOTE_EXPORT', 'False').lower() == 'true'
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.1))
+    TRACE_DIR = os.getenv('TRACE_DIR', 'traces')
+    TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', 50 * 1024 * 1024))
+    TRACE_BACKUPS = int(os.getenv('TRACE_BACKUPS', 5))
+    TRACE_RING_SIZE = int(os.getenv('TRACE_RING_SIZE', 10000))
+
+    # Profiling settings (admin endpoints under /debug/profile and /debug/memory)
+    PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 60))
+    PROFILE_SLOW_REQUESTS = int(os.getenv('PROFILE_SLOW_REQUESTS', 20))
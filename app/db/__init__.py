@@ -0,0 +1,47 @@
+from ..config import Config
+from ..utils.compression import MessageCodec
+from .base import BaseStore
+
+
+def create_backend(backend: str) -> BaseStore:
+    if backend == "mongo":
+        from .mongo_store import MongoStore
+        archive = None
+        if Config.RETENTION_ARCHIVE == "file":
+            from .archive import FileArchive
+            archive = FileArchive(Config.RETENTION_ARCHIVE_DIR)
+        codec = MessageCodec(
+            Config.MESSAGE_COMPRESSION_THRESHOLD,
+            Config.COMPRESSION_DICTIONARY_DIR,
+            Config.MESSAGE_COMPRESSION_DICTIONARY
+        )
+        return MongoStore(Config.MONGODB_URI, Config.MONGODB_DATABASE, archive=archive, codec=codec)
+    if backend == "sqlite":
+        from .sqlite_store import SQLiteStore
+        return SQLiteStore(Config.SQLITE_PATH)
+    if backend == "memory":
+        from .memory_store import MemoryStore
+        return MemoryStore()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def create_store(backend: str = Config.STORAGE_BACKEND) -> BaseStore:
+    """Build the conversation store selected by STORAGE_BACKEND, behind the hot conversation cache."""
+    inner = create_backend(backend)
+    if not Config.HOT_CACHE_MAX_BYTES:
+        return inner
+    from .cached_store import CachedStore
+    from .invalidation import LocalInvalidationChannel
+    if backend == "mongo":
+        from .invalidation import MongoInvalidationChannel
+        channel = MongoInvalidationChannel(inner.db)
+    else:
+        # SQLite and memory stores are only shared by one worker process
+        channel = LocalInvalidationChannel()
+    # Large enough for the longest history window the agents are sent; whole conversations when they are sent in full
+    window = Config.HISTORY_WINDOW + max(Config.HISTORY_WINDOW_STEP, 1) - 1 if Config.HISTORY_WINDOW else None
+    return CachedStore(inner, channel, Config.HOT_CACHE_MAX_BYTES, window, Config.HOT_CACHE_MAX_AGE_SECONDS)
+
+
+# Global instance
+store = create_store()
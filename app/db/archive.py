@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import os
+import shutil
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, UTC
+from pathlib import Path
+from typing import Dict, Optional
+
+import bson
+from bson.binary import Binary
+from pymongo.collection import Collection
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def compress(data: bytes, level: int = 10) -> bytes:
+    """Compress with zstd when available, zlib otherwise."""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, min(level, 9))
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress data written by compress(), whichever codec was used."""
+    if data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("Archive was written with zstd; install the 'zstandard' package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def encode_conversation(conversation: Dict) -> bytes:
+    """BSON keeps message timestamps as datetimes, unlike JSON."""
+    return compress(bson.encode(conversation))
+
+
+def decode_conversation(data: bytes) -> Dict:
+    return bson.decode(decompress(data))
+
+
+class ConversationArchive(ABC):
+    """Cold storage for conversations moved out of the hot collection."""
+
+    @abstractmethod
+    def put(self, phone_number: str, conversation: Dict):
+        """Store a conversation, replacing any archived before."""
+
+    @abstractmethod
+    def get(self, phone_number: str) -> Optional[Dict]:
+        """The archived conversation, or None if there is none."""
+
+    @abstractmethod
+    def delete(self, phone_number: str):
+        """Remove a conversation from the archive, if it is there."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every archived conversation."""
+
+
+class MongoArchive(ConversationArchive):
+    """One compressed BSON blob per conversation in a separate collection."""
+
+    def __init__(self, collection: Collection):
+        self.collection = collection
+
+    def put(self, phone_number: str, conversation: Dict):
+        self.collection.replace_one(
+            {"_id": phone_number},
+            {
+                "_id": phone_number,
+                "data": Binary(encode_conversation(conversation)),
+                "message_count": len(conversation.get("conversation_history", [])),
+                "archived_at": datetime.now(UTC)
+            },
+            upsert=True
+        )
+
+    def get(self, phone_number: str) -> Optional[Dict]:
+        doc = self.collection.find_one({"_id": phone_number}, {"data": 1})
+        return decode_conversation(doc["data"]) if doc else None
+
+    def delete(self, phone_number: str):
+        self.collection.delete_one({"_id": phone_number})
+
+    def clear(self):
+        self.collection.drop()
+
+
+class FileArchive(ConversationArchive):
+    """One compressed file per conversation under a local directory.
+
+    File names are hashes of the phone number, fanned out over 256
+    subdirectories so no single directory grows too large.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, phone_number: str) -> Path:
+        digest = hashlib.sha256(phone_number.encode("utf-8")).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.bson.z"
+
+    def put(self, phone_number: str, conversation: Dict):
+        path = self._path(phone_number)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(encode_conversation(conversation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def get(self, phone_number: str) -> Optional[Dict]:
+        try:
+            return decode_conversation(self._path(phone_number).read_bytes())
+        except FileNotFoundError:
+            return None
+
+    def delete(self, phone_number: str):
+        self._path(phone_number).unlink(missing_ok=True)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,118 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..agents.context import ConversationSession
+
+# Metadata flag of users who asked to receive law-change alerts
+ALERTS_OPT_IN = "alerts_opt_in"
+
+
+class BaseStore(ABC):
+    """Interface every conversation storage backend implements.
+
+    Messages are dicts with `role`, `content` and `timestamp` keys, returned
+    oldest first.
+    """
+
+    @abstractmethod
+    def get_conversation(self, phone_number: str) -> Dict:
+        """Return current_agent, conversation_history and metadata for a phone number."""
+
+    @abstractmethod
+    def get_conversation_history(self, phone_number: str, limit: Optional[int] = None) -> List[Dict]:
+        """Return the messages exchanged with a phone number, only the last `limit` if given."""
+
+    def get_conversation_summary(self, phone_number: str) -> Dict:
+        """Return current_agent, metadata and message_count without the messages themselves."""
+        conversation = self.get_conversation(phone_number)
+        return {
+            "current_agent": conversation["current_agent"],
+            "metadata": conversation["metadata"],
+            "message_count": len(conversation["conversation_history"])
+        }
+
+    @abstractmethod
+    def get_history_page(self, phone_number: str, before: Optional[int], limit: int) -> Tuple[List[Dict], int]:
+        """Return up to `limit` messages ending just before position `before` (the newest when None).
+
+        Messages are returned oldest first with the position of the first
+        one, which is the `before` cursor for the previous page.
+        """
+
+    def get_session(self, phone_number: str, limit: Optional[int] = None) -> ConversationSession:
+        """Return a session holding at least the last `limit` messages, or all of them when None.
+
+        The session may be shared with a cache or the store itself; callers
+        read it through views and never add messages to it.
+        """
+        if limit is None:
+            return ConversationSession.from_messages(phone_number, self.get_conversation_history(phone_number))
+        messages, start = self.get_history_page(phone_number, None, limit)
+        return ConversationSession.from_messages(phone_number, messages, start)
+
+    @abstractmethod
+    def iter_conversations(
+        self,
+        updated_since: Optional[datetime] = None,
+        updated_until: Optional[datetime] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict]:
+        """Yield every conversation, with its full history, reading `batch_size` at a time."""
+
+    @abstractmethod
+    def iter_recipients(
+        self,
+        current_agent: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        after: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict]:
+        """Yield phone_number, current_agent and metadata of matching conversations, without their history.
+
+        Conversations match when their current_agent equals `current_agent`
+        (if given) and every key in `metadata` has the given value. They are
+        yielded in phone number order starting after `after`, so a reader
+        can stop anywhere and resume from the last number it handled.
+        """
+
+    @abstractmethod
+    def update_conversation(
+        self,
+        phone_number: str,
+        current_agent: Optional[str] = None,
+        conversation_history: Optional[List] = None,
+        metadata: Optional[Dict] = None
+    ):
+        """Set the given fields, replacing the history if one is passed."""
+
+    @abstractmethod
+    def append_to_history(self, phone_number: str, role: str, content: str):
+        """Append one message to the conversation."""
+
+    @abstractmethod
+    def clear_conversation(self, phone_number: str):
+        """Delete everything stored for a phone number."""
+
+    @abstractmethod
+    def reset_db(self):
+        """Delete all conversations."""
+
+    def archive_idle(self, idle_before: datetime, limit: int) -> int:
+        """Move up to `limit` conversations idle since `idle_before` to cold storage.
+
+        Returns how many were archived. Backends without an archive tier keep
+        everything hot and archive nothing.
+        """
+        return 0
+
+    def close(self):
+        """Release connections held by the backend."""
+
+    @staticmethod
+    def empty_conversation() -> Dict:
+        return {
+            "current_agent": None,
+            "conversation_history": [],
+            "metadata": {}
+        }
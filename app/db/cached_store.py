@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from datetime import datetime, UTC
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..agents.context import ConversationSession
+from ..utils.cache import SizedLRUCache
+from .base import BaseStore
+from .invalidation import ALL_CONVERSATIONS, InvalidationChannel
+
+logger = logging.getLogger(__name__)
+
+
+class _Window:
+    """The last messages of one conversation, as cached."""
+
+    __slots__ = ("session", "loaded_at")
+
+    def __init__(self, session: ConversationSession, loaded_at: float):
+        self.session = session
+        self.loaded_at = loaded_at
+
+    @property
+    def complete(self) -> bool:
+        """True when the session holds the whole conversation, not just its tail."""
+        return self.session.start == 0
+
+
+def _window_size(window: _Window) -> int:
+    return window.session.nbytes()
+
+
+class CachedStore(BaseStore):
+    """Write-through cache of recent conversation windows in front of another store.
+
+    Keeps the last `window` messages of recently active conversations, or
+    their whole history when `window` is None, up to `max_bytes` in total,
+    so a follow-up turn handled by the same worker does not read the
+    database. Writes go to the backend first and then update the cached
+    window; they are also published on `channel` so other workers drop
+    their copy. Entries older than `max_age` seconds are reloaded as a
+    safety net in case an invalidation is lost.
+    """
+
+    def __init__(self, inner: BaseStore, channel: InvalidationChannel, max_bytes: int, window: Optional[int], max_age: float = 600):
+        self.inner = inner
+        self.channel = channel
+        self.window = window
+        self.max_age = max_age
+        self._cache = SizedLRUCache(max_bytes, _window_size)
+        # Bumped by every remote invalidation; a read that raced one is not cached
+        self._invalidations = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        channel.start(self._invalidate_remote, self._reset)
+
+    def __getattr__(self, name):
+        # Backend specifics (e.g. MongoStore.db) stay reachable through the wrapper
+        return getattr(self.inner, name)
+
+    def _invalidate_remote(self, phone_number: str):
+        with self._lock:
+            self._invalidations += 1
+        if phone_number == ALL_CONVERSATIONS:
+            self._cache.clear()
+        else:
+            self._cache.pop(phone_number)
+
+    def _reset(self):
+        with self._lock:
+            self._invalidations += 1
+        self._cache.clear()
+
+    def _publish(self, phone_number: str):
+        try:
+            self.channel.publish(phone_number)
+        except Exception as e:
+            # Other workers could keep a stale copy; stop caching until they expire
+            logger.error(f"Error publishing cache invalidation for {phone_number}: {e}")
+            self._reset()
+
+    def get_conversation(self, phone_number: str) -> Dict:
+        return self.inner.get_conversation(phone_number)
+
+    def _fresh(self, window: Optional[_Window]) -> bool:
+        return window is not None and time.monotonic() - window.loaded_at < self.max_age
+
+    def _covers(self, limit: Optional[int]) -> bool:
+        """Whether a cached window always holds the last `limit` messages."""
+        return self.window is None or (limit is not None and limit <= self.window)
+
+    def get_session(self, phone_number: str, limit: Optional[int] = None) -> ConversationSession:
+        """Serve the cached session when it holds the last `limit` messages"""
+        window = self._cache.get(phone_number)
+        if not self._covers(limit):
+            if self._fresh(window) and window.complete:
+                self.hits += 1
+                return window.session
+            return self.inner.get_session(phone_number, limit)
+
+        if self._fresh(window):
+            self.hits += 1
+            return window.session
+
+        self.misses += 1
+        invalidations = self._invalidations
+        if self.window is None:
+            # A copy: the cached session is appended to, and a backend may hand out its own live session
+            messages, start = self.inner.get_conversation_history(phone_number), 0
+        else:
+            messages, start = self.inner.get_history_page(phone_number, None, self.window)
+        session = ConversationSession.from_messages(phone_number, messages, start)
+        with self._lock:
+            if invalidations == self._invalidations:
+                self._cache.set(phone_number, _Window(session, time.monotonic()))
+        return session
+
+    def get_conversation_history(self, phone_number: str, limit: Optional[int] = None) -> List[Dict]:
+        """Serve the last `limit` messages from the cache when the cached window covers them"""
+        session = self.get_session(phone_number, limit)
+        return (session.get_recent_history(limit) if limit else session.view()).to_list()
+
+    def get_conversation_summary(self, phone_number: str) -> Dict:
+        return self.inner.get_conversation_summary(phone_number)
+
+    def get_history_page(self, phone_number: str, before: Optional[int], limit: int) -> Tuple[List[Dict], int]:
+        """Serve the latest page from the cache when the cached window covers it"""
+        if before is not None or not self._covers(limit):
+            # Paging reads older messages than the cached window holds
+            return self.inner.get_history_page(phone_number, before, limit)
+        view = self.get_session(phone_number, limit).get_recent_history(limit)
+        return view.to_list(), view.start
+
+    def iter_conversations(
+        self,
+        updated_since: Optional[datetime] = None,
+        updated_until: Optional[datetime] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict]:
+        return self.inner.iter_conversations(updated_since, updated_until, batch_size)
+
+    def iter_recipients(
+        self,
+        current_agent: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        after: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict]:
+        return self.inner.iter_recipients(current_agent, metadata, after, batch_size)
+
+    def update_conversation(
+        self,
+        phone_number: str,
+        current_agent: Optional[str] = None,
+        conversation_history: Optional[List] = None,
+        metadata: Optional[Dict] = None
+    ):
+        self.inner.update_conversation(phone_number, current_agent, conversation_history, metadata)
+        if conversation_history is not None:
+            self._cache.pop(phone_number)
+            self._publish(phone_number)
+
+    def append_to_history(self, phone_number: str, role: str, content: str):
+        invalidations = self._invalidations
+        try:
+            self.inner.append_to_history(phone_number, role, content)
+        except Exception:
+            # The write may or may not have happened
+            self._cache.pop(phone_number)
+            raise
+        with self._lock:
+            if invalidations != self._invalidations:
+                # Another worker wrote meanwhile; the cached window may be missing its message
+                self._cache.pop(phone_number)
+            else:
+                window = self._cache.get(phone_number)
+                if window is not None:
+                    session = window.session
+                    # Appending in place leaves views handed out earlier intact; the tail is copied out only now and then
+                    if self.window is not None and len(session) >= 2 * self.window:
+                        session = session.tail(self.window)
+                    session.add_message(role, content, datetime.now(UTC).timestamp())
+                    self._cache.set(phone_number, _Window(session, window.loaded_at))
+        self._publish(phone_number)
+
+    def clear_conversation(self, phone_number: str):
+        self._cache.pop(phone_number)
+        self.inner.clear_conversation(phone_number)
+        self._publish(phone_number)
+
+    def reset_db(self):
+        self._cache.clear()
+        self.inner.reset_db()
+        self._publish(ALL_CONVERSATIONS)
+
+    def archive_idle(self, idle_before: datetime, limit: int) -> int:
+        # Archiving keeps the logical history unchanged, so cached windows stay valid
+        return self.inner.archive_idle(idle_before, limit)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._cache), "bytes": self._cache.size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.channel.stop()
+        self.inner.close()
@@ -0,0 +1,76 @@
+"""Bulk export of conversations as newline-delimited JSON.
+
+Usage:
+    python -m app.db.export --since 2025-01-01 --until 2025-02-01 --out january.ndjson.gz
+
+Conversations are read through the store's batched cursor and written one
+line at a time, so memory use stays flat however many conversations match.
+"""
+import argparse
+import gzip
+import json
+import logging
+import sys
+from datetime import datetime, UTC
+from typing import Iterator, Optional
+
+from .base import BaseStore
+
+logger = logging.getLogger(__name__)
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 date or datetime; naive values are taken as UTC."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=UTC)
+
+
+def export_lines(
+    store: BaseStore,
+    updated_since: Optional[datetime] = None,
+    updated_until: Optional[datetime] = None,
+    batch_size: int = 500
+) -> Iterator[bytes]:
+    """Yield one UTF-8 JSON line per conversation updated in [updated_since, updated_until)."""
+    for conversation in store.iter_conversations(updated_since, updated_until, batch_size):
+        yield json.dumps(conversation, default=_default, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export conversations as NDJSON, optionally filtered by last update.")
+    parser.add_argument("--since", help="only conversations last updated at or after this ISO date")
+    parser.add_argument("--until", help="only conversations last updated before this ISO date")
+    parser.add_argument("--out", default="-", help="output file, gzipped if it ends in .gz; stdout by default")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    from . import store
+
+    if args.out == "-":
+        out = sys.stdout.buffer
+    elif args.out.endswith(".gz"):
+        out = gzip.open(args.out, "wb")
+    else:
+        out = open(args.out, "wb")
+    count = 0
+    try:
+        for line in export_lines(store, parse_datetime(args.since), parse_datetime(args.until), args.batch_size):
+            out.write(line)
+            count += 1
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    logger.info(f"Exported {count} conversations to {args.out}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
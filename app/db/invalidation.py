@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+from typing import Callable, Optional
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+# Published instead of a phone number when every entry must be dropped
+ALL_CONVERSATIONS = "*"
+
+# How far back the invalidation feed starts reading, to cover writers whose ObjectIds sort before earlier events
+RESUME_MARGIN_SECONDS = 5
+
+
+class InvalidationChannel:
+    """Tells other workers that a conversation changed.
+
+    `on_invalidate(phone_number)` is called for changes published by other
+    writers; `on_reset()` when changes may have been missed and every cached
+    entry must be dropped.
+    """
+
+    def __init__(self):
+        self.writer_id = uuid.uuid4().hex
+
+    def publish(self, phone_number: str):
+        pass
+
+    def start(self, on_invalidate: Callable[[str], None], on_reset: Callable[[], None]):
+        pass
+
+    def stop(self):
+        pass
+
+
+class LocalInvalidationChannel(InvalidationChannel):
+    """Stand-in for a single worker process, where no other writer exists."""
+
+
+class MongoInvalidationChannel(InvalidationChannel):
+    """Broadcasts invalidations through a capped collection.
+
+    Each worker tails the collection with a tailable cursor, which, unlike
+    change streams, also works on a standalone mongod. Events a worker
+    published itself are skipped.
+
+    ObjectIds minted by different writers in the same second do not sort in
+    insertion order, so the feed never resumes after the last `_id` it saw.
+    It reads from `RESUME_MARGIN_SECONDS` before the time it started, or
+    was last reset. Replaying a few seconds of invalidations only drops a
+    few cached entries.
+    """
+
+    def __init__(self, db: Database, name: str = "cache_invalidations", size_bytes: int = 4 * 1024 * 1024):
+        super().__init__()
+        try:
+            db.create_collection(name, capped=True, size=size_bytes)
+        except CollectionInvalid:
+            pass
+        self.collection: Collection = db[name]
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, phone_number: str):
+        self.collection.insert_one({"phone_number": phone_number, "writer": self.writer_id})
+
+    def start(self, on_invalidate: Callable[[str], None], on_reset: Callable[[], None]):
+        self._thread = threading.Thread(target=self._tail, args=(on_invalidate, on_reset), name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _resume_point() -> ObjectId:
+        return ObjectId.from_datetime(datetime.now(UTC) - timedelta(seconds=RESUME_MARGIN_SECONDS))
+
+    def _tail(self, on_invalidate: Callable[[str], None], on_reset: Callable[[], None]):
+        since = self._resume_point()
+        while not self._stopped.is_set():
+            try:
+                cursor = self.collection.find(
+                    {"_id": {"$gte": since}}, cursor_type=CursorType.TAILABLE_AWAIT, max_await_time_ms=1000
+                )
+                delivered = False
+                while cursor.alive and not self._stopped.is_set():
+                    for event in cursor:
+                        delivered = True
+                        if event["writer"] != self.writer_id:
+                            on_invalidate(event["phone_number"])
+                if delivered and not self._stopped.is_set():
+                    # The capped collection wrapped past the cursor; events after it may be lost
+                    logger.warning("Cache invalidation feed lost its place, dropping cached conversations")
+                    since = self._resume_point()
+                    on_reset()
+                # A query matching nothing closes the cursor right away
+                time.sleep(0.1)
+            except Exception as e:
+                logger.error(f"Cache invalidation feed failed, dropping cached conversations: {e}")
+                # Events may have been missed while the feed was down
+                since = self._resume_point()
+                on_reset()
+                time.sleep(1)
+
+    def stop(self):
+        self._stopped.set()
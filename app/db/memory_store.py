@@ -0,0 +1,147 @@
+import copy
+import logging
+import threading
+from datetime import datetime, UTC
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..agents.context import ConversationSession
+from .base import BaseStore
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore(BaseStore):
+    """Keeps conversations in process memory. Meant for tests and local development."""
+
+    def __init__(self):
+        self._sessions: Dict[str, ConversationSession] = {}
+        self._last_updated: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, phone_number: str) -> ConversationSession:
+        session = self._sessions.get(phone_number)
+        if session is None:
+            session = self._sessions[phone_number] = ConversationSession(phone_number)
+        return session
+
+    def get_conversation(self, phone_number: str) -> Dict:
+        """Get conversation data for a phone number"""
+        with self._lock:
+            session = self._sessions.get(phone_number)
+            if session is None:
+                return self.empty_conversation()
+            return {
+                "current_agent": session.current_agent,
+                "conversation_history": session.view().to_list(),
+                "metadata": copy.deepcopy(session.metadata)
+            }
+
+    def get_conversation_history(self, phone_number: str, limit: Optional[int] = None) -> List[Dict]:
+        """Get conversation history for a phone number"""
+        with self._lock:
+            session = self._sessions.get(phone_number)
+            if session is None:
+                return []
+            return (session.get_recent_history(limit) if limit else session.view()).to_list()
+
+    def get_session(self, phone_number: str, limit: Optional[int] = None) -> ConversationSession:
+        """Get the live session; it is only ever appended to, so views of it stay valid"""
+        with self._lock:
+            session = self._sessions.get(phone_number)
+            return session if session is not None else ConversationSession(phone_number)
+
+    def get_history_page(self, phone_number: str, before: Optional[int], limit: int) -> Tuple[List[Dict], int]:
+        """Get one page of conversation history"""
+        with self._lock:
+            session = self._sessions.get(phone_number)
+            count = len(session) if session else 0
+            end = count if before is None else min(before, count)
+            start = max(0, end - limit)
+            return (session.view(start, end).to_list() if session else []), start
+
+    def iter_conversations(
+        self,
+        updated_since: Optional[datetime] = None,
+        updated_until: Optional[datetime] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict]:
+        """Yield a copy of every conversation updated in the given range"""
+        with self._lock:
+            phone_numbers = list(self._sessions)
+        for phone_number in phone_numbers:
+            with self._lock:
+                last_updated = self._last_updated.get(phone_number)
+            if updated_since and (last_updated is None or last_updated < updated_since):
+                continue
+            if updated_until and (last_updated is None or last_updated >= updated_until):
+                continue
+            conversation = self.get_conversation(phone_number)
+            yield {"phone_number": phone_number, "last_updated": last_updated, **conversation}
+
+    def iter_recipients(
+        self,
+        current_agent: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        after: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict]:
+        """Yield matching conversations in phone number order"""
+        metadata = metadata or {}
+        with self._lock:
+            phone_numbers = sorted(p for p in self._sessions if after is None or p > after)
+        for phone_number in phone_numbers:
+            with self._lock:
+                session = self._sessions.get(phone_number)
+                if session is None:
+                    continue
+                if current_agent is not None and session.current_agent != current_agent:
+                    continue
+                if any(session.metadata.get(key) != value for key, value in metadata.items()):
+                    continue
+                recipient = {
+                    "phone_number": phone_number,
+                    "current_agent": session.current_agent,
+                    "metadata": copy.deepcopy(session.metadata)
+                }
+            yield recipient
+
+    def update_conversation(
+        self,
+        phone_number: str,
+        current_agent: Optional[str] = None,
+        conversation_history: Optional[List] = None,
+        metadata: Optional[Dict] = None
+    ):
+        """Update conversation data"""
+        with self._lock:
+            session = self._session(phone_number)
+            if conversation_history is not None:
+                # Sessions handed out earlier keep the old history
+                session = self._sessions[phone_number] = ConversationSession.from_messages(
+                    phone_number, conversation_history, current_agent=session.current_agent, metadata=session.metadata
+                )
+            if current_agent is not None:
+                session.current_agent = current_agent
+            if metadata is not None:
+                session.metadata = copy.deepcopy(metadata)
+            self._last_updated[phone_number] = datetime.now(UTC)
+
+    def append_to_history(self, phone_number: str, role: str, content: str):
+        """Append a new message to the conversation history"""
+        now = datetime.now(UTC)
+        with self._lock:
+            self._session(phone_number).add_message(role, content, now.timestamp())
+            self._last_updated[phone_number] = now
+
+    def clear_conversation(self, phone_number: str):
+        """Clear conversation data for a phone number"""
+        with self._lock:
+            self._sessions.pop(phone_number, None)
+            self._last_updated.pop(phone_number, None)
+        logger.info(f"Cleared conversation data for {phone_number}")
+
+    def reset_db(self):
+        """Drop all conversations"""
+        with self._lock:
+            self._sessions.clear()
+            self._last_updated.clear()
@@ -1,21 +1,39 @@
 import json
 import logging
 from datetime import datetime, UTC
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from pymongo.database import Database
 from pymongo.collection import Collection
 
+from .archive import ConversationArchive, MongoArchive
+from .base import ALERTS_OPT_IN, BaseStore
+from ..utils.compression import MessageCodec, plain_message
+
 logger = logging.getLogger(__name__)
 
-class MongoStore:
-    def __init__(self):
+# Fields removed from a conversation when it is archived; the stub keeps the rest
+ARCHIVE_STUB_UNSET = {"conversation_history": "", "last_updated": ""}
+# Fields only archived stubs have
+ARCHIVE_STUB_FIELDS = ["archived", "archived_at", "archived_last_updated", "message_count"]
+
+class MongoStore(BaseStore):
+    def __init__(
+        self,
+        uri: str = 'mongodb://localhost:27017/',
+        database: str = 'lexlinker',
+        archive: Optional[ConversationArchive] = None,
+        codec: Optional[MessageCodec] = None
+    ):
         logger.info("Initializing MongoDB store...")
         try:
-            self.client = MongoClient('mongodb://localhost:27017/')
-            self.db: Database = self.client.lexlinker
+            self.client = MongoClient(uri)
+            self.db: Database = self.client[database]
             self.conversations: Collection = self.db.conversations
+            self.archive = archive or MongoArchive(self.db.conversation_archive)
+            # Without a codec every message is stored as plain text
+            self.codec = codec or MessageCodec(threshold=0, dictionary_dir=".")
             self._ensure_indexes()
             # Test connection
             self.client.admin.command('ping')
@@ -30,21 +48,52 @@ class MongoStore:
             logger.info("Creating MongoDB indexes...")
             self.conversations.create_index("phone_number", unique=True)
             self.conversations.create_index("last_updated")
+            # Lets exports filtered by date find archived stubs, which have no last_updated
+            self.conversations.create_index("archived_last_updated", sparse=True)
+            # Broadcast recipient selection: opted-in users, optionally by current agent, in phone number order
+            self.conversations.create_index([(f"metadata.{ALERTS_OPT_IN}", 1), ("current_agent", 1), ("phone_number", 1)])
+            self.conversations.create_index([(f"metadata.{ALERTS_OPT_IN}", 1), ("phone_number", 1)])
             logger.info("MongoDB indexes created successfully")
         except Exception as e:
             logger.error(f"Failed to create MongoDB indexes: {e}")
             raise
 
+    def _rehydrate(self, phone_number: str):
+        """Move an archived conversation back into the hot collection."""
+        logger.info(f"Rehydrating archived conversation for {phone_number}")
+        archived = self.archive.get(phone_number)
+        if archived is None:
+            # Another worker may have just rehydrated it; otherwise the blob is lost and the stub must stay as it is
+            if self.conversations.count_documents({"phone_number": phone_number, "archived": True}, limit=1):
+                logger.error(f"Archived conversation for {phone_number} is missing from the archive; leaving it archived")
+            return
+        history = archived.get("conversation_history", [])
+        self.conversations.update_one(
+            {"phone_number": phone_number, "archived": True},
+            [
+                {"$set": {
+                    # Messages appended while only the stub was present go after the archived ones
+                    "conversation_history": {"$concatArrays": [{"$literal": history}, {"$ifNull": ["$conversation_history", []]}]},
+                    "last_updated": {"$ifNull": ["$last_updated", "$$NOW"]}
+                }},
+                {"$project": {field: 0 for field in ARCHIVE_STUB_FIELDS}}
+            ]
+        )
+        self.archive.delete(phone_number)
+
     def get_conversation(self, phone_number: str) -> Dict:
         """Get conversation data for a phone number"""
         try:
             logger.info(f"Getting conversation data for {phone_number}")
             result = self.conversations.find_one({"phone_number": phone_number})
+            if result and result.get("archived"):
+                self._rehydrate(phone_number)
+                result = self.conversations.find_one({"phone_number": phone_number})
             if result:
                 logger.info(f"Found conversation data for {phone_number}")
                 return {
                     "current_agent": result.get("current_agent"),
-                    "conversation_history": result.get("conversation_history", []),
+                    "conversation_history": [self.codec.stored_message(m) for m in result.get("conversation_history", [])],
                     "metadata": result.get("metadata", {})
                 }
             logger.info(f"No conversation data found for {phone_number}")
@@ -57,21 +106,153 @@ class MongoStore:
             logger.error(f"Error getting conversation data for {phone_number}: {e}")
             raise
 
-    def get_conversation_history(self, phone_number: str) -> List[Dict]:
-        """Get conversation history for a phone number"""
+    def get_conversation_history(self, phone_number: str, limit: Optional[int] = None) -> List[Dict]:
+        """Get conversation history for a phone number, optionally only the last `limit` messages"""
         try:
             logger.info(f"Getting conversation history for {phone_number}")
-            result = self.conversations.find_one(
-                {"phone_number": phone_number},
-                {"conversation_history": 1}
-            )
-            history = result.get("conversation_history", []) if result else []
+            projection = {"conversation_history": {"$slice": -limit} if limit else 1, "archived": 1}
+            result = self.conversations.find_one({"phone_number": phone_number}, projection)
+            if result and result.get("archived"):
+                self._rehydrate(phone_number)
+                result = self.conversations.find_one({"phone_number": phone_number}, projection)
+            history = [self.codec.stored_message(m) for m in result.get("conversation_history", [])] if result else []
             logger.info(f"Retrieved {len(history)} messages for {phone_number}")
             return history
         except Exception as e:
             logger.error(f"Error getting conversation history for {phone_number}: {e}")
             raise
 
+    def get_conversation_summary(self, phone_number: str) -> Dict:
+        """Get agent, metadata and message count; the history is counted on the server, not sent"""
+        try:
+            pipeline = [
+                {"$match": {"phone_number": phone_number}},
+                {"$project": {
+                    "_id": 0,
+                    "current_agent": 1,
+                    "metadata": 1,
+                    "archived": 1,
+                    "message_count": 1,
+                    "hot_count": {"$size": {"$ifNull": ["$conversation_history", []]}}
+                }}
+            ]
+            doc = next(self.conversations.aggregate(pipeline), None)
+            if doc is None:
+                return {"current_agent": None, "metadata": {}, "message_count": 0}
+            # An archived stub counts its archived messages plus any appended since
+            archived_count = doc.get("message_count", 0) if doc.get("archived") else 0
+            return {
+                "current_agent": doc.get("current_agent"),
+                "metadata": doc.get("metadata", {}),
+                "message_count": archived_count + doc["hot_count"]
+            }
+        except Exception as e:
+            logger.error(f"Error getting conversation summary for {phone_number}: {e}")
+            raise
+
+    def _history_page(self, phone_number: str, before: Optional[int], limit: int) -> Optional[Dict]:
+        """Count the stored history on the server, then project only the requested slice of it."""
+        sizes = self.conversations.aggregate([
+            {"$match": {"phone_number": phone_number}},
+            {"$project": {"_id": 0, "archived": 1, "size": {"$size": {"$ifNull": ["$conversation_history", []]}}}}
+        ])
+        doc = next(sizes, None)
+        if doc is None or doc.get("archived"):
+            return doc
+        end = doc["size"] if before is None else min(before, doc["size"])
+        start = max(0, end - limit)
+        if end == start:
+            return {"messages": [], "start": start}
+        # Messages are only ever appended at the end, so earlier positions stay put between the two reads
+        result = self.conversations.find_one(
+            {"phone_number": phone_number},
+            {"_id": 0, "conversation_history": {"$slice": [start, end - start]}}
+        )
+        return {"messages": result.get("conversation_history", []) if result else [], "start": start}
+
+    def get_history_page(self, phone_number: str, before: Optional[int], limit: int) -> Tuple[List[Dict], int]:
+        """Get one page of conversation history"""
+        try:
+            page = self._history_page(phone_number, before, limit)
+            if page and page.get("archived"):
+                self._rehydrate(phone_number)
+                page = self._history_page(phone_number, before, limit)
+            if not page:
+                return [], 0
+            return [plain_message(self.codec.stored_message(m)) for m in page["messages"]], page["start"]
+        except Exception as e:
+            logger.error(f"Error getting history page for {phone_number}: {e}")
+            raise
+
+    def iter_conversations(
+        self,
+        updated_since: Optional[datetime] = None,
+        updated_until: Optional[datetime] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict]:
+        """Yield every conversation updated in the given range, archived ones included.
+
+        Archived conversations are read from the archive without being
+        rehydrated, so an export does not pull cold data back into the hot
+        collection.
+        """
+        query = {}
+        updated = {}
+        if updated_since:
+            updated["$gte"] = updated_since
+        if updated_until:
+            updated["$lt"] = updated_until
+        if updated:
+            query = {"$or": [{"last_updated": updated}, {"archived_last_updated": updated}]}
+        cursor = self.conversations.find(query, {"_id": 0}).batch_size(batch_size)
+        try:
+            for doc in cursor:
+                if doc.get("archived"):
+                    archived = self.archive.get(doc["phone_number"]) or {}
+                    doc["conversation_history"] = archived.get("conversation_history", []) + doc.get("conversation_history", [])
+                    doc["last_updated"] = doc.get("last_updated") or doc.get("archived_last_updated")
+                yield {
+                    "phone_number": doc["phone_number"],
+                    "current_agent": doc.get("current_agent"),
+                    "conversation_history": [plain_message(self.codec.stored_message(m)) for m in doc.get("conversation_history", [])],
+                    "metadata": doc.get("metadata", {}),
+                    "last_updated": doc.get("last_updated"),
+                    "archived": bool(doc.get("archived"))
+                }
+        finally:
+            cursor.close()
+
+    def iter_recipients(
+        self,
+        current_agent: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        after: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict]:
+        """Yield matching conversations in phone number order, archived stubs included.
+
+        Only the fields needed to address and personalize a message are read,
+        so the history is never loaded or rehydrated.
+        """
+        query = {f"metadata.{key}": value for key, value in (metadata or {}).items()}
+        if current_agent is not None:
+            query["current_agent"] = current_agent
+        if after is not None:
+            query["phone_number"] = {"$gt": after}
+        cursor = self.conversations.find(
+            query,
+            {"_id": 0, "phone_number": 1, "current_agent": 1, "metadata": 1}
+        ).sort("phone_number", 1).batch_size(batch_size)
+        try:
+            for doc in cursor:
+                yield {
+                    "phone_number": doc["phone_number"],
+                    "current_agent": doc.get("current_agent"),
+                    "metadata": doc.get("metadata", {})
+                }
+        finally:
+            cursor.close()
+
     def update_conversation(
         self,
         phone_number: str,
@@ -87,17 +268,22 @@ class MongoStore:
             if current_agent is not None:
                 update_data["current_agent"] = current_agent
             if conversation_history is not None:
-                update_data["conversation_history"] = conversation_history
+                update_data["conversation_history"] = [self.codec.encode_message(m) for m in conversation_history]
             if metadata is not None:
                 update_data["metadata"] = metadata
 
+            update = {"$set": update_data}
+            if conversation_history is not None:
+                # A replaced history supersedes whatever was archived
+                update["$unset"] = {field: "" for field in ARCHIVE_STUB_FIELDS}
+
             result = self.conversations.update_one(
                 {"phone_number": phone_number},
-                {
-                    "$set": update_data
-                },
+                update,
                 upsert=True
             )
+            if conversation_history is not None:
+                self.archive.delete(phone_number)
             logger.info(f"Updated conversation data for {phone_number}: matched={result.matched_count}, modified={result.modified_count}, upserted={result.upserted_id is not None}")
         except Exception as e:
             logger.error(f"Error updating conversation data for {phone_number}: {e}")
@@ -107,36 +293,41 @@ class MongoStore:
         """Append a new message to the conversation history"""
         try:
             logger.info(f"Appending message to history for {phone_number}")
-            message = {
+            message = self.codec.encode_message({
                 "role": role,
                 "content": content,
                 "timestamp": datetime.now(UTC)
-            }
+            })
             
-            result = self.conversations.update_one(
+            # Return only the last message (to verify the write) and the archive flag
+            stored = self.conversations.find_one_and_update(
                 {"phone_number": phone_number},
                 {
                     "$push": {"conversation_history": message},
                     "$set": {"last_updated": datetime.now(UTC)}
                 },
-                upsert=True
+                projection={"archived": 1, "conversation_history": {"$slice": -1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
-            logger.info(f"Appended message to history for {phone_number}: matched={result.matched_count}, modified={result.modified_count}, upserted={result.upserted_id is not None}")
+            logger.info(f"Appended message to history for {phone_number}")
             
             # Verify the message was stored
-            stored = self.conversations.find_one({"phone_number": phone_number})
             if not stored or "conversation_history" not in stored:
                 error_msg = f"Failed to store message for {phone_number}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
             history = stored["conversation_history"]
-            if not history or history[-1]["content"] != content:
+            if not history or history[-1]["content"] != message["content"]:
                 error_msg = f"Stored message doesn't match for {phone_number}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
             logger.info(f"Successfully verified message storage for {phone_number}")
+
+            if stored.get("archived"):
+                self._rehydrate(phone_number)
         except Exception as e:
             logger.error(f"Error appending message to history for {phone_number}: {e}")
             raise
@@ -146,6 +337,7 @@ class MongoStore:
         try:
             logger.info(f"Clearing conversation data for {phone_number}")
             result = self.conversations.delete_one({"phone_number": phone_number})
+            self.archive.delete(phone_number)
             logger.info(f"Cleared conversation data for {phone_number}: deleted={result.deleted_count}")
         except Exception as e:
             logger.error(f"Error clearing conversation data for {phone_number}: {e}")
@@ -160,6 +352,8 @@ class MongoStore:
                 self.db.drop_collection(collection)
                 logger.info(f"Dropped collection: {collection}")
             
+            self.archive.clear()
+
             # Recreate collections and indexes
             self._ensure_indexes()
             logger.info("Successfully reset MongoDB database")
@@ -167,5 +361,48 @@ class MongoStore:
             logger.error(f"Error resetting MongoDB database: {e}")
             raise
 
-# Global instance
-store = MongoStore() 
\ No newline at end of file
+    def archive_idle(self, idle_before: datetime, limit: int) -> int:
+        """Archive up to `limit` conversations last updated before `idle_before`.
+
+        Walks the last_updated index oldest first. Each conversation is written
+        to the archive, then replaced by a stub without history or
+        last_updated, so stubs drop out of the index range on the next pass.
+        """
+        archived = 0
+        cursor = self.conversations.find(
+            {"last_updated": {"$lt": idle_before}, "archived": {"$ne": True}}
+        ).sort("last_updated", 1).limit(limit)
+        for doc in cursor:
+            phone_number = doc["phone_number"]
+            history = doc.get("conversation_history", [])
+            try:
+                self.archive.put(phone_number, {
+                    "phone_number": phone_number,
+                    "current_agent": doc.get("current_agent"),
+                    "conversation_history": history,
+                    "metadata": doc.get("metadata", {}),
+                    "last_updated": doc["last_updated"]
+                })
+                # Only replace the document if the user has not written since we read it
+                result = self.conversations.update_one(
+                    {"_id": doc["_id"], "last_updated": doc["last_updated"]},
+                    {
+                        "$set": {
+                            "archived": True,
+                            "archived_at": datetime.now(UTC),
+                            "archived_last_updated": doc["last_updated"],
+                            "message_count": len(history)
+                        },
+                        "$unset": ARCHIVE_STUB_UNSET
+                    }
+                )
+                if result.modified_count:
+                    archived += 1
+                else:
+                    self.archive.delete(phone_number)
+            except Exception as e:
+                logger.error(f"Error archiving conversation for {phone_number}: {e}")
+        return archived
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,319 @@
+"""Storage for scheduled reminders.
+
+A reminder is pending until a scheduler leases it shortly before it falls
+due. The lease names the scheduler and when it lapses, so a reminder held by
+a worker that died is picked up by another one. Sent and failed reminders
+are kept for `REMINDER_HISTORY_DAYS` and then expire.
+"""
+import heapq
+import logging
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+
+logger = logging.getLogger(__name__)
+
+# Statuses a reminder counts against its user's limit in
+ACTIVE = ("pending", "leased")
+LEASE_FIELDS = {"lease_owner": "", "lease_until": "", "lease_token": ""}
+
+
+class ReminderQueue(ABC):
+    """Reminders ordered by due time, claimed under a lease."""
+
+    # Whether every worker, and the next start, sees the same reminders
+    shared = True
+
+    @abstractmethod
+    def add(self, reminder: Dict):
+        """Store a new pending reminder."""
+
+    @abstractmethod
+    def count_active(self, phone_number: str) -> int:
+        """Reminders of a user that have not been sent or given up on yet."""
+
+    @abstractmethod
+    def claim_due(self, before: datetime, owner: str, lease_until: datetime, limit: int) -> List[Dict]:
+        """Lease up to `limit` reminders due before `before`, soonest first, to `owner`."""
+
+    @abstractmethod
+    def complete(self, reminder_id: str, owner: str):
+        """Record a leased reminder as sent."""
+
+    @abstractmethod
+    def release(self, reminder_id: str, owner: str, due_at: Optional[datetime] = None, attempts: Optional[int] = None, error: str = ""):
+        """Give a leased reminder back, optionally due at a new time after a failed attempt."""
+
+    @abstractmethod
+    def fail(self, reminder_id: str, owner: str, error: str):
+        """Give up on a leased reminder."""
+
+
+class MongoReminderQueue(ReminderQueue):
+    """Reminders in a Mongo collection, indexed by status and due time.
+
+    Claiming reads the ids of the soonest claimable reminders from the index,
+    leases those still claimable with one update_many tagged with a fresh
+    token, and reads back the ones carrying the token. Workers claiming at
+    the same time never get the same reminder.
+    """
+
+    def __init__(self, collection: Collection, history_days: float = 30):
+        self.collection = collection
+        try:
+            collection.create_index([("status", ASCENDING), ("due_at", ASCENDING)])
+            collection.create_index([("phone_number", ASCENDING), ("status", ASCENDING)])
+            collection.create_index("lease_token", sparse=True)
+            # Sent and failed reminders only
+            collection.create_index("finished_at", expireAfterSeconds=int(history_days * 86400), sparse=True)
+        except Exception as e:
+            logger.error(f"Failed to create reminder indexes: {e}")
+            raise
+
+    def add(self, reminder: Dict):
+        self.collection.insert_one(reminder)
+
+    def count_active(self, phone_number: str) -> int:
+        return self.collection.count_documents({"phone_number": phone_number, "status": {"$in": list(ACTIVE)}})
+
+    def claim_due(self, before: datetime, owner: str, lease_until: datetime, limit: int) -> List[Dict]:
+        now = datetime.now(UTC)
+        claimable = {
+            "due_at": {"$lt": before},
+            "$or": [{"status": "pending"}, {"status": "leased", "lease_until": {"$lt": now}}]
+        }
+        ids = [doc["_id"] for doc in self.collection.find(claimable, {"_id": 1}).sort("due_at", ASCENDING).limit(limit)]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        self.collection.update_many(
+            {**claimable, "_id": {"$in": ids}},
+            {"$set": {"status": "leased", "lease_owner": owner, "lease_until": lease_until, "lease_token": token}}
+        )
+        return list(self.collection.find({"lease_token": token}))
+
+    def complete(self, reminder_id: str, owner: str):
+        now = datetime.now(UTC)
+        self.collection.update_one(
+            {"_id": reminder_id, "lease_owner": owner},
+            {"$set": {"status": "sent", "sent_at": now, "finished_at": now}, "$unset": LEASE_FIELDS}
+        )
+
+    def release(self, reminder_id: str, owner: str, due_at: Optional[datetime] = None, attempts: Optional[int] = None, error: str = ""):
+        fields = {"status": "pending"}
+        if due_at is not None:
+            fields["due_at"] = due_at
+        if attempts is not None:
+            fields.update(attempts=attempts, error=error)
+        self.collection.update_one({"_id": reminder_id, "lease_owner": owner}, {"$set": fields, "$unset": LEASE_FIELDS})
+
+    def fail(self, reminder_id: str, owner: str, error: str):
+        self.collection.update_one(
+            {"_id": reminder_id, "lease_owner": owner},
+            {"$set": {"status": "failed", "error": error, "finished_at": datetime.now(UTC)}, "$unset": LEASE_FIELDS}
+        )
+
+
+class SQLiteReminderQueue(ReminderQueue):
+    """Reminders in a table of the SQLite conversation database, shared by every worker on the host.
+
+    Claims run in an immediate transaction, which SQLite serializes across
+    processes, so two workers never lease the same reminder. Times are
+    stored as Unix timestamps.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reminders (
+        id TEXT PRIMARY KEY,
+        phone_number TEXT NOT NULL,
+        message TEXT NOT NULL,
+        due_at REAL NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at REAL NOT NULL,
+        lease_owner TEXT,
+        lease_until REAL,
+        finished_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS reminders_status_due ON reminders (status, due_at);
+    CREATE INDEX IF NOT EXISTS reminders_phone_status ON reminders (phone_number, status);
+    CREATE INDEX IF NOT EXISTS reminders_finished ON reminders (finished_at) WHERE finished_at IS NOT NULL;
+    """
+    COLUMNS = ("id", "phone_number", "message", "due_at", "status", "attempts", "error", "created_at", "lease_owner", "lease_until")
+    TIMES = ("due_at", "created_at", "lease_until")
+
+    def __init__(self, path: str, history_days: float = 30, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.history = timedelta(days=history_days)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        try:
+            self._connection().executescript(self.SCHEMA)
+        except Exception as e:
+            logger.error(f"Failed to create reminder table: {e}")
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, work):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _reminder(self, row) -> Dict:
+        reminder = dict(zip(self.COLUMNS, row))
+        reminder["_id"] = reminder.pop("id")
+        for field in self.TIMES:
+            if reminder[field] is not None:
+                reminder[field] = datetime.fromtimestamp(reminder[field], UTC)
+        return reminder
+
+    def add(self, reminder: Dict):
+        self._connection().execute(
+            "INSERT INTO reminders (id, phone_number, message, due_at, status, attempts, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (reminder["_id"], reminder["phone_number"], reminder["message"], reminder["due_at"].timestamp(),
+             reminder["status"], reminder.get("attempts", 0), reminder["created_at"].timestamp())
+        )
+
+    def count_active(self, phone_number: str) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM reminders WHERE phone_number = ? AND status IN (?, ?)", (phone_number, *ACTIVE)
+        ).fetchone()[0]
+
+    def claim_due(self, before: datetime, owner: str, lease_until: datetime, limit: int) -> List[Dict]:
+        now = datetime.now(UTC).timestamp()
+
+        def claim(conn: sqlite3.Connection) -> List[Dict]:
+            conn.execute("DELETE FROM reminders WHERE finished_at < ?", ((datetime.now(UTC) - self.history).timestamp(),))
+            ids = [row[0] for row in conn.execute(
+                """SELECT id FROM reminders
+                   WHERE due_at < ? AND (status = 'pending' OR (status = 'leased' AND lease_until < ?))
+                   ORDER BY due_at LIMIT ?""",
+                (before.timestamp(), now, limit)
+            )]
+            if not ids:
+                return []
+            marks = ", ".join("?" * len(ids))
+            conn.execute(
+                f"UPDATE reminders SET status = 'leased', lease_owner = ?, lease_until = ? WHERE id IN ({marks})",
+                (owner, lease_until.timestamp(), *ids)
+            )
+            rows = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM reminders WHERE id IN ({marks}) ORDER BY due_at", ids)
+            return [self._reminder(row) for row in rows]
+
+        return self._transaction(claim)
+
+    def _finish(self, reminder_id: str, owner: str, status: str, error: Optional[str] = None):
+        self._connection().execute(
+            """UPDATE reminders SET status = ?, error = COALESCE(?, error), finished_at = ?, lease_owner = NULL, lease_until = NULL
+               WHERE id = ? AND lease_owner = ?""",
+            (status, error, datetime.now(UTC).timestamp(), reminder_id, owner)
+        )
+
+    def complete(self, reminder_id: str, owner: str):
+        self._finish(reminder_id, owner, "sent")
+
+    def release(self, reminder_id: str, owner: str, due_at: Optional[datetime] = None, attempts: Optional[int] = None, error: str = ""):
+        self._connection().execute(
+            """UPDATE reminders SET status = 'pending', due_at = COALESCE(?, due_at), attempts = COALESCE(?, attempts),
+                   error = CASE WHEN ? IS NULL THEN error ELSE ? END, lease_owner = NULL, lease_until = NULL
+               WHERE id = ? AND lease_owner = ?""",
+            (due_at.timestamp() if due_at else None, attempts, attempts, error, reminder_id, owner)
+        )
+
+    def fail(self, reminder_id: str, owner: str, error: str):
+        self._finish(reminder_id, owner, "failed", error)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class MemoryReminderQueue(ReminderQueue):
+    """Reminders in process memory, on a heap by due time. For tests and single-process deployments.
+
+    Other worker processes do not see them and a restart loses them, so the
+    scheduler only accepts reminders into this queue in a process that runs
+    the scheduler itself.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._reminders: Dict[str, Dict] = {}
+        # (due timestamp, id); entries of reminders rescheduled or claimed since are skipped
+        self._heap: List = []
+        self._lock = threading.Lock()
+
+    def add(self, reminder: Dict):
+        with self._lock:
+            self._reminders[reminder["_id"]] = dict(reminder)
+            heapq.heappush(self._heap, (reminder["due_at"].timestamp(), reminder["_id"]))
+
+    def count_active(self, phone_number: str) -> int:
+        with self._lock:
+            return sum(1 for r in self._reminders.values() if r["phone_number"] == phone_number and r["status"] in ACTIVE)
+
+    def claim_due(self, before: datetime, owner: str, lease_until: datetime, limit: int) -> List[Dict]:
+        claimed = []
+        with self._lock:
+            while self._heap and self._heap[0][0] < before.timestamp() and len(claimed) < limit:
+                due, reminder_id = heapq.heappop(self._heap)
+                reminder = self._reminders.get(reminder_id)
+                if reminder is None or reminder["status"] != "pending" or reminder["due_at"].timestamp() != due:
+                    continue
+                reminder.update(status="leased", lease_owner=owner, lease_until=lease_until)
+                claimed.append(dict(reminder))
+        return claimed
+
+    def _finish(self, reminder_id: str, owner: str, **fields) -> Optional[Dict]:
+        reminder = self._reminders.get(reminder_id)
+        if reminder is None or reminder.get("lease_owner") != owner:
+            return None
+        for field in LEASE_FIELDS:
+            reminder.pop(field, None)
+        reminder.update(fields)
+        return reminder
+
+    def complete(self, reminder_id: str, owner: str):
+        with self._lock:
+            # Nothing reads finished reminders back from memory
+            if self._finish(reminder_id, owner, status="sent"):
+                del self._reminders[reminder_id]
+
+    def release(self, reminder_id: str, owner: str, due_at: Optional[datetime] = None, attempts: Optional[int] = None, error: str = ""):
+        with self._lock:
+            reminder = self._finish(reminder_id, owner, status="pending")
+            if reminder is None:
+                return
+            if due_at is not None:
+                reminder["due_at"] = due_at
+            if attempts is not None:
+                reminder.update(attempts=attempts, error=error)
+            heapq.heappush(self._heap, (reminder["due_at"].timestamp(), reminder_id))
+
+    def fail(self, reminder_id: str, owner: str, error: str):
+        with self._lock:
+            if self._finish(reminder_id, owner, status="failed", error=error):
+                del self._reminders[reminder_id]
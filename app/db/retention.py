@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, UTC
+
+from .base import BaseStore
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionJob:
+    """Periodically moves idle conversations out of the hot store.
+
+    Work is done in small batches on a worker thread. After each batch the
+    job sleeps at least `batch_pause` seconds and at least `duty_ratio`
+    times as long as the batch took, so it uses a bounded share of the
+    database however slow it is under live load.
+    """
+
+    def __init__(
+        self,
+        store: BaseStore,
+        idle_days: float,
+        interval: float = 3600,
+        batch_size: int = 100,
+        batch_pause: float = 1.0,
+        duty_ratio: float = 4.0
+    ):
+        self.store = store
+        self.idle_days = idle_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.duty_ratio = duty_ratio
+        self._task = None
+
+    async def run_once(self) -> int:
+        """Archive everything currently idle; returns the number of conversations archived."""
+        idle_before = datetime.now(UTC) - timedelta(days=self.idle_days)
+        total = 0
+        while True:
+            started = time.monotonic()
+            archived = await asyncio.to_thread(self.store.archive_idle, idle_before, self.batch_size)
+            total += archived
+            if archived < self.batch_size:
+                break
+            await asyncio.sleep(max(self.batch_pause, (time.monotonic() - started) * self.duty_ratio))
+        if total:
+            logger.info(f"Archived {total} idle conversations")
+        return total
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Error running retention job: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.idle_days > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,230 @@
+"""Checkpoints of agent runs in progress, so a run cut off by a restart can be resumed.
+
+A run is keyed by the id of the message that started it (Twilio's
+MessageSid), which also makes a retried webhook for the same message
+recognizable. The record keeps only what the run added to its input: the
+model's tool calls, their outputs and handoffs, compressed, plus the name of
+the agent to continue with. The conversation history and the message itself
+are rebuilt from the conversation when the run resumes. A running record is
+leased to the worker executing it; a worker that dies stops renewing its
+leases and another one takes the runs over. Finished records are kept for
+`RUN_HISTORY_HOURS` to answer retries and then expire.
+"""
+import json
+import logging
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional
+
+from bson.binary import Binary
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
+
+from .archive import compress, decompress
+
+logger = logging.getLogger(__name__)
+
+LEASE_FIELDS = {"owner": "", "lease_until": "", "lease_token": ""}
+
+
+def encode_items(items: List[Dict]) -> bytes:
+    return compress(json.dumps(items, separators=(",", ":")).encode("utf-8"), level=3)
+
+
+def decode_items(data: Optional[bytes]) -> List[Dict]:
+    return json.loads(decompress(bytes(data))) if data else []
+
+
+class RunJournal(ABC):
+    """Agent runs in progress with their latest checkpoint."""
+
+    @abstractmethod
+    def begin(self, run: Dict) -> bool:
+        """Record a new running run; False if a run with the same `_id` was already recorded."""
+
+    @abstractmethod
+    def get(self, run_id: str) -> Optional[Dict]:
+        """The run recorded under `run_id`, if any."""
+
+    @abstractmethod
+    def checkpoint(self, run_id: str, owner: str, agent: str, items: List[Dict], lease_until: datetime):
+        """Save the items generated so far; ignored if a checkpoint with as many items was saved already."""
+
+    @abstractmethod
+    def renew(self, owner: str, lease_until: datetime) -> int:
+        """Extend the lease of every run `owner` is executing."""
+
+    @abstractmethod
+    def claim_stale(self, owner: str, lease_until: datetime, limit: int) -> List[Dict]:
+        """Take over up to `limit` running runs whose lease has lapsed, counting an attempt on each."""
+
+    @abstractmethod
+    def release(self, run_id: str, owner: str):
+        """Let the lease lapse now, so the run is taken over without waiting for it."""
+
+    @abstractmethod
+    def finish(self, run_id: str, owner: str, response: str):
+        """Record the run as done with its reply."""
+
+    @abstractmethod
+    def fail(self, run_id: str, owner: Optional[str], error: str):
+        """Give up on a run; with `owner` None whoever holds it."""
+
+
+class MongoRunJournal(RunJournal):
+    """Runs in a Mongo collection; claiming works as for reminders, by ids then a tagged update_many."""
+
+    def __init__(self, collection: Collection, history_hours: float = 24):
+        self.collection = collection
+        try:
+            collection.create_index([("status", ASCENDING), ("lease_until", ASCENDING)])
+            collection.create_index([("owner", ASCENDING), ("status", ASCENDING)], sparse=True)
+            collection.create_index("lease_token", sparse=True)
+            # Finished and failed runs only
+            collection.create_index("finished_at", expireAfterSeconds=int(history_hours * 3600), sparse=True)
+        except Exception as e:
+            logger.error(f"Failed to create run journal indexes: {e}")
+            raise
+
+    def begin(self, run: Dict) -> bool:
+        try:
+            self.collection.insert_one(run)
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def get(self, run_id: str) -> Optional[Dict]:
+        return self.collection.find_one({"_id": run_id})
+
+    def checkpoint(self, run_id: str, owner: str, agent: str, items: List[Dict], lease_until: datetime):
+        self.collection.update_one(
+            {"_id": run_id, "owner": owner, "status": "running", "step": {"$lt": len(items)}},
+            {"$set": {
+                "agent": agent,
+                "items": Binary(encode_items(items)),
+                "step": len(items),
+                "lease_until": lease_until,
+                "updated_at": datetime.now(UTC)
+            }}
+        )
+
+    def renew(self, owner: str, lease_until: datetime) -> int:
+        return self.collection.update_many(
+            {"owner": owner, "status": "running"}, {"$set": {"lease_until": lease_until}}
+        ).modified_count
+
+    def claim_stale(self, owner: str, lease_until: datetime, limit: int) -> List[Dict]:
+        stale = {"status": "running", "lease_until": {"$lte": datetime.now(UTC)}}
+        ids = [doc["_id"] for doc in self.collection.find(stale, {"_id": 1}).sort("lease_until", ASCENDING).limit(limit)]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        self.collection.update_many(
+            {**stale, "_id": {"$in": ids}},
+            {"$set": {"owner": owner, "lease_until": lease_until, "lease_token": token}, "$inc": {"attempts": 1}}
+        )
+        return list(self.collection.find({"lease_token": token}))
+
+    def release(self, run_id: str, owner: str):
+        self.collection.update_one(
+            {"_id": run_id, "owner": owner, "status": "running"}, {"$set": {"lease_until": datetime.now(UTC)}}
+        )
+
+    def finish(self, run_id: str, owner: str, response: str):
+        now = datetime.now(UTC)
+        self.collection.update_one(
+            {"_id": run_id, "owner": owner},
+            {"$set": {"status": "done", "response": response, "finished_at": now, "updated_at": now},
+             "$unset": {**LEASE_FIELDS, "items": ""}}
+        )
+
+    def fail(self, run_id: str, owner: Optional[str], error: str):
+        now = datetime.now(UTC)
+        query = {"_id": run_id} if owner is None else {"_id": run_id, "owner": owner}
+        self.collection.update_one(
+            query,
+            {"$set": {"status": "failed", "error": error, "finished_at": now, "updated_at": now},
+             "$unset": {**LEASE_FIELDS, "items": ""}}
+        )
+
+
+class MemoryRunJournal(RunJournal):
+    """Runs in process memory. Nothing survives a restart, but retries are still recognized; for tests and single-process deployments."""
+
+    def __init__(self, history_hours: float = 24):
+        self.history = timedelta(hours=history_hours)
+        self._runs: Dict[str, Dict] = {}
+        # (finished_at, id) in the order runs ended, for expiry
+        self._finished = deque()
+        self._lock = threading.Lock()
+
+    def begin(self, run: Dict) -> bool:
+        with self._lock:
+            cutoff = datetime.now(UTC) - self.history
+            while self._finished and self._finished[0][0] < cutoff:
+                self._runs.pop(self._finished.popleft()[1], None)
+            if run["_id"] in self._runs:
+                return False
+            self._runs[run["_id"]] = dict(run)
+            return True
+
+    def get(self, run_id: str) -> Optional[Dict]:
+        with self._lock:
+            run = self._runs.get(run_id)
+            return dict(run) if run is not None else None
+
+    def _held(self, run_id: str, owner: Optional[str]) -> Optional[Dict]:
+        run = self._runs.get(run_id)
+        if run is None or (owner is not None and run.get("owner") != owner):
+            return None
+        return run
+
+    def checkpoint(self, run_id: str, owner: str, agent: str, items: List[Dict], lease_until: datetime):
+        with self._lock:
+            run = self._held(run_id, owner)
+            if run is not None and run["status"] == "running" and run.get("step", 0) < len(items):
+                run.update(agent=agent, items=encode_items(items), step=len(items), lease_until=lease_until, updated_at=datetime.now(UTC))
+
+    def renew(self, owner: str, lease_until: datetime) -> int:
+        with self._lock:
+            held = [run for run in self._runs.values() if run.get("owner") == owner and run["status"] == "running"]
+            for run in held:
+                run["lease_until"] = lease_until
+            return len(held)
+
+    def claim_stale(self, owner: str, lease_until: datetime, limit: int) -> List[Dict]:
+        now = datetime.now(UTC)
+        with self._lock:
+            stale = sorted(
+                (run for run in self._runs.values() if run["status"] == "running" and run["lease_until"] <= now),
+                key=lambda run: run["lease_until"]
+            )[:limit]
+            for run in stale:
+                run.update(owner=owner, lease_until=lease_until, attempts=run.get("attempts", 0) + 1)
+            return [dict(run) for run in stale]
+
+    def release(self, run_id: str, owner: str):
+        with self._lock:
+            run = self._held(run_id, owner)
+            if run is not None and run["status"] == "running":
+                run["lease_until"] = datetime.now(UTC)
+
+    def _end(self, run_id: str, owner: Optional[str], **fields):
+        with self._lock:
+            run = self._held(run_id, owner)
+            if run is None:
+                return
+            for field in (*LEASE_FIELDS, "items"):
+                run.pop(field, None)
+            run.update(fields, finished_at=datetime.now(UTC))
+            self._finished.append((run["finished_at"], run_id))
+
+    def finish(self, run_id: str, owner: str, response: str):
+        self._end(run_id, owner, status="done", response=response)
+
+    def fail(self, run_id: str, owner: Optional[str], error: str):
+        self._end(run_id, owner, status="failed", error=error)
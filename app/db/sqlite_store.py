@@ -0,0 +1,302 @@
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, UTC
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .base import BaseStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    phone_number TEXT PRIMARY KEY,
+    current_agent TEXT,
+    metadata TEXT,
+    last_updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_last_updated ON conversations (last_updated);
+CREATE INDEX IF NOT EXISTS conversations_current_agent ON conversations (current_agent, phone_number);
+CREATE TABLE IF NOT EXISTS messages (
+    phone_number TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (phone_number, seq)
+) WITHOUT ROWID;
+"""
+
+# Statements are module constants so each connection's statement cache
+# compiles them once and reuses the prepared statement afterwards.
+SELECT_CONVERSATION = "SELECT current_agent, metadata FROM conversations WHERE phone_number = ?"
+SELECT_MESSAGE_COUNT = "SELECT COUNT(*) FROM messages WHERE phone_number = ?"
+SELECT_MESSAGES = "SELECT role, content, timestamp FROM messages WHERE phone_number = ? ORDER BY seq"
+SELECT_LAST_MESSAGES = """
+    SELECT role, content, timestamp FROM (
+        SELECT seq, role, content, timestamp FROM messages WHERE phone_number = ? ORDER BY seq DESC LIMIT ?
+    ) ORDER BY seq
+"""
+SELECT_PAGE = """
+    SELECT role, content, timestamp, seq FROM (
+        SELECT seq, role, content, timestamp FROM messages WHERE phone_number = ? AND seq <= ? ORDER BY seq DESC LIMIT ?
+    ) ORDER BY seq
+"""
+SELECT_CONVERSATIONS = """
+    SELECT phone_number, current_agent, metadata, last_updated FROM conversations
+    WHERE last_updated >= ? AND last_updated < ? ORDER BY last_updated
+"""
+SELECT_RECIPIENTS = "SELECT phone_number, current_agent, metadata FROM conversations WHERE phone_number > ?"
+TOUCH_CONVERSATION = """
+    INSERT INTO conversations (phone_number, last_updated) VALUES (?, ?)
+    ON CONFLICT (phone_number) DO UPDATE SET last_updated = excluded.last_updated
+"""
+UPDATE_AGENT = "UPDATE conversations SET current_agent = ? WHERE phone_number = ?"
+UPDATE_METADATA = "UPDATE conversations SET metadata = ? WHERE phone_number = ?"
+APPEND_MESSAGE = """
+    INSERT INTO messages (phone_number, seq, role, content, timestamp)
+    SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM messages WHERE phone_number = ?
+"""
+INSERT_MESSAGE = "INSERT INTO messages (phone_number, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)"
+DELETE_MESSAGES = "DELETE FROM messages WHERE phone_number = ?"
+DELETE_CONVERSATION = "DELETE FROM conversations WHERE phone_number = ?"
+
+
+def _message(row) -> Dict:
+    return {"role": row[0], "content": row[1], "timestamp": datetime.fromisoformat(row[2])}
+
+
+class SQLiteStore(BaseStore):
+    """Embedded SQLite backend for single-node deployments and tests.
+
+    Messages live in an append-only table keyed by (phone_number, seq), so
+    appending a message is one indexed insert instead of rewriting the whole
+    history. The database runs in WAL mode, which lets readers proceed while
+    a write is in progress. Each thread gets its own connection, created on
+    first use and never shared.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = str(path)
+        self.busy_timeout_ms = busy_timeout_ms
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        try:
+            self._connection().executescript(SCHEMA)
+            logger.info(f"SQLite store ready at {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to initialize SQLite store: {e}")
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; writes open their own transactions below
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=64, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _write(self, statements):
+        """Run (sql, params) pairs in a single immediate transaction."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_conversation(self, phone_number: str) -> Dict:
+        """Get conversation data for a phone number"""
+        try:
+            conn = self._connection()
+            row = conn.execute(SELECT_CONVERSATION, (phone_number,)).fetchone()
+            if row is None:
+                return self.empty_conversation()
+            return {
+                "current_agent": row[0],
+                "conversation_history": [_message(m) for m in conn.execute(SELECT_MESSAGES, (phone_number,))],
+                "metadata": json.loads(row[1]) if row[1] else {}
+            }
+        except Exception as e:
+            logger.error(f"Error getting conversation data for {phone_number}: {e}")
+            raise
+
+    def get_conversation_history(self, phone_number: str, limit: Optional[int] = None) -> List[Dict]:
+        """Get conversation history for a phone number"""
+        try:
+            if limit:
+                rows = self._connection().execute(SELECT_LAST_MESSAGES, (phone_number, limit))
+            else:
+                rows = self._connection().execute(SELECT_MESSAGES, (phone_number,))
+            return [_message(m) for m in rows]
+        except Exception as e:
+            logger.error(f"Error getting conversation history for {phone_number}: {e}")
+            raise
+
+    def get_conversation_summary(self, phone_number: str) -> Dict:
+        """Get agent, metadata and message count for a phone number"""
+        try:
+            conn = self._connection()
+            row = conn.execute(SELECT_CONVERSATION, (phone_number,)).fetchone()
+            if row is None:
+                return {"current_agent": None, "metadata": {}, "message_count": 0}
+            return {
+                "current_agent": row[0],
+                "metadata": json.loads(row[1]) if row[1] else {},
+                "message_count": conn.execute(SELECT_MESSAGE_COUNT, (phone_number,)).fetchone()[0]
+            }
+        except Exception as e:
+            logger.error(f"Error getting conversation summary for {phone_number}: {e}")
+            raise
+
+    def get_history_page(self, phone_number: str, before: Optional[int], limit: int) -> Tuple[List[Dict], int]:
+        """Get one page of conversation history"""
+        try:
+            # Positions are 0-based; seq starts at 1
+            last_seq = 2 ** 62 if before is None else before
+            rows = self._connection().execute(SELECT_PAGE, (phone_number, last_seq, limit)).fetchall()
+            start = rows[0][3] - 1 if rows else 0
+            return [_message(row) for row in rows], start
+        except Exception as e:
+            logger.error(f"Error getting history page for {phone_number}: {e}")
+            raise
+
+    def iter_conversations(
+        self,
+        updated_since: Optional[datetime] = None,
+        updated_until: Optional[datetime] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict]:
+        """Yield every conversation updated in the given range, oldest first"""
+        # A dedicated connection, so a long export does not hold this thread's connection
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            since = updated_since.astimezone(UTC).isoformat() if updated_since else ""
+            until = updated_until.astimezone(UTC).isoformat() if updated_until else "9999"
+            cursor = conn.execute(SELECT_CONVERSATIONS, (since, until))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for phone_number, current_agent, metadata, last_updated in rows:
+                    yield {
+                        "phone_number": phone_number,
+                        "current_agent": current_agent,
+                        "conversation_history": [_message(m) for m in conn.execute(SELECT_MESSAGES, (phone_number,))],
+                        "metadata": json.loads(metadata) if metadata else {},
+                        "last_updated": datetime.fromisoformat(last_updated)
+                    }
+        finally:
+            conn.close()
+
+    def iter_recipients(
+        self,
+        current_agent: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        after: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict]:
+        """Yield matching conversations in phone number order, one keyset page at a time"""
+        sql = SELECT_RECIPIENTS
+        filters = []
+        if current_agent is not None:
+            sql += " AND current_agent = ?"
+            filters.append(current_agent)
+        for key, value in (metadata or {}).items():
+            # IS matches JSON true against 1 and a missing key against None
+            sql += " AND json_extract(metadata, ?) IS ?"
+            filters.extend([f'$."{key}"', value])
+        sql += " ORDER BY phone_number LIMIT ?"
+        # A dedicated connection, so a long broadcast does not hold this thread's connection
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            last = after or ""
+            while True:
+                rows = conn.execute(sql, (last, *filters, batch_size)).fetchall()
+                for phone_number, agent, data in rows:
+                    yield {
+                        "phone_number": phone_number,
+                        "current_agent": agent,
+                        "metadata": json.loads(data) if data else {}
+                    }
+                if len(rows) < batch_size:
+                    break
+                last = rows[-1][0]
+        finally:
+            conn.close()
+
+    def update_conversation(
+        self,
+        phone_number: str,
+        current_agent: Optional[str] = None,
+        conversation_history: Optional[List] = None,
+        metadata: Optional[Dict] = None
+    ):
+        """Update conversation data"""
+        now = datetime.now(UTC).isoformat()
+        statements = [(TOUCH_CONVERSATION, (phone_number, now))]
+        if current_agent is not None:
+            statements.append((UPDATE_AGENT, (current_agent, phone_number)))
+        if metadata is not None:
+            statements.append((UPDATE_METADATA, (json.dumps(metadata), phone_number)))
+        if conversation_history is not None:
+            statements.append((DELETE_MESSAGES, (phone_number,)))
+            for seq, message in enumerate(conversation_history, start=1):
+                timestamp = message.get("timestamp") or datetime.now(UTC)
+                if isinstance(timestamp, datetime):
+                    timestamp = timestamp.isoformat()
+                statements.append((INSERT_MESSAGE, (phone_number, seq, message["role"], message["content"], timestamp)))
+        try:
+            self._write(statements)
+        except Exception as e:
+            logger.error(f"Error updating conversation data for {phone_number}: {e}")
+            raise
+
+    def append_to_history(self, phone_number: str, role: str, content: str):
+        """Append a new message to the conversation history"""
+        now = datetime.now(UTC).isoformat()
+        try:
+            self._write([
+                (TOUCH_CONVERSATION, (phone_number, now)),
+                (APPEND_MESSAGE, (phone_number, role, content, now, phone_number)),
+            ])
+        except Exception as e:
+            logger.error(f"Error appending message to history for {phone_number}: {e}")
+            raise
+
+    def clear_conversation(self, phone_number: str):
+        """Clear conversation data for a phone number"""
+        try:
+            self._write([(DELETE_MESSAGES, (phone_number,)), (DELETE_CONVERSATION, (phone_number,))])
+            logger.info(f"Cleared conversation data for {phone_number}")
+        except Exception as e:
+            logger.error(f"Error clearing conversation data for {phone_number}: {e}")
+            raise
+
+    def reset_db(self):
+        """Delete all conversations and messages"""
+        try:
+            self._write([("DELETE FROM messages", ()), ("DELETE FROM conversations", ())])
+            logger.info("Successfully reset SQLite database")
+        except Exception as e:
+            logger.error(f"Error resetting SQLite database: {e}")
+            raise
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
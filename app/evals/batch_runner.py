@@ -0,0 +1,269 @@
+"""Offline batch evaluation of the agent graph.
+
+Usage:
+    python -m app.evals.batch_runner suite.jsonl --out results.jsonl --concurrency 16 --timeout 120
+    python -m app.evals.batch_runner suite.jsonl --out results.jsonl --fake       # local fake model, no API calls
+    python -m app.evals.batch_runner suite.jsonl --out results.jsonl --resume     # continue an interrupted run
+
+Each input line is one case, in any of these shapes:
+    {"request_id": "...", "title": "...", "body": "..."}                         (like requests.jsonl)
+    {"id": "...", "question": "...", "expected_agent": "Contract Agent"}
+    {"id": "...", "messages": [{"role": "user", "content": "..."}, ...], "expected_agent": "..."}
+
+Cases run through create_triage_agent() on a bounded pool of workers, each
+with its own timeout. Results are appended to --out as they finish, one JSON
+line per case; that file is also the checkpoint, so --resume skips every
+case already in it. When the run ends, latency, token, routing and
+disclaimer statistics over the whole results file are printed and written
+to --summary.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import statistics
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+import openai
+from agents import Runner, RunConfig
+
+from ..agents.triage_agent import create_triage_agent
+
+logger = logging.getLogger(__name__)
+
+DISCLAIMER_PATTERN = re.compile(r"disclaimer|licensed attorney|qualified attorney|consulte? (con )?un abogado", re.IGNORECASE)
+# Provider errors worth retrying; anything else fails the case immediately
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+OUTPUT_MAX_CHARS = 2000
+
+
+def load_cases(path: str) -> Iterator[Dict]:
+    """Normalized cases from a JSONL file, read lazily."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            raw = json.loads(line)
+            case_id = str(raw.get("id") or raw.get("request_id") or f"line-{line_number}")
+            if raw.get("messages"):
+                messages = [{"role": m["role"], "content": m["content"]} for m in raw["messages"]]
+            else:
+                text = raw.get("question") or raw.get("message") or raw.get("body") or ""
+                messages = [{"role": "user", "content": text}]
+            yield {"id": case_id, "messages": messages, "expected_agent": raw.get("expected_agent")}
+
+
+def completed_ids(path: Path) -> Set[str]:
+    """IDs already in a results file; a line cut short by a crash is dropped."""
+    done = set()
+    if not path.exists():
+        return done
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                break
+            valid_bytes += len(line)
+    if valid_bytes < path.stat().st_size:
+        logger.warning(f"Truncating partial line at the end of {path}")
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+
+class BatchRunner:
+    def __init__(self, run_config: RunConfig, concurrency: int, timeout: float, retries: int = 2, max_turns: int = 10):
+        self.agent = create_triage_agent()
+        self.run_config = run_config
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.max_turns = max_turns
+        self.finished = 0
+        self._started = time.monotonic()
+
+    async def run_case(self, case: Dict) -> Dict:
+        result = {"id": case["id"], "expected_agent": case["expected_agent"]}
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                async with asyncio.timeout(self.timeout):
+                    run = await Runner.run(self.agent, case["messages"], run_config=self.run_config, max_turns=self.max_turns)
+                break
+            except TimeoutError:
+                return {**result, "status": "timeout", "latency_ms": round((time.monotonic() - started) * 1000)}
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.retries:
+                    return {**result, "status": "error", "error": f"{type(e).__name__}: {e}"}
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                return {**result, "status": "error", "error": f"{type(e).__name__}: {e}"}
+
+        output = str(run.final_output or "")
+        final_agent = run.last_agent.name
+        return {
+            **result,
+            "status": "ok",
+            "final_agent": final_agent,
+            "routed_correctly": final_agent == case["expected_agent"] if case["expected_agent"] else None,
+            "disclaimer": bool(DISCLAIMER_PATTERN.search(output)),
+            "latency_ms": round((time.monotonic() - started) * 1000),
+            "requests": sum(r.usage.requests for r in run.raw_responses),
+            "input_tokens": sum(r.usage.input_tokens for r in run.raw_responses),
+            "output_tokens": sum(r.usage.output_tokens for r in run.raw_responses),
+            "total_tokens": sum(r.usage.total_tokens for r in run.raw_responses),
+            "output": output[:OUTPUT_MAX_CHARS]
+        }
+
+    async def _worker(self, queue: asyncio.Queue, out):
+        while True:
+            case = await queue.get()
+            if case is None:
+                return
+            result = await self.run_case(case)
+            # Whole lines only, so an interrupted run leaves at most one partial line
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            self.finished += 1
+            if self.finished % 100 == 0:
+                rate = self.finished / (time.monotonic() - self._started)
+                logger.info(f"{self.finished} cases finished ({rate:.1f}/s)")
+
+    async def run(self, cases: Iterator[Dict], skip: Set[str], out_path: Path):
+        # A bounded queue keeps only a few cases in memory however large the suite is
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        with open(out_path, "a", encoding="utf-8") as out:
+            workers = [asyncio.create_task(self._worker(queue, out)) for _ in range(self.concurrency)]
+            for case in cases:
+                if case["id"] not in skip:
+                    await queue.put(case)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            os.fsync(out.fileno())
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def summarize(results_path: Path) -> Dict:
+    """Aggregate statistics over every result in the file, including those of earlier, resumed runs."""
+    statuses = Counter()
+    final_agents = Counter()
+    confusion: Dict[str, Counter] = defaultdict(Counter)
+    latencies: List[float] = []
+    latency_by_agent: Dict[str, List[float]] = defaultdict(list)
+    tokens = Counter()
+    labelled = correct = with_disclaimer = 0
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            result = json.loads(line)
+            statuses[result["status"]] += 1
+            if result["status"] != "ok":
+                continue
+            agent = result["final_agent"]
+            final_agents[agent] += 1
+            latencies.append(result["latency_ms"])
+            latency_by_agent[agent].append(result["latency_ms"])
+            for field in ("requests", "input_tokens", "output_tokens", "total_tokens"):
+                tokens[field] += result.get(field, 0)
+            with_disclaimer += bool(result["disclaimer"])
+            if result.get("expected_agent"):
+                labelled += 1
+                correct += bool(result["routed_correctly"])
+                confusion[result["expected_agent"]][agent] += 1
+
+    ok = statuses["ok"]
+    return {
+        "cases": sum(statuses.values()),
+        "status": dict(statuses),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies)) if latencies else None,
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None
+        },
+        "latency_ms_p50_by_agent": {agent: percentile(values, 0.5) for agent, values in sorted(latency_by_agent.items())},
+        "tokens": {**tokens, "mean_per_case": round(tokens["total_tokens"] / ok) if ok else None},
+        "routing": {
+            "final_agents": dict(final_agents),
+            "labelled": labelled,
+            "accuracy": round(correct / labelled, 4) if labelled else None,
+            "confusion": {expected: dict(actual) for expected, actual in sorted(confusion.items())}
+        },
+        "disclaimer_rate": round(with_disclaimer / ok, 4) if ok else None
+    }
+
+
+def print_summary(summary: Dict):
+    print(f"{summary['cases']} cases: " + ", ".join(f"{count} {status}" for status, count in sorted(summary["status"].items())))
+    latency = summary["latency_ms"]
+    if latency["p50"] is not None:
+        print(f"latency ms: mean {latency['mean']}  p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"tokens: {summary['tokens'].get('total_tokens', 0)} total, {summary['tokens']['mean_per_case']} per case")
+    routing = summary["routing"]
+    print(f"final agents: {routing['final_agents']}")
+    if routing["labelled"]:
+        print(f"routing accuracy: {routing['accuracy']:.1%} of {routing['labelled']} labelled cases")
+        for expected, actual in routing["confusion"].items():
+            print(f"  {expected:<16} -> {actual}")
+    if summary["disclaimer_rate"] is not None:
+        print(f"answers with a disclaimer: {summary['disclaimer_rate']:.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a suite of conversations through the agent graph and report statistics.")
+    parser.add_argument("suite", help="JSONL file of cases")
+    parser.add_argument("--out", required=True, help="JSONL results file, also used as the checkpoint")
+    parser.add_argument("--summary", help="where to write the statistics (default: <out>.summary.json)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per case, retries included")
+    parser.add_argument("--retries", type=int, default=2, help="retries for rate limits and transient provider errors")
+    parser.add_argument("--resume", action="store_true", help="skip cases already in --out")
+    parser.add_argument("--fake", action="store_true", help="use the local fake model instead of the provider")
+    parser.add_argument("--fake-latency", default="0.05,0.3", help="min,max seconds per fake model call")
+    parser.add_argument("--model", help="run every agent on this model instead of its own")
+    args = parser.parse_args(argv)
+
+    out_path = Path(args.out)
+    if out_path.exists() and out_path.stat().st_size and not args.resume:
+        parser.error(f"{out_path} already has results; pass --resume to continue it or choose another --out")
+    skip = completed_ids(out_path) if args.resume else set()
+    if skip:
+        logger.info(f"Resuming: {len(skip)} cases already done")
+
+    if args.fake:
+        from .fake_model import FakeModel
+        # create_triage_agent() insists on a key even though the fake model never uses it
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        low, high = (float(v) for v in args.fake_latency.split(","))
+        model = FakeModel(latency=(low, high))
+    else:
+        model = args.model
+    run_config = RunConfig(model=model, workflow_name="Batch evaluation", tracing_disabled=True)
+
+    runner = BatchRunner(run_config, args.concurrency, args.timeout, args.retries)
+    started = time.monotonic()
+    asyncio.run(runner.run(load_cases(args.suite), skip, out_path))
+    logger.info(f"Ran {runner.finished} cases in {time.monotonic() - started:.1f}s")
+
+    summary = summarize(out_path)
+    Path(args.summary or f"{args.out}.summary.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False))
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import random
+import re
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from agents import Usage
+from agents.items import ModelResponse
+from agents.models.interface import Model
+from openai.types.responses import ResponseFunctionToolCall, ResponseOutputMessage, ResponseOutputText
+
+# Keyword routing used by the fake triage step, checked in order; anything else goes to the Legal Agent
+ROUTING_RULES: List[Tuple[str, re.Pattern]] = [
+    ("Contract Agent", re.compile(r"contrat|contract|cl[aá]usula|clause|arrendamiento|lease", re.IGNORECASE)),
+    ("Research Agent", re.compile(r"reforma|reciente|jurisprudencia|investiga|research|latest|recent|update", re.IGNORECASE)),
+]
+DEFAULT_AGENT = "Legal Agent"
+
+DISCLAIMER = (
+    "DISCLAIMER: This information is provided for general guidance only and should not be considered as "
+    "formal legal advice. For specific legal matters, please consult with a licensed attorney."
+)
+
+
+def _last_user_text(input) -> str:
+    if isinstance(input, str):
+        return input
+    for item in reversed(input):
+        if item.get("role") == "user":
+            content = item.get("content")
+            if isinstance(content, str):
+                return content
+            return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeModel(Model):
+    """Deterministic stand-in for the OpenAI model, for offline evaluation and load tests.
+
+    When the running agent can hand off (the triage agent), it calls the
+    handoff chosen by keyword rules; otherwise it answers with canned text
+    ending in the standard disclaimer. Each call sleeps for a latency drawn
+    uniformly from `latency` seconds, and usage is estimated from text length.
+    """
+
+    def __init__(self, latency: Tuple[float, float] = (0.05, 0.3), seed: Optional[int] = None):
+        self.latency = latency
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def route(text: str) -> str:
+        for agent_name, pattern in ROUTING_RULES:
+            if pattern.search(text):
+                return agent_name
+        return DEFAULT_AGENT
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing) -> ModelResponse:
+        await asyncio.sleep(self._random.uniform(*self.latency))
+        question = _last_user_text(input)
+        prompt_tokens = _tokens(system_instructions or "") + sum(_tokens(str(item)) for item in (input if isinstance(input, list) else [input]))
+
+        by_agent: Dict[str, object] = {h.agent_name: h for h in handoffs}
+        target = by_agent.get(self.route(question)) or by_agent.get(DEFAULT_AGENT)
+        if target is not None:
+            output = ResponseFunctionToolCall(
+                id=f"fc_{uuid.uuid4().hex}",
+                call_id=f"call_{uuid.uuid4().hex}",
+                name=target.tool_name,
+                arguments="{}",
+                type="function_call",
+                status="completed"
+            )
+            completion_tokens = 10
+        else:
+            text = f"Regarding your question ({question[:80]}): this is a simulated answer.\n\n{DISCLAIMER}"
+            output = ResponseOutputMessage(
+                id=f"msg_{uuid.uuid4().hex}",
+                content=[ResponseOutputText(annotations=[], text=text, type="output_text")],
+                role="assistant",
+                status="completed",
+                type="message"
+            )
+            completion_tokens = _tokens(text)
+
+        usage = Usage(requests=1, input_tokens=prompt_tokens, output_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+        return ModelResponse(output=[output], usage=usage, referenceable_id=None)
+
+    def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing):
+        raise NotImplementedError("FakeModel only supports non-streamed runs")
@@ -0,0 +1,90 @@
+"""The ASGI application factory shared by every entry point."""
+import asyncio
+import logging
+from typing import Optional
+
+from dotenv import load_dotenv
+from quart import Quart
+
+from .agents import close_client
+from .api.admin import create_admin_blueprint
+from .api.web_chat import create_web_chat_blueprint
+from .api.whatsapp import create_whatsapp_blueprint
+from .config import Config
+from .services.container import AppServices, build_services
+from .utils import profiling, tracing
+from .utils.log_config import configure_logging, parse_sample_rates
+
+logger = logging.getLogger(__name__)
+
+
+def create_app(config_class=Config, services: Optional[AppServices] = None) -> Quart:
+    """Build the Quart application.
+
+    Logging, tracing and the services (agent graph, store, clients, caches)
+    are set up here once; blueprints get the services injected, so a request
+    only does the work of that request. Pass `services` to reuse or replace
+    them, e.g. in tests.
+    """
+    load_dotenv()
+
+    # Configure logging once, through a background writer
+    configure_logging(
+        level=config_class.LOG_LEVEL,
+        fmt=config_class.LOG_FORMAT,
+        sample_rates=parse_sample_rates(config_class.LOG_SAMPLE_RATES),
+        max_chars=config_class.LOG_MAX_MESSAGE_CHARS,
+        redact=config_class.LOG_REDACT_PHONES
+    )
+
+    # Record agent traces locally (or not at all) instead of exporting them by default
+    tracing.configure_tracing()
+
+    if services is None:
+        services = build_services()
+
+    app = Quart(__name__)
+    app.config.from_object(config_class)
+    app.extensions["services"] = services
+
+    web_chat = create_web_chat_blueprint(services)
+    for blueprint in (create_whatsapp_blueprint(services), web_chat, create_admin_blueprint(services)):
+        app.register_blueprint(blueprint)
+
+    # Per-request memory accounting, a single flag check until memory tracing is turned on
+    profiling.install_request_accounting(app, profiling.slow_requests)
+
+    @app.before_serving
+    async def start_background_jobs():
+        # Every worker flushes its own analytics counters
+        services.analytics.start()
+        # and picks up cached answers approved through any worker, rebuilding the index when due
+        services.semantic_cache.start()
+        # and renews the leases of its agent runs, taking over runs other workers left unfinished
+        services.runs.start()
+        if Config.RUN_BACKGROUND_JOBS:
+            services.retention_job.start()
+            # Broadcasts stopped by a shutdown or left behind by a dead worker continue from their checkpoints
+            await services.broadcasts.resume_interrupted()
+            services.reminders.start()
+
+    @app.after_serving
+    async def stop_background_jobs():
+        deadline = asyncio.get_running_loop().time() + Config.SHUTDOWN_BUDGET_SECONDS
+        await services.retention_job.stop()
+        # Reminders not sent yet are handed back for another worker
+        await services.reminders.stop()
+        # Running broadcasts save their checkpoints for the next worker to resume
+        await services.broadcasts.stop()
+        # Agent runs not finished by the deadline are handed back at their last checkpoint
+        remaining = max(0.0, deadline - asyncio.get_running_loop().time())
+        await asyncio.gather(
+            web_chat.drain(remaining),
+            services.runs.drain(min(Config.RUN_DRAIN_SECONDS, remaining))
+        )
+        await services.analytics.stop()
+        await services.semantic_cache.stop()
+        await close_client()
+
+    logger.info("Application created")
+    return app
@@ -0,0 +1,375 @@
+"""Production launcher: N ASGI worker processes behind a phone-number-affine proxy.
+
+Usage:
+    python -m app.server.launcher --workers 4 --port 5001
+
+Each worker is a Hypercorn process serving app.app:app on a Unix socket.
+The front proxy routes every request by a consistent hash of the sender's
+normalized phone number (or web chat session ID), so a sender keeps hitting
+the same worker and its per-process caches stay hot. WebSocket connections
+are proxied as well.
+
+Signals:
+    SIGTERM / SIGINT   stop accepting, finish in-flight requests, stop workers
+    SIGTTIN            add a worker
+    SIGTTOU            remove the newest worker after draining it
+"""
+import argparse
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+import aiohttp
+from aiohttp import web
+
+from ..config import Config
+from ..utils.log_config import configure_logging, parse_sample_rates
+from ..utils.text import normalize_phone_number
+from .hashring import HashRing
+
+logger = logging.getLogger(__name__)
+
+# Headers that describe one connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "content-length",
+}
+
+# Set by the client during the handshake; the proxy opens its own upstream WebSocket
+WEBSOCKET_HANDSHAKE_HEADERS = {"sec-websocket-key", "sec-websocket-version", "sec-websocket-extensions", "sec-websocket-accept"}
+
+DEBUG_CONVERSATION_PREFIX = "/debug/conversation/"
+
+# Broadcasts are kept in the memory of the worker that created them unless the store is shared, so they all go to
+# worker 0, which also resumes interrupted ones
+PINNED_PREFIXES = ("/api/broadcasts",)
+
+# Profiling endpoints report on the process that serves them: they go to the worker named by `worker=`, worker 0 by default
+PROFILING_PREFIX = "/debug/"
+
+# A worker is killed `graceful_timeout` seconds after SIGTERM. Hypercorn first waits up to this share of
+# that time for open connections, then the application's shutdown hooks get what is left, less a margin to exit.
+CONNECTION_GRACE_SHARE = 0.25
+EXIT_MARGIN_SECONDS = 2
+
+
+def routing_key(request: web.Request, body: bytes) -> Optional[str]:
+    """The normalized phone number a request is about, if any."""
+    if request.content_type == "application/x-www-form-urlencoded" and body:
+        form = parse_qs(body.decode("utf-8", "replace"))
+        for field in ("From", "phone_number"):
+            if form.get(field):
+                return normalize_phone_number(form[field][0])
+    if request.query.get("session_id"):
+        return "web:" + request.query["session_id"]
+    if request.query.get("phone_number"):
+        return normalize_phone_number(request.query["phone_number"])
+    if request.path.startswith(DEBUG_CONVERSATION_PREFIX):
+        return normalize_phone_number(request.path[len(DEBUG_CONVERSATION_PREFIX):])
+    return None
+
+
+def pinned_worker(request: web.Request) -> Optional[int]:
+    """The index of the worker that must serve a request, if it is not routed by key.
+
+    Raises ValueError for a `worker` parameter that is not a worker index.
+    """
+    if request.path.startswith(PINNED_PREFIXES):
+        return 0
+    if request.path.startswith(PROFILING_PREFIX) and not request.path.startswith(DEBUG_CONVERSATION_PREFIX):
+        index = int(request.query.get("worker", 0))
+        if index < 0:
+            raise ValueError(f"Invalid worker index: {index}")
+        return index
+    return None
+
+
+class Worker:
+    def __init__(self, index: int, socket_path: str):
+        self.index = index
+        self.name = f"worker-{index}"
+        self.socket_path = socket_path
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.inflight = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.stopping = False
+
+    def begin(self):
+        self.inflight += 1
+        self.idle.clear()
+
+    def end(self):
+        self.inflight -= 1
+        if self.inflight == 0:
+            self.idle.set()
+
+
+class Launcher:
+    def __init__(self, host: str, port: int, workers: int, socket_dir: str, graceful_timeout: float, startup_timeout: float = 60):
+        self.host = host
+        self.port = port
+        self.initial_workers = workers
+        self.socket_dir = Path(socket_dir)
+        self.graceful_timeout = graceful_timeout
+        self.startup_timeout = startup_timeout
+        self.ring = HashRing()
+        self.workers: Dict[str, Worker] = {}
+        self._shutdown = asyncio.Event()
+        self._scaling = asyncio.Lock()
+        self._next_fallback = 0
+        # Workers must agree on the key signing web chat session IDs; without a configured one they share a random one
+        self.session_secret = Config.WEB_CHAT_SESSION_SECRET or secrets.token_hex(32)
+
+    # Worker processes
+
+    async def _spawn(self, index: int) -> Worker:
+        worker = Worker(index, str(self.socket_dir / f"worker-{index}.sock"))
+        Path(worker.socket_path).unlink(missing_ok=True)
+        connection_grace = int(self.graceful_timeout * CONNECTION_GRACE_SHARE)
+        env = dict(
+            os.environ,
+            WORKER_ID=str(index),
+            RUN_BACKGROUND_JOBS="true" if index == 0 else "false",
+            WEB_CHAT_SESSION_SECRET=self.session_secret,
+            TRUSTED_PROXY_HOPS=str(Config.TRUSTED_PROXY_HOPS + 1),
+            SHUTDOWN_BUDGET_SECONDS=str(max(1.0, self.graceful_timeout - connection_grace - EXIT_MARGIN_SECONDS))
+        )
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "hypercorn", "app.app:app",
+            "--bind", f"unix:{worker.socket_path}",
+            "--graceful-timeout", str(connection_grace),
+            env=env
+        )
+        worker.session = aiohttp.ClientSession(
+            connector=aiohttp.UnixConnector(path=worker.socket_path),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=5),
+            auto_decompress=False
+        )
+        deadline = asyncio.get_running_loop().time() + self.startup_timeout
+        while True:
+            if worker.process.returncode is not None:
+                await worker.session.close()
+                raise RuntimeError(f"{worker.name} exited during startup with code {worker.process.returncode}")
+            try:
+                reader, writer = await asyncio.open_unix_connection(worker.socket_path)
+                writer.close()
+                await writer.wait_closed()
+                break
+            except OSError:
+                if asyncio.get_running_loop().time() > deadline:
+                    worker.process.terminate()
+                    await worker.session.close()
+                    raise RuntimeError(f"{worker.name} did not start listening within {self.startup_timeout}s")
+                await asyncio.sleep(0.2)
+
+        self.workers[worker.name] = worker
+        self.ring.add(worker.name)
+        asyncio.create_task(self._watch(worker))
+        logger.info(f"Started {worker.name} (pid {worker.process.pid})")
+        return worker
+
+    async def _watch(self, worker: Worker):
+        """Replace a worker that dies unexpectedly, under the same name so it gets the same senders back."""
+        code = await worker.process.wait()
+        if worker.stopping or self._shutdown.is_set():
+            return
+        logger.error(f"{worker.name} exited with code {code}; restarting it")
+        self.ring.remove(worker.name)
+        self.workers.pop(worker.name, None)
+        await worker.session.close()
+        try:
+            await self._spawn(worker.index)
+        except Exception as e:
+            logger.error(f"Could not restart {worker.name}: {e}")
+
+    async def _stop(self, worker: Worker):
+        """Take a worker out of rotation, let its in-flight requests finish, then stop it."""
+        worker.stopping = True
+        self.ring.remove(worker.name)
+        try:
+            await asyncio.wait_for(worker.idle.wait(), self.graceful_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{worker.name} still had {worker.inflight} requests after {self.graceful_timeout}s")
+        if worker.process.returncode is None:
+            worker.process.send_signal(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(worker.process.wait(), self.graceful_timeout)
+            except asyncio.TimeoutError:
+                worker.process.kill()
+                await worker.process.wait()
+        await worker.session.close()
+        self.workers.pop(worker.name, None)
+        Path(worker.socket_path).unlink(missing_ok=True)
+        logger.info(f"Stopped {worker.name}")
+
+    async def add_worker(self):
+        async with self._scaling:
+            indexes = {w.index for w in self.workers.values()}
+            index = next(i for i in range(len(indexes) + 1) if i not in indexes)
+            await self._spawn(index)
+            logger.info(f"Scaled up to {len(self.workers)} workers")
+
+    async def remove_worker(self):
+        async with self._scaling:
+            if len(self.workers) <= 1:
+                logger.warning("Not removing the last worker")
+                return
+            # Worker 0 runs the background jobs, so the newest worker goes first
+            newest = max(self.workers.values(), key=lambda w: w.index)
+            await self._stop(newest)
+            logger.info(f"Scaled down to {len(self.workers)} workers")
+
+    # Proxy
+
+    def _pick(self, key: Optional[str]) -> Optional[Worker]:
+        name = self.ring.node_for(key) if key else None
+        if name is None:
+            available = sorted(self.ring.nodes)
+            if not available:
+                return None
+            self._next_fallback += 1
+            name = available[self._next_fallback % len(available)]
+        return self.workers.get(name)
+
+    def _worker_at(self, index: int) -> Optional[Worker]:
+        worker = self.workers.get(f"worker-{index}")
+        return worker if worker is not None and not worker.stopping else None
+
+    async def _proxy_websocket(self, request: web.Request, worker: Worker, headers: Dict[str, str]) -> web.StreamResponse:
+        headers = {k: v for k, v in headers.items() if k.lower() not in WEBSOCKET_HANDSHAKE_HEADERS}
+        worker.begin()
+        try:
+            async with worker.session.ws_connect(f"http://{request.host}{request.path_qs}", headers=headers, autoping=True) as upstream:
+                client = web.WebSocketResponse(autoping=True)
+                await client.prepare(request)
+
+                async def pump(source, target):
+                    async for message in source:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            await target.send_str(message.data)
+                        elif message.type == aiohttp.WSMsgType.BINARY:
+                            await target.send_bytes(message.data)
+                        else:
+                            break
+
+                pumps = [asyncio.create_task(pump(client, upstream)), asyncio.create_task(pump(upstream, client))]
+                # Whichever side closes first ends the session for both
+                done, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+                await upstream.close()
+                await client.close()
+                return client
+        except aiohttp.ClientError as e:
+            logger.error(f"Error proxying WebSocket {request.path} to {worker.name}: {e}")
+            return web.Response(status=502, text="Bad gateway")
+        finally:
+            worker.end()
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        try:
+            index = pinned_worker(request)
+        except ValueError:
+            return web.Response(status=400, text="worker must be a worker index")
+        if index is not None:
+            worker = self._worker_at(index)
+            if worker is None:
+                return web.Response(status=503, text=f"worker-{index} is not available")
+        else:
+            worker = self._pick(routing_key(request, body))
+            if worker is None:
+                return web.Response(status=503, text="No workers available")
+
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        forwarded = request.headers.get("X-Forwarded-For")
+        headers["X-Forwarded-For"] = f"{forwarded}, {request.remote or ''}" if forwarded else request.remote or ""
+        headers["X-Forwarded-Proto"] = request.scheme
+        if request.headers.get("Upgrade", "").lower() == "websocket":
+            return await self._proxy_websocket(request, worker, headers)
+        worker.begin()
+        try:
+            async with worker.session.request(
+                request.method, f"http://{request.host}{request.path_qs}", headers=headers, data=body, allow_redirects=False
+            ) as upstream:
+                response = web.StreamResponse(status=upstream.status, reason=upstream.reason)
+                for name, value in upstream.headers.items():
+                    if name.lower() not in HOP_BY_HOP_HEADERS:
+                        response.headers.add(name, value)
+                await response.prepare(request)
+                # Streamed so server-sent events reach the client as they are produced
+                async for chunk in upstream.content.iter_any():
+                    await response.write(chunk)
+                await response.write_eof()
+                return response
+        except aiohttp.ClientError as e:
+            logger.error(f"Error proxying {request.method} {request.path} to {worker.name}: {e}")
+            return web.Response(status=502, text="Bad gateway")
+        finally:
+            worker.end()
+
+    # Lifecycle
+
+    async def run(self):
+        self.socket_dir.mkdir(parents=True, exist_ok=True)
+        results = await asyncio.gather(*(self._spawn(i) for i in range(self.initial_workers)), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            await asyncio.gather(*(self._stop(w) for w in list(self.workers.values())))
+            raise errors[0]
+
+        app = web.Application(client_max_size=Config.DOCUMENT_MAX_BYTES)
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        runner = web.AppRunner(app, shutdown_timeout=self.graceful_timeout, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        logger.info(f"Routing http://{self.host}:{self.port} to {len(self.workers)} workers")
+
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, self._shutdown.set)
+        loop.add_signal_handler(signal.SIGINT, self._shutdown.set)
+        loop.add_signal_handler(signal.SIGTTIN, lambda: asyncio.create_task(self.add_worker()))
+        loop.add_signal_handler(signal.SIGTTOU, lambda: asyncio.create_task(self.remove_worker()))
+
+        await self._shutdown.wait()
+        logger.info("Shutting down: draining in-flight requests")
+        # Closes the listening socket and waits for running handlers
+        await runner.cleanup()
+        async with self._scaling:
+            await asyncio.gather(*(self._stop(w) for w in list(self.workers.values())))
+        logger.info("Shutdown complete")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the app on several worker processes with per-sender affinity.")
+    parser.add_argument("--host", default=Config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=Config.PORT)
+    parser.add_argument("--workers", type=int, default=Config.SERVER_WORKERS)
+    parser.add_argument("--socket-dir", default=Config.SERVER_SOCKET_DIR, help="defaults to a new temporary directory")
+    parser.add_argument("--graceful-timeout", type=float, default=Config.SERVER_GRACEFUL_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    configure_logging(
+        level=Config.LOG_LEVEL,
+        fmt=Config.LOG_FORMAT,
+        sample_rates=parse_sample_rates(Config.LOG_SAMPLE_RATES),
+        max_chars=Config.LOG_MAX_MESSAGE_CHARS,
+        redact=Config.LOG_REDACT_PHONES
+    )
+    # Created only now, so --help and argument errors leave nothing behind
+    socket_dir = args.socket_dir or tempfile.mkdtemp(prefix="lexlinker-")
+    launcher = Launcher(args.host, args.port, args.workers, socket_dir, args.graceful_timeout)
+    asyncio.run(launcher.run())
+
+
+if __name__ == "__main__":
+    main()
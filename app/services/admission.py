@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Iterable, Iterator, Optional, Set
+
+from pymongo import ReturnDocument
+from pymongo.collection import Collection
+
+from ..config import Config
+from ..db import store
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity` tokens, refilled at `rate` tokens per second."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def consume(self, amount: float = 1.0) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+
+@dataclass
+class AdmissionDecision:
+    allowed: bool
+    reason: str = ""
+    # Only the first rejection in a window gets a reply, so a loop cannot make us send a reply per message
+    notify: bool = False
+
+
+class _SenderState:
+    __slots__ = ("bucket", "day", "tokens_today", "notified_until")
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.day = ""
+        self.tokens_today = 0
+        self.notified_until = 0.0
+
+
+class AdmissionController:
+    """Per-sender admission control in front of the agent pipeline.
+
+    The in-process token bucket rejects bursts without touching the
+    database. Messages that pass it increment a per-sender, per-day counter
+    document in Mongo, which holds the authoritative per-minute message
+    count and daily LLM token total across all workers. Senders on the
+    allow-list (the ADMISSION_ALLOWLIST setting plus active documents in
+    the `clients` collection) are never limited.
+    """
+
+    def __init__(
+        self,
+        counters: Optional[Collection] = None,
+        clients: Optional[Collection] = None,
+        messages_per_minute: int = 10,
+        tokens_per_day: int = 200_000,
+        allowlist: Iterable[str] = (),
+        max_tracked_senders: int = 100_000,
+        allowlist_refresh_seconds: float = 60.0,
+    ):
+        self.counters = counters
+        self.clients = clients
+        self.messages_per_minute = messages_per_minute
+        self.tokens_per_day = tokens_per_day
+        self.static_allowlist: Set[str] = set(allowlist)
+        self.allowlist: Set[str] = set(self.static_allowlist)
+        self.max_tracked_senders = max_tracked_senders
+        self.allowlist_refresh_seconds = allowlist_refresh_seconds
+        self._allowlist_loaded = 0.0
+        self._allowlist_refresh: Optional[asyncio.Task] = None
+        self._senders: "OrderedDict[str, _SenderState]" = OrderedDict()
+
+        if self.counters is not None:
+            try:
+                self.counters.create_index("expires_at", expireAfterSeconds=0)
+            except Exception as e:
+                logger.error(f"Failed to create admission counter indexes: {e}")
+
+    def _state(self, phone_number: str, day: str) -> _SenderState:
+        state = self._senders.get(phone_number)
+        if state is None:
+            capacity = max(1, self.messages_per_minute)
+            state = _SenderState(TokenBucket(capacity, capacity / 60.0))
+            self._senders[phone_number] = state
+            if len(self._senders) > self.max_tracked_senders:
+                self._senders.popitem(last=False)
+        else:
+            self._senders.move_to_end(phone_number)
+        if state.day != day:
+            state.day, state.tokens_today = day, 0
+        return state
+
+    def _load_allowlist(self):
+        phones = set(self.static_allowlist)
+        if self.clients is not None:
+            for doc in self.clients.find({"active": True}, {"phone_number": 1, "_id": 0}):
+                phones.add(doc["phone_number"])
+        self.allowlist = phones
+
+    async def _refresh_allowlist(self):
+        try:
+            await asyncio.to_thread(self._load_allowlist)
+        except Exception as e:
+            logger.error(f"Error refreshing admission allow-list: {e}")
+        finally:
+            self._allowlist_loaded = time.monotonic()
+            self._allowlist_refresh = None
+
+    async def _check_allowlist(self):
+        if time.monotonic() - self._allowlist_loaded > self.allowlist_refresh_seconds and self._allowlist_refresh is None:
+            self._allowlist_refresh = asyncio.create_task(self._refresh_allowlist())
+        if not self._allowlist_loaded and self._allowlist_refresh is not None:
+            # Until the allow-list has been read once, wait for it rather than limit a client by mistake
+            await asyncio.shield(self._allowlist_refresh)
+
+    def _increment(self, phone_number: str, day: str, minute: str) -> dict:
+        """Count one message; returns the sender's counters for today."""
+        expires_at = datetime.now(UTC) + timedelta(days=2)
+        return self.counters.find_one_and_update(
+            {"_id": f"{phone_number}:{day}"},
+            [{"$set": {
+                "phone_number": phone_number,
+                "minute_count": {"$cond": [{"$eq": ["$minute", minute]}, {"$add": ["$minute_count", 1]}, 1]},
+                "minute": minute,
+                "messages": {"$add": [{"$ifNull": ["$messages", 0]}, 1]},
+                "tokens": {"$ifNull": ["$tokens", 0]},
+                "expires_at": expires_at,
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _reject(self, state: _SenderState, reason: str) -> AdmissionDecision:
+        now = time.monotonic()
+        notify = now >= state.notified_until
+        if notify:
+            state.notified_until = now + 60
+        return AdmissionDecision(False, reason, notify)
+
+    async def admit(self, phone_number: str) -> AdmissionDecision:
+        """Decide whether a message from `phone_number` may start an agent run."""
+        await self._check_allowlist()
+        if phone_number in self.allowlist:
+            return AdmissionDecision(True)
+
+        now = datetime.now(UTC)
+        day = now.strftime("%Y-%m-%d")
+        state = self._state(phone_number, day)
+
+        # Fast path: no database round trip for senders that are clearly over the limit
+        if not state.bucket.consume():
+            return self._reject(state, "rate")
+        if state.tokens_today >= self.tokens_per_day:
+            return self._reject(state, "tokens")
+
+        if self.counters is not None:
+            try:
+                counters = await asyncio.to_thread(self._increment, phone_number, day, now.strftime("%H%M"))
+                state.tokens_today = max(state.tokens_today, counters.get("tokens", 0))
+                if counters.get("minute_count", 0) > self.messages_per_minute:
+                    return self._reject(state, "rate")
+                if state.tokens_today >= self.tokens_per_day:
+                    return self._reject(state, "tokens")
+            except Exception as e:
+                # Fail open: the local bucket still protects this worker
+                logger.error(f"Error updating admission counters for {phone_number}: {e}")
+
+        return AdmissionDecision(True)
+
+    async def record_usage(self, phone_number: str, tokens: int):
+        """Charge LLM tokens used by a run against the sender's daily budget."""
+        if tokens <= 0 or phone_number in self.allowlist:
+            return
+        day = datetime.now(UTC).strftime("%Y-%m-%d")
+        state = self._state(phone_number, day)
+        state.tokens_today += tokens
+        if self.counters is None:
+            return
+        try:
+            await asyncio.to_thread(
+                self.counters.update_one,
+                {"_id": f"{phone_number}:{day}"},
+                {"$inc": {"tokens": tokens}},
+            )
+        except Exception as e:
+            logger.error(f"Error recording token usage for {phone_number}: {e}")
+
+
+def run_token_usage(result) -> int:
+    """Total LLM tokens used by an agent run."""
+    return sum(response.usage.total_tokens for response in result.raw_responses)
+
+
+class TokenUsage:
+    """Tokens used by the nested runs (tools, guardrails, document review) made on behalf of one sender."""
+
+    __slots__ = ("tokens",)
+
+    def __init__(self):
+        self.tokens = 0
+
+
+# Set by `metered`; tasks started inside it, such as tool calls, share the same accumulator
+_current_usage: ContextVar[Optional[TokenUsage]] = ContextVar("current_usage", default=None)
+
+
+@contextmanager
+def metered() -> Iterator[TokenUsage]:
+    """Collect the tokens of every nested run recorded with `record_run_usage` inside this block."""
+    usage = TokenUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_run_usage(result):
+    """Charge a run made outside the sender's own agent run (a sub-agent, a guardrail) to the current `metered` block."""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.tokens += run_token_usage(result)
+
+
+# Global instance; shared counters need the Mongo backend, other backends only get the local buckets
+_mongo_db = getattr(store, "db", None)
+admission = AdmissionController(
+    counters=_mongo_db.sender_usage if _mongo_db is not None else None,
+    clients=_mongo_db.clients if _mongo_db is not None else None,
+    messages_per_minute=Config.ADMISSION_MESSAGES_PER_MINUTE,
+    tokens_per_day=Config.ADMISSION_TOKENS_PER_DAY,
+    allowlist=Config.ADMISSION_ALLOWLIST,
+)
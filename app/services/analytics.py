@@ -0,0 +1,330 @@
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from ..config import Config
+from ..db import store
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day")
+# Breakdowns kept per bucket; "all" has a single key with the bucket totals
+DIMENSIONS = ("all", "agent", "model")
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_id(granularity: str, bucket: datetime, dimension: str, key: str) -> str:
+    return f"{granularity}:{bucket.isoformat()}:{dimension}:{key}"
+
+
+class _Pending:
+    """Counters accumulated for one rollup document since the last flush."""
+
+    __slots__ = ("granularity", "bucket", "dimension", "key", "inc", "max")
+
+    def __init__(self, granularity: str, bucket: datetime, dimension: str, key: str):
+        self.granularity = granularity
+        self.bucket = bucket
+        self.dimension = dimension
+        self.key = key
+        self.inc: Dict[str, float] = defaultdict(int)
+        self.max: Dict[str, float] = {}
+
+    def update(self) -> Dict:
+        update = {
+            "$setOnInsert": {
+                "granularity": self.granularity,
+                "bucket": self.bucket,
+                "dimension": self.dimension,
+                "key": self.key
+            },
+            "$inc": dict(self.inc)
+        }
+        if self.max:
+            update["$max"] = dict(self.max)
+        return update
+
+
+class UsageAnalytics:
+    """Hourly and daily usage rollups, maintained as messages are answered.
+
+    Each worker adds every answered turn to in-process counters and flushes
+    them every `flush_interval` seconds as one bulk write of `$inc` updates
+    to the `analytics_rollups` collection, one document per bucket, dimension
+    and key (e.g. day 2025-01-31 / agent / Legal Agent). Daily and hourly
+    active senders are counted exactly by upserting one marker per sender
+    and bucket into `analytics_senders`; only markers that did not exist yet
+    increment the count. The dashboard reads nothing but rollup documents,
+    so its cost depends on the number of buckets, not on message volume.
+
+    Without a Mongo database the rollups are kept in process memory.
+    """
+
+    def __init__(
+        self,
+        rollups: Optional[Collection] = None,
+        senders: Optional[Collection] = None,
+        flush_interval: float = 10.0,
+        hourly_retention_days: float = 35
+    ):
+        self.rollups = rollups
+        self.senders = senders
+        self.flush_interval = flush_interval
+        self.hourly_retention_days = hourly_retention_days
+        self._pending: Dict[str, _Pending] = {}
+        self._pending_senders: Set[Tuple[str, datetime, str]] = set()
+        # Senders this worker already counted, per bucket, so repeat messages skip the marker write
+        self._seen: Dict[Tuple[str, datetime], Set[str]] = {}
+        self._lock = threading.Lock()
+        self._task = None
+        # Used instead of the collections when there is no Mongo database
+        self._local_rollups: Dict[str, Dict] = {}
+
+        if self.rollups is not None:
+            try:
+                self.rollups.create_index([("granularity", 1), ("dimension", 1), ("bucket", 1)])
+                self.rollups.create_index("expires_at", expireAfterSeconds=0)
+                self.senders.create_index("expires_at", expireAfterSeconds=0)
+            except Exception as e:
+                logger.error(f"Failed to create analytics indexes: {e}")
+
+    def _rollup(self, granularity: str, bucket: datetime, dimension: str, key: str) -> _Pending:
+        _id = rollup_id(granularity, bucket, dimension, key)
+        pending = self._pending.get(_id)
+        if pending is None:
+            pending = self._pending[_id] = _Pending(granularity, bucket, dimension, key)
+        return pending
+
+    def record_turn(
+        self,
+        phone_number: str,
+        agent: str,
+        model: str,
+        latency: float,
+        tokens: int = 0,
+        cached: bool = False,
+        at: Optional[datetime] = None
+    ):
+        """Count one answered message; `latency` is in seconds."""
+        at = at or datetime.now(UTC)
+        latency_ms = int(latency * 1000)
+        with self._lock:
+            for granularity in GRANULARITIES:
+                bucket = bucket_start(at, granularity)
+                for dimension, key in (("all", "all"), ("agent", agent), ("model", model)):
+                    pending = self._rollup(granularity, bucket, dimension, key)
+                    pending.inc["turns"] += 1
+                    pending.inc["tokens"] += tokens
+                    pending.inc["latency_ms_total"] += latency_ms
+                    pending.inc["cache_hits"] += int(cached)
+                    pending.max["latency_ms_max"] = max(pending.max.get("latency_ms_max", 0), latency_ms)
+                seen = self._seen.setdefault((granularity, bucket), set())
+                if phone_number not in seen:
+                    seen.add(phone_number)
+                    self._pending_senders.add((granularity, bucket, phone_number))
+
+    def record_prompt_tokens(self, agent: str, model: str, input_tokens: int, cached_tokens: int, at: Optional[datetime] = None):
+        """Count the input tokens of one model request, and how many of them the provider served from its prompt cache."""
+        at = at or datetime.now(UTC)
+        with self._lock:
+            for granularity in GRANULARITIES:
+                bucket = bucket_start(at, granularity)
+                for dimension, key in (("all", "all"), ("agent", agent), ("model", model)):
+                    pending = self._rollup(granularity, bucket, dimension, key)
+                    pending.inc["model_requests"] += 1
+                    pending.inc["input_tokens"] += input_tokens
+                    pending.inc["cached_input_tokens"] += cached_tokens
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            senders, self._pending_senders = self._pending_senders, set()
+            # Buckets that have ended will not see new messages
+            current = {(g, bucket_start(datetime.now(UTC), g)) for g in GRANULARITIES}
+            self._seen = {k: v for k, v in self._seen.items() if k in current}
+        return pending, senders
+
+    def _expires_at(self, granularity: str, bucket: datetime) -> Optional[datetime]:
+        if granularity == "hour" and self.hourly_retention_days > 0:
+            return bucket + timedelta(days=self.hourly_retention_days)
+        return None
+
+    def _count_new_senders(self, senders: Set[Tuple[str, datetime, str]]) -> Dict[Tuple[str, datetime], int]:
+        """Write one marker per sender and bucket; returns how many were new, per bucket."""
+        ordered = sorted(senders)
+        operations = [
+            UpdateOne(
+                {"_id": f"{granularity}:{bucket.isoformat()}:{phone_number}"},
+                {"$setOnInsert": {"expires_at": bucket + timedelta(days=2 if granularity == "day" else 1)}},
+                upsert=True
+            )
+            for granularity, bucket, phone_number in ordered
+        ]
+        result = self.senders.bulk_write(operations, ordered=False)
+        new = defaultdict(int)
+        for index in result.upserted_ids:
+            granularity, bucket, _ = ordered[index]
+            new[(granularity, bucket)] += 1
+        return new
+
+    def _flush_mongo(self, pending: Dict[str, _Pending], senders: Set[Tuple[str, datetime, str]]):
+        if senders:
+            for (granularity, bucket), count in self._count_new_senders(senders).items():
+                self._rollup_into(pending, granularity, bucket).inc["active_senders"] += count
+        operations = []
+        for _id, rollup in pending.items():
+            update = rollup.update()
+            expires_at = self._expires_at(rollup.granularity, rollup.bucket)
+            if expires_at:
+                update["$setOnInsert"]["expires_at"] = expires_at
+            operations.append(UpdateOne({"_id": _id}, update, upsert=True))
+        if operations:
+            self.rollups.bulk_write(operations, ordered=False)
+
+    def _flush_local(self, pending: Dict[str, _Pending], senders: Set[Tuple[str, datetime, str]]):
+        # A single process sees every sender, so the per-bucket seen sets already deduplicate them
+        for granularity, bucket, _ in senders:
+            self._rollup_into(pending, granularity, bucket).inc["active_senders"] += 1
+        for _id, rollup in pending.items():
+            doc = self._local_rollups.setdefault(_id, dict(rollup.update()["$setOnInsert"]))
+            for field, value in rollup.inc.items():
+                doc[field] = doc.get(field, 0) + value
+            for field, value in rollup.max.items():
+                doc[field] = max(doc.get(field, 0), value)
+
+    @staticmethod
+    def _rollup_into(pending: Dict[str, _Pending], granularity: str, bucket: datetime) -> _Pending:
+        _id = rollup_id(granularity, bucket, "all", "all")
+        if _id not in pending:
+            pending[_id] = _Pending(granularity, bucket, "all", "all")
+        return pending[_id]
+
+    def flush(self):
+        """Write the counters accumulated since the last flush."""
+        pending, senders = self._take_pending()
+        if not pending and not senders:
+            return
+        if self.rollups is None:
+            self._flush_local(pending, senders)
+            return
+        try:
+            self._flush_mongo(pending, senders)
+        except Exception as e:
+            # Counts for this interval are lost rather than retried, so a write that partly succeeded is not doubled
+            logger.error(f"Error flushing analytics rollups ({len(pending)} documents): {e}")
+
+    def query(self, granularity: str, since: datetime, until: datetime) -> List[Dict]:
+        """Rollup documents for buckets in [since, until), oldest first."""
+        if self.rollups is None:
+            docs = [
+                dict(d) for d in self._local_rollups.values()
+                if d["granularity"] == granularity and since <= d["bucket"] < until
+            ]
+            return sorted(docs, key=lambda d: (d["bucket"], d["dimension"], d["key"]))
+        return list(self.rollups.find(
+            {"granularity": granularity, "bucket": {"$gte": since, "$lt": until}},
+            {"_id": 0, "expires_at": 0}
+        ).sort([("bucket", 1), ("dimension", 1), ("key", 1)]))
+
+    def dashboard(self, granularity: str, since: datetime, until: datetime) -> Dict:
+        """Totals per agent and model plus a time series, computed from rollups only."""
+        series = []
+        breakdown = {dimension: {} for dimension in DIMENSIONS if dimension != "all"}
+        for doc in self.query(granularity, since, until):
+            turns = doc.get("turns", 0)
+            if doc["dimension"] == "all":
+                senders = doc.get("active_senders", 0)
+                series.append({
+                    "bucket": doc["bucket"].isoformat(),
+                    "turns": turns,
+                    "active_senders": senders,
+                    "turns_per_conversation": round(turns / senders, 2) if senders else None,
+                    "avg_latency_ms": round(doc.get("latency_ms_total", 0) / turns) if turns else None,
+                    "tokens": doc.get("tokens", 0),
+                    "cache_hits": doc.get("cache_hits", 0),
+                    **prompt_cache_stats(doc)
+                })
+                continue
+            totals = breakdown[doc["dimension"]].setdefault(
+                doc["key"],
+                {"turns": 0, "tokens": 0, "latency_ms_total": 0, "latency_ms_max": 0, "input_tokens": 0, "cached_input_tokens": 0}
+            )
+            totals["turns"] += turns
+            totals["tokens"] += doc.get("tokens", 0)
+            totals["input_tokens"] += doc.get("input_tokens", 0)
+            totals["cached_input_tokens"] += doc.get("cached_input_tokens", 0)
+            totals["latency_ms_total"] += doc.get("latency_ms_total", 0)
+            totals["latency_ms_max"] = max(totals["latency_ms_max"], doc.get("latency_ms_max", 0))
+        for totals_by_key in breakdown.values():
+            for totals in totals_by_key.values():
+                latency_ms_total = totals.pop("latency_ms_total")
+                totals["avg_latency_ms"] = round(latency_ms_total / totals["turns"]) if totals["turns"] else None
+                totals.update(prompt_cache_stats(totals))
+        return {
+            "granularity": granularity,
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "series": series,
+            "by_agent": breakdown["agent"],
+            "by_model": breakdown["model"]
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+def prompt_cache_stats(counts: Dict) -> Dict:
+    """Cached and uncached input tokens, and the share served from the prompt cache."""
+    input_tokens = counts.get("input_tokens", 0)
+    cached = counts.get("cached_input_tokens", 0)
+    return {
+        "input_tokens": input_tokens,
+        "cached_input_tokens": cached,
+        "uncached_input_tokens": input_tokens - cached,
+        "prompt_cache_hit_rate": round(cached / input_tokens, 4) if input_tokens else None
+    }
+
+
+def agent_model(agent) -> str:
+    """The model name an agent runs on."""
+    model = getattr(agent, "model", None)
+    if isinstance(model, str):
+        return model
+    return getattr(model, "model", None) or "default"
+
+
+# Global instance; rollups are shared across workers only with the Mongo backend
+_mongo_db = getattr(store, "db", None)
+analytics = UsageAnalytics(
+    rollups=_mongo_db.analytics_rollups if _mongo_db is not None else None,
+    senders=_mongo_db.analytics_senders if _mongo_db is not None else None,
+    flush_interval=Config.ANALYTICS_FLUSH_SECONDS,
+    hourly_retention_days=Config.ANALYTICS_HOURLY_RETENTION_DAYS
+)
@@ -0,0 +1,454 @@
+"""Bulk outbound broadcasts, e.g. alerts about a change in the law.
+
+A broadcast is a message template sent to every conversation matching a
+filter on current_agent and metadata, restricted to users who opted in to
+alerts. WhatsApp only delivers freeform text inside the 24 hours after a
+user's last message, so a broadcast can instead name an approved content
+template (`content_sid`) whose variables are rendered per recipient. Recipients are read from the store in phone number order, a batch at
+a time, rendered and handed to a fixed number of sender workers through a
+bounded queue, so memory stays constant however many recipients there are.
+
+Progress is checkpointed as the last phone number before which every
+recipient has been handled. A broadcast that is paused, interrupted by a
+shutdown or whose worker died resumes from its checkpoint; only the few
+messages that were in flight when it stopped can be sent twice.
+"""
+import asyncio
+import logging
+import re
+import string
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional
+
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.collection import Collection
+
+from ..config import Config
+from ..db.base import ALERTS_OPT_IN, BaseStore
+from .admission import TokenBucket
+from .messaging import TwilioAsyncSender, is_transient
+
+logger = logging.getLogger(__name__)
+
+# Broadcasts in these states can be (re)started; "interrupted" ones were stopped by a worker shutting down
+STARTABLE = ("pending", "paused", "interrupted")
+
+# Twilio content template SIDs
+CONTENT_SID_PATTERN = re.compile(r"HX[0-9a-fA-F]{32}")
+
+
+class BroadcastError(Exception):
+    """A broadcast that cannot be created or started."""
+
+
+def validate_template(template: str):
+    """Reject templates that are empty or use anything but plain {field} substitutions."""
+    if not template or not template.strip():
+        raise BroadcastError("template must not be empty")
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template) if field is not None]
+    except ValueError as e:
+        raise BroadcastError(f"Invalid template: {e}")
+    for field in fields:
+        # No positional fields, attribute or index lookups: metadata values are plain data
+        if not field.isidentifier():
+            raise BroadcastError(f"Invalid template field: {{{field}}}")
+
+
+def validate_content(content_sid: str, variables: Dict):
+    """Reject malformed content template SIDs and variables that are not templates themselves."""
+    if not CONTENT_SID_PATTERN.fullmatch(content_sid):
+        raise BroadcastError(f"Invalid content_sid: {content_sid}")
+    for key, value in variables.items():
+        if not isinstance(key, str) or not isinstance(value, str):
+            raise BroadcastError("variables must map names to template strings")
+        validate_template(value)
+
+
+class _Fields(dict):
+    def __missing__(self, key):
+        return ""
+
+
+def render(template: str, recipient: Dict) -> str:
+    """The message for one recipient: {phone_number} and metadata fields, missing ones left empty."""
+    return template.format_map(_Fields(recipient.get("metadata") or {}, phone_number=recipient["phone_number"]))
+
+
+class RateLimiter:
+    """Spaces out sends to at most `rate` per second (no limit when `rate` is 0)."""
+
+    def __init__(self, rate: float):
+        self.bucket = TokenBucket(max(rate, 1), rate) if rate > 0 else None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.bucket is None:
+            return
+        # Waiters queue on the lock, so they are served in order
+        async with self._lock:
+            while not self.bucket.consume():
+                await asyncio.sleep((1 - self.bucket.tokens) / self.bucket.rate)
+
+
+class _Progress:
+    """Counters and the resumable checkpoint of one running broadcast.
+
+    Recipients are tracked in the order they were read. When a send
+    finishes, the checkpoint advances past every recipient at the front
+    that is done, so it never skips a recipient still in flight.
+    """
+
+    def __init__(self, job: Dict):
+        self.cursor: Optional[str] = job.get("cursor")
+        self.sent = job.get("sent", 0)
+        self.failed = job.get("failed", 0)
+        self.run_handled = 0
+        self.started = time.monotonic()
+        self._pending = deque()
+
+    def track(self, phone_number: str) -> List:
+        entry = [phone_number, False]
+        self._pending.append(entry)
+        return entry
+
+    def done(self, entry: List, sent: bool):
+        entry[1] = True
+        if sent:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.run_handled += 1
+        while self._pending and self._pending[0][1]:
+            self.cursor = self._pending.popleft()[0]
+
+    def checkpoint(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "cursor": self.cursor,
+            "sent": self.sent,
+            "failed": self.failed,
+            "messages_per_second": round(self.run_handled / elapsed, 2) if elapsed > 0 else 0.0
+        }
+
+
+class BroadcastEngine:
+    """Creates, runs, pauses and resumes broadcasts.
+
+    Broadcast state lives in the `broadcasts` collection, so any worker can
+    report on, pause or take over a broadcast; running ones refresh a
+    heartbeat with every checkpoint. Without a Mongo database broadcasts are
+    kept in process memory and do not survive a restart.
+    """
+
+    def __init__(
+        self,
+        store: BaseStore,
+        sender,
+        jobs: Optional[Collection] = None,
+        messages_per_second: float = 80,
+        concurrency: int = 32,
+        batch_size: int = 1000,
+        checkpoint_seconds: float = 5.0,
+        max_attempts: int = 4,
+        retry_delay: float = 1.0
+    ):
+        self.store = store
+        self.sender = sender
+        self.jobs = jobs
+        self.messages_per_second = messages_per_second
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.checkpoint_seconds = checkpoint_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # A broadcast whose heartbeat is this old was left behind by a dead worker
+        self.stale_after = max(60.0, checkpoint_seconds * 6)
+        self._local_jobs: Dict[str, Dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._progress: Dict[str, _Progress] = {}
+        self._stopping = False
+        if jobs is not None:
+            jobs.create_index([("status", 1), ("heartbeat_at", 1)])
+            jobs.create_index([("created_at", DESCENDING)])
+
+    # Job state
+
+    def _insert(self, job: Dict):
+        if self.jobs is not None:
+            self.jobs.insert_one(job)
+        else:
+            self._local_jobs[job["_id"]] = job
+
+    def _get(self, job_id: str) -> Optional[Dict]:
+        if self.jobs is not None:
+            return self.jobs.find_one({"_id": job_id})
+        job = self._local_jobs.get(job_id)
+        return dict(job) if job else None
+
+    def _update(self, job_id: str, fields: Dict, statuses: Optional[tuple] = None) -> bool:
+        """Set `fields`, only if the broadcast is in one of `statuses` when given."""
+        if self.jobs is not None:
+            query = {"_id": job_id}
+            if statuses:
+                query["status"] = {"$in": list(statuses)}
+            return self.jobs.update_one(query, {"$set": fields}).matched_count == 1
+        job = self._local_jobs.get(job_id)
+        if job is None or (statuses and job["status"] not in statuses):
+            return False
+        job.update(fields)
+        return True
+
+    def _claim(self, job_id: str, stale_before: Optional[datetime] = None) -> Optional[Dict]:
+        """Mark a startable broadcast as running; None if it is not.
+
+        With `stale_before`, only an interrupted broadcast or a running one
+        whose heartbeat is older can be claimed.
+        """
+        now = datetime.now(UTC)
+        fields = {"status": "running", "heartbeat_at": now, "error": None}
+        if self.jobs is not None:
+            query = {"_id": job_id, "status": {"$in": list(STARTABLE)}}
+            if stale_before is not None:
+                query = {"_id": job_id, "$or": [
+                    {"status": "interrupted"},
+                    {"status": "running", "heartbeat_at": {"$lt": stale_before}}
+                ]}
+            return self.jobs.find_one_and_update(query, {"$set": fields}, return_document=ReturnDocument.AFTER)
+        job = self._local_jobs.get(job_id)
+        if job is None or job["status"] not in STARTABLE:
+            return None
+        job.update(fields)
+        return dict(job)
+
+    # Public API
+
+    def create(
+        self,
+        template: str,
+        current_agent: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        name: str = "",
+        content_sid: Optional[str] = None,
+        variables: Optional[Dict[str, str]] = None
+    ) -> Dict:
+        """Record a new broadcast to every opted-in user matching `current_agent` and `metadata`.
+
+        With `content_sid` the content template is sent, its `variables`
+        rendered like `template` for each recipient; `template` may then be empty.
+        """
+        variables = dict(variables or {})
+        if content_sid:
+            validate_content(content_sid, variables)
+            if template:
+                validate_template(template)
+        else:
+            validate_template(template)
+        metadata = dict(metadata or {})
+        if ALERTS_OPT_IN in metadata:
+            raise BroadcastError(f"{ALERTS_OPT_IN} is always required and cannot be filtered on")
+        job = {
+            "_id": uuid.uuid4().hex,
+            "name": name,
+            "template": template,
+            "content_sid": content_sid or None,
+            "variables": variables,
+            "current_agent": current_agent,
+            "metadata": metadata,
+            "status": "pending",
+            "cursor": None,
+            "sent": 0,
+            "failed": 0,
+            "messages_per_second": 0.0,
+            "created_at": datetime.now(UTC),
+            "heartbeat_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        self._insert(job)
+        logger.info(f"Created broadcast {job['_id']} (agent={current_agent}, filter={metadata})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """The broadcast's state, with live counters when it runs in this worker."""
+        job = self._get(job_id)
+        if job is None:
+            return None
+        progress = self._progress.get(job_id)
+        if progress is not None:
+            job.update(progress.checkpoint())
+        return job
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        """The latest broadcasts, newest first."""
+        if self.jobs is not None:
+            return list(self.jobs.find({}).sort("created_at", DESCENDING).limit(limit))
+        jobs = sorted(self._local_jobs.values(), key=lambda job: job["created_at"], reverse=True)
+        return [self.get(job["_id"]) for job in jobs[:limit]]
+
+    async def start(self, job_id: str, stale_before: Optional[datetime] = None) -> bool:
+        """Start (or resume) a broadcast in the background; False if it is not startable."""
+        job = await asyncio.to_thread(self._claim, job_id, stale_before)
+        if job is None:
+            return False
+        self._tasks[job_id] = asyncio.create_task(self._run(job))
+        return True
+
+    async def pause(self, job_id: str) -> bool:
+        """Ask a running broadcast to stop at its next checkpoint; False if it is not running."""
+        if not await asyncio.to_thread(self._update, job_id, {"status": "pausing"}, ("running",)):
+            return False
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return True
+
+    def _interrupted_jobs(self, stale_before: datetime) -> List[str]:
+        # Pause requests nobody was left to act on
+        self.jobs.update_many({"status": "pausing", "heartbeat_at": {"$lt": stale_before}}, {"$set": {"status": "paused"}})
+        query = {"$or": [{"status": "interrupted"}, {"status": "running", "heartbeat_at": {"$lt": stale_before}}]}
+        return [job["_id"] for job in self.jobs.find(query, {"_id": 1})]
+
+    async def resume_interrupted(self) -> int:
+        """Take over broadcasts stopped by a shutdown or whose worker stopped sending heartbeats; returns how many."""
+        if self.jobs is None:
+            return 0
+        stale_before = datetime.now(UTC) - timedelta(seconds=self.stale_after)
+        resumed = 0
+        for job_id in await asyncio.to_thread(self._interrupted_jobs, stale_before):
+            if await self.start(job_id, stale_before):
+                logger.warning(f"Resuming interrupted broadcast {job_id}")
+                resumed += 1
+        return resumed
+
+    async def stop(self):
+        """Stop every broadcast running in this worker as interrupted, for the next worker to resume."""
+        self._stopping = True
+        for task in self._tasks.values():
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        await self.sender.close()
+
+    # Sending
+
+    async def _send(self, phone_number: str, body: str, content_sid: Optional[str], variables: Dict[str, str]) -> bool:
+        for attempt in range(self.max_attempts):
+            try:
+                await self.sender.send(phone_number, body, content_sid=content_sid, variables=variables)
+                return True
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts or not is_transient(e):
+                    logger.warning(f"Broadcast message to {phone_number} failed: {e}")
+                    return False
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        return False
+
+    async def _worker(self, queue: asyncio.Queue, limiter: RateLimiter, progress: _Progress, content_sid: Optional[str]):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            entry, phone_number, body, variables = item
+            await limiter.acquire()
+            progress.done(entry, await self._send(phone_number, body, content_sid, variables))
+
+    async def _checkpoints(self, job_id: str, progress: _Progress, task: asyncio.Task):
+        """Save progress every `checkpoint_seconds`; a broadcast no longer running here is stopped."""
+        while True:
+            await asyncio.sleep(self.checkpoint_seconds)
+            fields = {**progress.checkpoint(), "heartbeat_at": datetime.now(UTC)}
+            if not await asyncio.to_thread(self._update, job_id, fields, ("running",)):
+                # Paused from another worker
+                task.cancel()
+                return
+
+    async def _run(self, job: Dict):
+        job_id = job["_id"]
+        progress = self._progress[job_id] = _Progress(job)
+        recipients = self.store.iter_recipients(
+            job.get("current_agent"),
+            {**job.get("metadata", {}), ALERTS_OPT_IN: True},
+            progress.cursor,
+            self.batch_size
+        )
+
+        def next_batch():
+            # Blocking store reads happen on a worker thread, a batch at a time
+            return [r for _, r in zip(range(self.batch_size), recipients)]
+
+        limiter = RateLimiter(self.messages_per_second)
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        content_sid = job.get("content_sid")
+        workers = [
+            asyncio.create_task(self._worker(queue, limiter, progress, content_sid))
+            for _ in range(self.concurrency)
+        ]
+        checkpoints = asyncio.create_task(self._checkpoints(job_id, progress, asyncio.current_task()))
+        logger.info(f"Broadcast {job_id} started after {progress.cursor or 'the first recipient'}")
+        status, error, reading = "failed", None, None
+        try:
+            while True:
+                # Shielded, so a pause never closes the recipient cursor while a thread is reading from it
+                reading = asyncio.ensure_future(asyncio.to_thread(next_batch))
+                batch = await asyncio.shield(reading)
+                if not batch:
+                    break
+                for recipient in batch:
+                    entry = progress.track(recipient["phone_number"])
+                    try:
+                        body = render(job["template"], recipient)
+                        variables = {key: render(value, recipient) for key, value in (job.get("variables") or {}).items()}
+                    except (ValueError, TypeError) as e:
+                        # e.g. a format spec that does not fit this recipient's metadata
+                        logger.warning(f"Could not render broadcast for {recipient['phone_number']}: {e}")
+                        progress.done(entry, False)
+                        continue
+                    await queue.put((entry, recipient["phone_number"], body, variables))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            status = "completed"
+        except asyncio.CancelledError:
+            status = "interrupted" if self._stopping else "paused"
+        except Exception as e:
+            logger.error(f"Error running broadcast {job_id}: {e}")
+            error = str(e)
+        finally:
+            checkpoints.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(checkpoints, *workers, return_exceptions=True)
+            if reading is not None:
+                await asyncio.gather(reading, return_exceptions=True)
+            await asyncio.to_thread(recipients.close)
+            fields = {**progress.checkpoint(), "status": status, "error": error, "heartbeat_at": datetime.now(UTC)}
+            if status == "completed":
+                fields["finished_at"] = datetime.now(UTC)
+            # A broadcast shut down after a pause was requested stays paused
+            if not await asyncio.to_thread(self._update, job_id, fields, ("running",) if status == "interrupted" else None):
+                fields["status"] = "paused"
+                await asyncio.to_thread(self._update, job_id, fields)
+            self._progress.pop(job_id, None)
+            self._tasks.pop(job_id, None)
+            logger.info(
+                f"Broadcast {job_id} {fields['status']}: sent={progress.sent} failed={progress.failed} "
+                f"({fields['messages_per_second']} messages/s)"
+            )
+
+
+def create_broadcast_engine(store: BaseStore) -> BroadcastEngine:
+    """The engine for `store`, keeping broadcasts next to the conversations when they are in Mongo."""
+    db = getattr(store, "db", None)
+    return BroadcastEngine(
+        store,
+        TwilioAsyncSender(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN, Config.TWILIO_PHONE_NUMBER),
+        jobs=db.broadcasts if db is not None else None,
+        messages_per_second=Config.BROADCAST_MESSAGES_PER_SECOND,
+        concurrency=Config.BROADCAST_CONCURRENCY,
+        batch_size=Config.BROADCAST_BATCH_SIZE,
+        checkpoint_seconds=Config.BROADCAST_CHECKPOINT_SECONDS
+    )
@@ -0,0 +1,68 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from agents import Agent
+
+from ..agents.tools.clause_library import ClauseLibrary, clause_library
+from ..agents.triage_agent import create_triage_agent
+from ..config import Config
+from ..db import store as default_store
+from ..db.base import BaseStore
+from ..db.retention import RetentionJob
+from .admission import AdmissionController, admission
+from .analytics import UsageAnalytics, analytics
+from .broadcast import BroadcastEngine, create_broadcast_engine
+from .document_review import DocumentReviewer, TwilioMediaFetcher
+from .messaging import MessagingService
+from .reminders import ReminderScheduler, create_reminder_scheduler
+from .runs import RunManager, create_run_manager
+from .semantic_cache import SemanticAnswerStore, semantic_cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AppServices:
+    """Everything the routes use, built once per process and handed to each blueprint."""
+
+    store: BaseStore
+    triage_agent: Agent
+    messaging: MessagingService
+    admission: AdmissionController
+    analytics: UsageAnalytics
+    semantic_cache: SemanticAnswerStore
+    clause_library: ClauseLibrary
+    document_reviewer: DocumentReviewer
+    retention_job: RetentionJob
+    broadcasts: BroadcastEngine
+    reminders: ReminderScheduler
+    runs: RunManager
+
+
+def build_services(store: Optional[BaseStore] = None, triage_agent: Optional[Agent] = None) -> AppServices:
+    """The process-wide services: the agent graph, clients and caches are created here and nowhere per request."""
+    store = store if store is not None else default_store
+    services = AppServices(
+        store=store,
+        triage_agent=triage_agent or create_triage_agent(),
+        messaging=MessagingService(),
+        admission=admission,
+        analytics=analytics,
+        semantic_cache=semantic_cache,
+        clause_library=clause_library,
+        document_reviewer=DocumentReviewer(TwilioMediaFetcher()),
+        # Archives conversations of users who have been idle for RETENTION_IDLE_DAYS
+        retention_job=RetentionJob(
+            store,
+            idle_days=Config.RETENTION_IDLE_DAYS,
+            interval=Config.RETENTION_INTERVAL_SECONDS,
+            batch_size=Config.RETENTION_BATCH_SIZE,
+            batch_pause=Config.RETENTION_BATCH_PAUSE_SECONDS
+        ),
+        broadcasts=create_broadcast_engine(store),
+        reminders=create_reminder_scheduler(store),
+        runs=create_run_manager(store)
+    )
+    logger.info("Application services created")
+    return services
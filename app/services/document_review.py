@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import io
+import logging
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import requests
+from agents import Agent, Runner
+from pydantic import BaseModel
+
+from ..config import Config
+from ..utils.cache import LRUCache
+from .admission import record_run_usage
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:
+    pytesseract = None
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Lines that start a new clause in Mexican contracts ("CLÁUSULA PRIMERA", "DÉCIMA.-", "Artículo 5", "3.")
+CLAUSE_HEADING_PATTERN = re.compile(
+    r"^\s*(?:CL[ÁA]USULA\b|ART[ÍI]CULO\b|"
+    r"(?:PRIMERA|SEGUNDA|TERCERA|CUARTA|QUINTA|SEXTA|S[ÉE]PTIMA|OCTAVA|NOVENA|D[ÉE]CIMA)\b|"
+    r"\d{1,3}\.\s)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+class DocumentReviewError(Exception):
+    """Raised when a document cannot be fetched or read."""
+
+
+class ChunkFindings(BaseModel):
+    summary: str
+    risks: List[str]
+    unusual_terms: List[str]
+
+
+class MediaFetcher(ABC):
+    """Downloads media attached to an incoming message."""
+
+    @abstractmethod
+    async def fetch(self, url: str) -> bytes:
+        """The media's bytes; raises DocumentReviewError if it cannot be fetched."""
+
+
+class TwilioMediaFetcher(MediaFetcher):
+    """Fetch Twilio media URLs using the account credentials."""
+
+    def __init__(self, max_bytes: int = Config.DOCUMENT_MAX_BYTES):
+        self.max_bytes = max_bytes
+
+    def _download(self, url: str) -> bytes:
+        with requests.get(
+            url,
+            auth=(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN),
+            stream=True,
+            timeout=30,
+        ) as resp:
+            resp.raise_for_status()
+            buffer = io.BytesIO()
+            for block in resp.iter_content(64 * 1024):
+                buffer.write(block)
+                if buffer.tell() > self.max_bytes:
+                    raise DocumentReviewError(f"Document exceeds {self.max_bytes} bytes")
+            return buffer.getvalue()
+
+    async def fetch(self, url: str) -> bytes:
+        return await asyncio.to_thread(self._download, url)
+
+
+class LocalMediaFetcher(MediaFetcher):
+    """Stand-in fetcher that serves media from a local directory, for tests and benchmarks."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    async def fetch(self, url: str) -> bytes:
+        path = self.root / url.rsplit("/", 1)[-1]
+        try:
+            return await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            raise DocumentReviewError(f"Media not found: {url}")
+
+
+async def extract_pages(data: bytes, content_type: str) -> AsyncIterator[str]:
+    """Yield the text of a document one page at a time."""
+    if content_type == "application/pdf":
+        if PdfReader is None:
+            raise DocumentReviewError("PDF support requires the 'pypdf' package")
+        reader = await asyncio.to_thread(PdfReader, io.BytesIO(data))
+        for page in reader.pages:
+            yield await asyncio.to_thread(page.extract_text) or ""
+    elif content_type.startswith("image/"):
+        if pytesseract is None:
+            raise DocumentReviewError("Image support requires the 'pytesseract' and 'Pillow' packages")
+        image = await asyncio.to_thread(Image.open, io.BytesIO(data))
+        yield await asyncio.to_thread(pytesseract.image_to_string, image, lang="spa")
+    elif content_type.startswith("text/"):
+        # Plain-text documents use form feeds as page breaks
+        for page in data.decode("utf-8", errors="replace").split("\f"):
+            yield page
+    else:
+        raise DocumentReviewError(f"Unsupported document type: {content_type}")
+
+
+async def chunk_clauses(pages: AsyncIterator[str], max_chars: int) -> AsyncIterator[str]:
+    """Group streamed page text into chunks that start and end on clause boundaries.
+
+    A clause longer than `max_chars` is split on paragraph breaks.
+    """
+    pending = ""
+    chunk = ""
+
+    def split_oversized(clause: str) -> List[str]:
+        parts, current = [], ""
+        for paragraph in clause.split("\n\n"):
+            if current and len(current) + len(paragraph) + 2 > max_chars:
+                parts.append(current)
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+            while len(current) > max_chars:
+                parts.append(current[:max_chars])
+                current = current[max_chars:]
+        if current:
+            parts.append(current)
+        return parts
+
+    def take(clauses: List[str]) -> List[str]:
+        nonlocal chunk
+        ready = []
+        for clause in clauses:
+            for part in split_oversized(clause) if len(clause) > max_chars else [clause]:
+                if chunk and len(chunk) + len(part) > max_chars:
+                    ready.append(chunk)
+                    chunk = ""
+                chunk += part
+        return ready
+
+    async for page in pages:
+        pending += page + "\n"
+        starts = [m.start() for m in CLAUSE_HEADING_PATTERN.finditer(pending)]
+        # Everything before the last heading is complete; the last clause may continue on the next page
+        cut = starts[-1] if starts else 0
+        if cut == 0:
+            if len(pending) <= max_chars:
+                continue
+            cut = len(pending)
+        bounds = sorted({0, *(s for s in starts if s < cut)}) + [cut]
+        clauses = [pending[a:b] for a, b in zip(bounds, bounds[1:])]
+        pending = pending[cut:]
+        for ready in take(clauses):
+            yield ready
+
+    for ready in take([pending] if pending.strip() else []):
+        yield ready
+    if chunk.strip():
+        yield chunk
+
+
+chunk_review_agent = Agent(
+    name="Contract Chunk Reviewer",
+    instructions="""You review one excerpt of a contract governed by Mexican law.
+Summarize what the excerpt establishes in one or two sentences, list concrete risks for the person who sent the contract, and list any terms that are unusual, abusive or missing compared with standard Mexican practice.
+Answer in the language of the contract. Do not include disclaimers.""",
+    model=Config.DOCUMENT_REVIEW_MODEL,
+    output_type=ChunkFindings,
+)
+
+
+async def analyze_chunk_with_agent(chunk: str) -> ChunkFindings:
+    """Analyze one contract chunk with the chunk review agent."""
+    result = await Runner.run(chunk_review_agent, chunk)
+    record_run_usage(result)
+    return result.final_output
+
+
+def _format_findings(findings: List[ChunkFindings]) -> str:
+    sections = []
+    for i, finding in enumerate(findings, start=1):
+        lines = [f"Section {i}: {finding.summary}"]
+        lines += [f"- Risk: {risk}" for risk in finding.risks]
+        lines += [f"- Unusual: {term}" for term in finding.unusual_terms]
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+
+class DocumentReviewer:
+    """Map-reduce review of an uploaded contract.
+
+    Pages are extracted as a stream and grouped into clause-aligned chunks;
+    each chunk is analyzed as soon as it is ready, with at most `concurrency`
+    analyses in flight. The findings are merged into one summary by the
+    Contract Agent. Extracted text, per-chunk findings and final summaries
+    are cached by content hash.
+    """
+
+    def __init__(
+        self,
+        fetcher: MediaFetcher,
+        analyze_chunk: Callable[[str], Awaitable[ChunkFindings]] = analyze_chunk_with_agent,
+        summarize: Optional[Callable[[str, str], Awaitable[str]]] = None,
+        concurrency: int = Config.DOCUMENT_REVIEW_CONCURRENCY,
+        chunk_chars: int = Config.DOCUMENT_CHUNK_CHARS,
+        cache_size: int = Config.DOCUMENT_CACHE_SIZE,
+    ):
+        self.fetcher = fetcher
+        self.analyze_chunk = analyze_chunk
+        self.summarize = summarize or self._summarize_with_contract_agent
+        self.concurrency = concurrency
+        self.chunk_chars = chunk_chars
+        self.text_cache = LRUCache(cache_size)
+        self.chunk_cache = LRUCache(cache_size * 64)
+        self.findings_cache = LRUCache(cache_size)
+        self.summary_cache = LRUCache(cache_size)
+        self._contract_agent = None
+
+    async def _summarize_with_contract_agent(self, findings: str, question: str) -> str:
+        if self._contract_agent is None:
+            from ..agents.contract_agent import create_contract_agent
+            self._contract_agent = create_contract_agent()
+        prompt = (
+            "The user sent a contract for review. Below are the findings for each section of the document.\n"
+            "Write a concise review for WhatsApp: what the contract is, the main risks, unusual or missing terms, "
+            "and what the user should negotiate or check.\n\n"
+            f"User message: {question or '(no message)'}\n\nFindings:\n{findings}"
+        )
+        result = await Runner.run(self._contract_agent, prompt)
+        record_run_usage(result)
+        return result.final_output
+
+    async def _pages(self, doc_hash: str, data: bytes, content_type: str) -> AsyncIterator[str]:
+        """Stream pages, replaying from the text cache when the document was seen before."""
+        cached = self.text_cache.get(doc_hash)
+        if cached is not None:
+            for page in cached:
+                yield page
+            return
+
+        pages = []
+        async for page in extract_pages(data, content_type):
+            pages.append(page)
+            yield page
+        self.text_cache.set(doc_hash, pages)
+
+    async def _analyze(self, chunk: str, semaphore: asyncio.Semaphore) -> ChunkFindings:
+        try:
+            chunk_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+            cached = self.chunk_cache.get(chunk_hash)
+            if cached is not None:
+                return cached
+            findings = await self.analyze_chunk(chunk)
+            self.chunk_cache.set(chunk_hash, findings)
+            return findings
+        finally:
+            semaphore.release()
+
+    async def review_bytes(self, data: bytes, content_type: str, question: str = "") -> Dict:
+        """Review a document already in memory. Returns the summary and review stats."""
+        doc_hash = hashlib.sha256(data).hexdigest()
+        summary = self.summary_cache.get((doc_hash, question))
+        if summary is not None:
+            logger.debug(f"Document review cache hit for {doc_hash[:12]}")
+            return {"hash": doc_hash, "summary": summary, "chunks": 0, "cached": True}
+
+        findings = self.findings_cache.get(doc_hash)
+        chunks = 0
+        if findings is None:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            tasks = []
+            try:
+                async for chunk in chunk_clauses(self._pages(doc_hash, data, content_type), self.chunk_chars):
+                    # Acquiring before scheduling applies backpressure to extraction as well
+                    await semaphore.acquire()
+                    tasks.append(asyncio.create_task(self._analyze(chunk, semaphore)))
+                results = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+            if not results:
+                raise DocumentReviewError("No text could be extracted from the document")
+            chunks = len(results)
+            findings = _format_findings(results)
+            self.findings_cache.set(doc_hash, findings)
+
+        summary = await self.summarize(findings, question)
+        self.summary_cache.set((doc_hash, question), summary)
+        logger.info(f"Reviewed document {doc_hash[:12]} in {chunks} chunks")
+        return {"hash": doc_hash, "summary": summary, "chunks": chunks, "cached": chunks == 0}
+
+    async def review(self, media_url: str, content_type: str, question: str = "") -> Dict:
+        """Fetch a document from its media URL and review it."""
+        data = await self.fetcher.fetch(media_url)
+        return await self.review_bytes(data, content_type, question)
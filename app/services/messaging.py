@@ -1,3 +1,7 @@
+import asyncio
+import json
+from typing import Dict, Optional
+from aiohttp import ClientError
 from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
 from ..config import Config
@@ -13,18 +17,19 @@ class MessagingService:
             Config.TWILIO_AUTH_TOKEN
         )
         
-    def create_response(self, message: str) -> MessagingResponse:
+    def create_response(self, message: Optional[str]) -> MessagingResponse:
         """
         Create a TwiML response with the given message.
         
         Args:
-            message: The message to send back to the user
+            message: The message to send back to the user, or None to reply with nothing
             
         Returns:
             MessagingResponse: A TwiML response object
         """
         resp = MessagingResponse()
-        resp.message(message)
+        if message:
+            resp.message(message)
         return resp
         
     async def send_message(self, to: str, body: str) -> None:
@@ -36,7 +41,9 @@ class MessagingService:
             body: The message content
         """
         try:
-            message = self.client.messages.create(
+            # The Twilio client is blocking; keep it off the event loop
+            message = await asyncio.to_thread(
+                self.client.messages.create,
                 to=to,
                 from_=Config.TWILIO_PHONE_NUMBER,
                 body=body
@@ -44,4 +51,56 @@ class MessagingService:
             logger.info(f"Message sent successfully. SID: {message.sid}")
         except Exception as e:
             logger.error(f"Error sending message: {str(e)}")
-            raise 
\ No newline at end of file
+            raise 
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed send is worth retrying: throttling, server errors and network trouble."""
+    status = getattr(error, "status", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (ClientError, asyncio.TimeoutError, ConnectionError))
+
+
+class TwilioAsyncSender:
+    """Sends WhatsApp messages through Twilio's asynchronous HTTP client, for bulk and scheduled sends.
+
+    Every send shares one connection pool, created on first use inside the
+    running event loop. WhatsApp only delivers freeform text to users who
+    wrote in the last 24 hours; anyone else must be sent an approved content
+    template, identified by its `content_sid` and filled with `variables`.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, timeout: float = 30):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.timeout = timeout
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from twilio.http.async_http_client import AsyncTwilioHttpClient
+            from twilio.rest import Client
+            self._client = Client(
+                self.account_sid,
+                self.auth_token,
+                http_client=AsyncTwilioHttpClient(timeout=self.timeout)
+            )
+        return self._client
+
+    async def send(self, to: str, body: str, content_sid: Optional[str] = None, variables: Optional[Dict[str, str]] = None) -> str:
+        """Send one message and return its SID: the content template `content_sid` when given, otherwise `body`."""
+        if not to.startswith("whatsapp:"):
+            to = f"whatsapp:{to}"
+        if content_sid:
+            content = {"content_sid": content_sid, "content_variables": json.dumps(variables or {})}
+        else:
+            content = {"body": body}
+        message = await self._get_client().messages.create_async(to=to, from_=self.from_number, **content)
+        return message.sid
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.http_client.close()
+            self._client = None
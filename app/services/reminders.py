@@ -0,0 +1,318 @@
+"""Deadline and follow-up reminders sent over WhatsApp when they fall due.
+
+Pending reminders can number in the millions, so none are held in memory
+until they are close. Every `poll_interval` seconds a worker leases the
+reminders due within the next `horizon` seconds, reading them through the
+(status, due_at) index, and files them in a hashed timing wheel. A tick
+loop advances the wheel every `tick` seconds and sends what has fallen due,
+so a reminder goes out within about one tick of its time at a cost that
+does not depend on how many are pending.
+"""
+import asyncio
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional, Set
+
+from ..config import Config
+from ..db.base import BaseStore
+from ..db.reminders import MemoryReminderQueue, MongoReminderQueue, ReminderQueue, SQLiteReminderQueue
+from .messaging import TwilioAsyncSender, is_transient
+
+logger = logging.getLogger(__name__)
+
+REMINDER_PREFIX = "Reminder: "
+
+
+class ReminderError(Exception):
+    """A reminder that cannot be scheduled."""
+
+
+class TimingWheel:
+    """Hashed timing wheel: timers are filed by due tick into `slots` buckets.
+
+    Adding a timer and advancing by one tick are O(1) on average, whatever
+    the number of timers. A timer further out than one revolution shares its
+    bucket with nearer ones and is skipped until its tick comes round.
+    """
+
+    def __init__(self, tick: float, slots: int, now: float):
+        self.tick = tick
+        self.slots: List[List] = [[] for _ in range(slots)]
+        # The next tick to process
+        self.current = math.floor(now / tick)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, due: float, item):
+        # Rounded up, so nothing fires before it is due; overdue timers fire on the next advance
+        due_tick = max(math.ceil(due / self.tick), self.current)
+        self.slots[due_tick % len(self.slots)].append((due_tick, item))
+        self._count += 1
+
+    def advance(self, now: float) -> List:
+        """Items due by `now`, in no particular order."""
+        target = math.floor(now / self.tick)
+        if target < self.current:
+            return []
+        fired = []
+        # After a long pause every bucket is visited once, not once per missed tick
+        for position in range(self.current, self.current + min(target - self.current + 1, len(self.slots))):
+            index = position % len(self.slots)
+            slot = self.slots[index]
+            if not slot:
+                continue
+            waiting = [entry for entry in slot if entry[0] > target]
+            if len(waiting) < len(slot):
+                fired.extend(item for due_tick, item in slot if due_tick <= target)
+                self.slots[index] = waiting
+        self.current = target + 1
+        self._count -= len(fired)
+        return fired
+
+    def drain(self) -> List:
+        """Remove and return every item still waiting."""
+        items = [item for slot in self.slots for _, item in slot]
+        self.slots = [[] for _ in self.slots]
+        self._count = 0
+        return items
+
+
+class ReminderScheduler:
+    """Stores reminders and, when started, sends the ones falling due.
+
+    Any number of workers may run the scheduler: a reminder is leased to one
+    of them until `lease_seconds` after the end of the horizon it was loaded
+    for. A worker that dies keeps its reminders for at most that long before
+    another worker sends them; one that shuts down hands them back at once.
+    """
+
+    def __init__(
+        self,
+        queue: ReminderQueue,
+        sender,
+        store: Optional[BaseStore] = None,
+        tick: float = 0.1,
+        horizon: float = 60,
+        poll_interval: float = 5,
+        lease_seconds: float = 60,
+        batch_size: int = 1000,
+        concurrency: int = 16,
+        max_attempts: int = 5,
+        retry_delay: float = 30,
+        max_per_user: int = 20,
+        content_sid: Optional[str] = None
+    ):
+        self.queue = queue
+        self.sender = sender
+        self.store = store
+        self.tick = tick
+        self.horizon = horizon
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_per_user = max_per_user
+        # Approved template taking the reminder text as variable "1", for users outside WhatsApp's 24-hour window
+        self.content_sid = content_sid
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._concurrency = concurrency
+        self._wheel: Optional[TimingWheel] = None
+        self._scheduled: Set[str] = set()
+        self._sends: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._limit: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def schedule(self, phone_number: str, message: str, due_at: datetime) -> Dict:
+        """Store a reminder for `phone_number`; raises ReminderError if it is not acceptable."""
+        message = message.strip()
+        if not message:
+            raise ReminderError("The reminder needs a message.")
+        if not self.queue.shared and not self.running:
+            # Only this process would ever see it, and it does not send reminders
+            raise ReminderError("Reminders are not available on this server: they need shared storage (Mongo or SQLite).")
+        due_at = due_at.astimezone(UTC)
+        now = datetime.now(UTC)
+        if due_at <= now:
+            raise ReminderError("That time has already passed.")
+        if due_at > now + timedelta(days=Config.REMINDER_MAX_DAYS_AHEAD):
+            raise ReminderError(f"Reminders can be set at most {Config.REMINDER_MAX_DAYS_AHEAD} days ahead.")
+        if self.queue.count_active(phone_number) >= self.max_per_user:
+            raise ReminderError(f"You already have {self.max_per_user} pending reminders.")
+        reminder = {
+            "_id": uuid.uuid4().hex,
+            "phone_number": phone_number,
+            "message": message[:Config.REMINDER_MAX_CHARS],
+            "due_at": due_at,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now
+        }
+        self.queue.add(reminder)
+        logger.info(f"Scheduled reminder {reminder['_id']} for {phone_number} at {due_at.isoformat()}")
+        # The next poll may come too late for a reminder due within the horizon
+        if self._loop is not None and due_at < now + timedelta(seconds=self.horizon):
+            self._loop.call_soon_threadsafe(self._poll_soon)
+        return reminder
+
+    # Loading
+
+    def _poll_soon(self):
+        if self.running:
+            task = asyncio.create_task(self._load_once())
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    async def _load_once(self):
+        try:
+            await self._load()
+        except Exception as e:
+            logger.error(f"Error loading reminders: {e}")
+
+    async def _load(self) -> int:
+        """Lease everything due within the horizon and file it in the wheel."""
+        loaded = 0
+        while True:
+            before = datetime.now(UTC) + timedelta(seconds=self.horizon)
+            lease_until = before + timedelta(seconds=self.lease_seconds)
+            claimed = await asyncio.to_thread(self.queue.claim_due, before, self.owner, lease_until, self.batch_size)
+            for reminder in claimed:
+                if reminder["_id"] not in self._scheduled:
+                    self._scheduled.add(reminder["_id"])
+                    self._wheel.add(reminder["due_at"].replace(tzinfo=UTC).timestamp(), reminder)
+                    loaded += 1
+            if len(claimed) < self.batch_size:
+                return loaded
+
+    async def _poll(self):
+        while True:
+            try:
+                loaded = await self._load()
+                if loaded:
+                    logger.debug(f"Loaded {loaded} reminders; {len(self._wheel)} waiting")
+            except Exception as e:
+                logger.error(f"Error loading reminders: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    # Firing
+
+    async def _run_wheel(self):
+        while True:
+            for reminder in self._wheel.advance(time.time()):
+                task = asyncio.create_task(self._fire(reminder))
+                self._sends.add(task)
+                task.add_done_callback(self._sends.discard)
+            # Sleep to the next tick boundary rather than a fixed interval, so ticks do not drift
+            await asyncio.sleep(self._wheel.current * self.tick - time.time())
+
+    async def _fire(self, reminder: Dict):
+        reminder_id = reminder["_id"]
+        text = REMINDER_PREFIX + reminder["message"]
+        try:
+            async with self._limit:
+                await self.sender.send(
+                    reminder["phone_number"], text, content_sid=self.content_sid, variables={"1": reminder["message"]}
+                )
+        except Exception as e:
+            try:
+                await asyncio.to_thread(self._retry_or_fail, reminder, e)
+            except Exception as e:
+                # The lease lapses and another poll picks the reminder up again
+                logger.error(f"Error rescheduling reminder {reminder_id}: {e}")
+            return
+        finally:
+            self._scheduled.discard(reminder_id)
+        try:
+            await asyncio.to_thread(self._sent, reminder, text)
+        except Exception as e:
+            logger.error(f"Error recording sent reminder {reminder_id}: {e}")
+
+    def _sent(self, reminder: Dict, text: str):
+        self.queue.complete(reminder["_id"], self.owner)
+        late = time.time() - reminder["due_at"].replace(tzinfo=UTC).timestamp()
+        logger.info(f"Sent reminder {reminder['_id']} to {reminder['phone_number']} ({late * 1000:.0f} ms after due)")
+        if self.store is not None:
+            # So the agents see what the user was reminded of when they reply
+            self.store.append_to_history(reminder["phone_number"], "assistant", text)
+
+    def _retry_or_fail(self, reminder: Dict, error: Exception):
+        attempts = reminder.get("attempts", 0) + 1
+        if attempts < self.max_attempts and is_transient(error):
+            due_at = datetime.now(UTC) + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+            logger.warning(f"Reminder {reminder['_id']} failed ({error}); retrying at {due_at.isoformat()}")
+            self.queue.release(reminder["_id"], self.owner, due_at, attempts, str(error))
+        else:
+            logger.error(f"Reminder {reminder['_id']} to {reminder['phone_number']} failed: {error}")
+            self.queue.fail(reminder["_id"], self.owner, str(error))
+
+    # Lifecycle
+
+    def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._limit = asyncio.Semaphore(self._concurrency)
+        # One revolution covers the horizon plus a poll interval, so loaded reminders rarely wait a round
+        slots = max(64, math.ceil((self.horizon + self.poll_interval) / self.tick) + 1)
+        self._wheel = TimingWheel(self.tick, slots, time.time())
+        self._tasks = [asyncio.create_task(self._poll()), asyncio.create_task(self._run_wheel())]
+        logger.info(f"Reminder scheduler started as {self.owner}")
+
+    async def stop(self):
+        """Stop firing, let sends in progress finish and hand unsent reminders back."""
+        if not self.running:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+        waiting = self._wheel.drain() if self._wheel else []
+        for reminder in waiting:
+            await asyncio.to_thread(self.queue.release, reminder["_id"], self.owner)
+        self._scheduled.clear()
+        await self.sender.close()
+        if waiting:
+            logger.info(f"Handed back {len(waiting)} unsent reminders")
+
+
+def create_reminder_queue(store: BaseStore) -> ReminderQueue:
+    """Reminders are kept next to the conversations when those are in Mongo or SQLite."""
+    db = getattr(store, "db", None)
+    if db is not None:
+        return MongoReminderQueue(db.reminders, Config.REMINDER_HISTORY_DAYS)
+    path = getattr(store, "path", None)
+    if path is not None:
+        return SQLiteReminderQueue(path, Config.REMINDER_HISTORY_DAYS)
+    return MemoryReminderQueue()
+
+
+def create_reminder_scheduler(store: BaseStore) -> ReminderScheduler:
+    """The scheduler for `store`, queueing reminders next to its conversations and recording sent ones in them."""
+    return ReminderScheduler(
+        create_reminder_queue(store),
+        TwilioAsyncSender(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN, Config.TWILIO_PHONE_NUMBER),
+        store=store,
+        tick=Config.REMINDER_TICK_SECONDS,
+        horizon=Config.REMINDER_HORIZON_SECONDS,
+        poll_interval=Config.REMINDER_POLL_SECONDS,
+        lease_seconds=Config.REMINDER_LEASE_SECONDS,
+        concurrency=Config.REMINDER_CONCURRENCY,
+        max_attempts=Config.REMINDER_MAX_ATTEMPTS,
+        max_per_user=Config.REMINDER_MAX_PER_USER,
+        content_sid=Config.REMINDER_CONTENT_SID or None
+    )
@@ -0,0 +1,246 @@
+"""Agent runs that survive restarts: checkpointed while they run, drained on shutdown, resumed after.
+
+A run streams through the SDK so the items each step produces can be seen
+as soon as the step ends. After every step that called tools or handed off,
+the items generated so far and the agent now in charge are saved to the run
+journal; a resumed run replays them as input to that agent, so triage and
+completed tool calls are not done again. Final answers are not
+checkpointed: a run that ends is recorded as done with its reply.
+
+On shutdown the manager stops taking runs over and waits up to a deadline
+for its runs to finish. Runs still going then are cancelled and their
+leases released, so the next worker to start resumes them at once; runs of
+a worker that died are taken over when their lease lapses.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, UTC
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from agents import Agent, Runner
+from agents.items import HandoffOutputItem, ToolCallOutputItem
+from agents.stream_events import RunItemStreamEvent
+
+from ..config import Config
+from ..db.base import BaseStore
+from ..db.runs import MemoryRunJournal, MongoRunJournal, RunJournal, decode_items
+
+logger = logging.getLogger(__name__)
+
+# Items that end a step worth saving: the model's next call depends on them
+CHECKPOINT_ITEMS = (ToolCallOutputItem, HandoffOutputItem)
+
+
+def agent_graph(agent: Agent) -> Dict[str, Agent]:
+    """Every agent reachable from `agent` through handoffs, by name."""
+    found = {}
+    pending = [agent]
+    while pending:
+        current = pending.pop()
+        if current.name in found:
+            continue
+        found[current.name] = current
+        pending.extend(handoff for handoff in current.handoffs if isinstance(handoff, Agent))
+    return found
+
+
+class RunManager:
+    """Executes agent runs under a lease, checkpointing them, and resumes runs left unfinished.
+
+    The channel that starts runs sets `resume_handler`, a coroutine function
+    taking a journal record; it rebuilds the run's input, calls `execute`
+    and delivers the reply.
+    """
+
+    def __init__(
+        self,
+        journal: RunJournal,
+        lease_seconds: float = 60,
+        heartbeat_seconds: float = 20,
+        poll_interval: float = 15,
+        max_attempts: int = 3,
+        batch_size: int = 20
+    ):
+        self.journal = journal
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.resume_handler: Optional[Callable[[Dict], Awaitable]] = None
+        self.accepting = True
+        self._runs: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def _lease_until(self) -> datetime:
+        return datetime.now(UTC) + timedelta(seconds=self.lease_seconds)
+
+    def begin(self, run_id: str, phone_number: str, **fields) -> Optional[Dict]:
+        """Journal a new run leased to this worker; None if the run was started before (a retried message)."""
+        now = datetime.now(UTC)
+        run = {
+            "_id": run_id,
+            "phone_number": phone_number,
+            **fields,
+            "status": "running",
+            "agent": None,
+            "step": 0,
+            "attempts": 0,
+            "owner": self.owner,
+            "lease_until": self._lease_until(),
+            "created_at": now,
+            "updated_at": now
+        }
+        return run if self.journal.begin(run) else None
+
+    def submit(self, run_id: str, work: Awaitable) -> asyncio.Task:
+        """Run `work` as a task drained on shutdown; if the drain cancels it, the run's lease is released."""
+        task = asyncio.create_task(self._guard(run_id, work))
+        self._runs.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: asyncio.Task):
+        self._runs.discard(task)
+        # Already logged by _guard; resumed runs have nobody else to retrieve it
+        if not task.cancelled():
+            task.exception()
+
+    async def _guard(self, run_id: str, work: Awaitable):
+        try:
+            return await work
+        except asyncio.CancelledError:
+            if not self.accepting:
+                await asyncio.to_thread(self.journal.release, run_id, self.owner)
+                logger.info(f"Released run {run_id} at its last checkpoint")
+            raise
+        except Exception as e:
+            logger.error(f"Run {run_id} failed: {e}")
+            await asyncio.to_thread(self.journal.fail, run_id, self.owner, str(e))
+            raise
+
+    async def execute(self, run: Dict, agent: Agent, input: List, context=None, run_config=None, runner=Runner):
+        """Run `agent`'s graph on `input`, continuing from the run's checkpoint, and return the streamed result once complete."""
+        done_items = decode_items(run.get("items"))
+        start = agent_graph(agent).get(run.get("agent") or agent.name, agent)
+        if done_items:
+            logger.info(f"Resuming run {run['_id']} with {start.name} after {len(done_items)} items")
+        result = runner.run_streamed(start, list(input) + done_items, context=context, run_config=run_config)
+        saved = 0
+        writes = []
+        try:
+            # Nothing is awaited in this loop: the SDK ends the stream cleanly when the task is cancelled in it
+            async for event in result.stream_events():
+                if not isinstance(event, RunItemStreamEvent) or not isinstance(event.item, CHECKPOINT_ITEMS):
+                    continue
+                # The step's items are all in new_items by the time its first event is read
+                new_items = result.new_items
+                if len(new_items) <= saved:
+                    continue
+                saved = len(new_items)
+                current = start
+                for item in new_items:
+                    if isinstance(item, HandoffOutputItem):
+                        current = item.target_agent
+                items = done_items + [item.to_input_item() for item in new_items]
+                # Writes may land out of order; the journal keeps the one with the most items
+                writes.append(asyncio.create_task(asyncio.to_thread(
+                    self.journal.checkpoint, run["_id"], self.owner, current.name, items, self._lease_until()
+                )))
+        finally:
+            for outcome in await asyncio.gather(*writes, return_exceptions=True):
+                if isinstance(outcome, Exception):
+                    logger.error(f"Error checkpointing run {run['_id']}: {outcome}")
+        if asyncio.current_task().cancelling():
+            raise asyncio.CancelledError()
+        return result
+
+    def finish(self, run: Dict, response: str):
+        self.journal.finish(run["_id"], self.owner, response)
+
+    # Background work
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await asyncio.to_thread(self.journal.renew, self.owner, self._lease_until())
+            except Exception as e:
+                logger.error(f"Error renewing run leases: {e}")
+
+    async def _resume_stale(self) -> int:
+        claimed = await asyncio.to_thread(self.journal.claim_stale, self.owner, self._lease_until(), self.batch_size)
+        resumed = 0
+        for run in claimed:
+            if run.get("attempts", 0) >= self.max_attempts:
+                logger.error(f"Giving up on run {run['_id']} after {self.max_attempts} attempts")
+                await asyncio.to_thread(self.journal.fail, run["_id"], self.owner, "too many attempts")
+                continue
+            self.submit(run["_id"], self.resume_handler(run))
+            resumed += 1
+        if resumed:
+            logger.info(f"Resumed {resumed} unfinished runs")
+        return len(claimed)
+
+    async def _poll(self):
+        while True:
+            try:
+                # A full batch means more may be waiting
+                while self.accepting and await self._resume_stale() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Error resuming runs: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    # Lifecycle
+
+    def start(self):
+        if self.running:
+            return
+        self.accepting = True
+        self._tasks = [asyncio.create_task(self._heartbeat())]
+        if self.resume_handler is not None:
+            self._tasks.append(asyncio.create_task(self._poll()))
+        logger.info(f"Run manager started as {self.owner}")
+
+    async def drain(self, timeout: float):
+        """Stop taking runs, wait up to `timeout` seconds for those running, then hand the rest back."""
+        self.accepting = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        pending = set(self._runs)
+        if not pending:
+            return
+        logger.info(f"Waiting up to {timeout}s for {len(pending)} agent runs")
+        _, pending = await asyncio.wait(pending, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"Handed back {len(pending)} unfinished agent runs for the next worker")
+
+
+def create_run_manager(store: BaseStore) -> RunManager:
+    """Runs are journaled next to the conversations when those are in Mongo."""
+    db = getattr(store, "db", None)
+    if db is not None:
+        journal = MongoRunJournal(db.agent_runs, Config.RUN_HISTORY_HOURS)
+    else:
+        journal = MemoryRunJournal(Config.RUN_HISTORY_HOURS)
+    return RunManager(
+        journal,
+        lease_seconds=Config.RUN_LEASE_SECONDS,
+        heartbeat_seconds=Config.RUN_HEARTBEAT_SECONDS,
+        poll_interval=Config.RUN_POLL_SECONDS,
+        max_attempts=Config.RUN_MAX_ATTEMPTS
+    )
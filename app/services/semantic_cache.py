@@ -0,0 +1,545 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from ..config import Config
+from ..utils.text import normalize_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Words that carry no meaning for matching legal questions
+STOPWORDS = {
+    "a", "al", "algo", "como", "con", "cual", "de", "del", "donde", "el", "en", "es", "esta", "este",
+    "hay", "la", "las", "le", "lo", "los", "me", "mi", "mis", "necesito", "para", "pero", "por", "puedo",
+    "que", "quiero", "se", "si", "su", "sus", "tengo", "un", "una", "y", "yo", "hola", "favor",
+    "i", "my", "me", "the", "a", "an", "to", "of", "how", "can", "do", "is", "what", "want", "need",
+}
+
+# Stems of synonyms mapped to one concept, so paraphrases embed close together
+CONCEPTS = {
+    "arrendamiento": ["renta", "rentar", "arrend", "alquil", "inquil", "lease", "rent", "tenan", "landlo", "depart", "vivien"],
+    "terminar": ["termin", "cancel", "rescin", "finali", "romper", "salir", "acabar", "end", "termina"],
+    "despido": ["despid", "despedi", "corrie", "liquid", "fired", "dismis"],
+    "empleo": ["trabaj", "emplea", "empleo", "patron", "laboral", "job", "employ"],
+    "deposito": ["deposi", "garant", "fianza"],
+    "devolver": ["devolv", "devuel", "reembo", "regres", "refund"],
+    "divorcio": ["divorc", "separa"],
+    "pension": ["pensio", "alimen"],
+    "herencia": ["hereda", "herenc", "testam", "sucesi"],
+    "contrato": ["contra", "acuerd", "conven", "agreem"],
+    "salario": ["salari", "sueldo", "pago", "wage", "salary"],
+}
+_STEM_TO_CONCEPT = {stem: concept for concept, stems in CONCEPTS.items() for stem in stems}
+
+# Indexed unit vectors are stored as int8: a quarter of float32's size and faster to scan than float16
+QUANTIZATION_SCALE = 127.0
+
+# Scopes are stored per vector as uint16 codes
+MAX_SCOPES = 2 ** 16
+
+# Concepts present in most questions count for less
+GENERIC_CONCEPTS = {"contrato": 0.4}
+
+# Words that flip or narrow a question without moving its embedding much. A
+# cached answer is only served when the question mentions the same ones.
+NEGATIONS = {"no", "nunca", "jamas", "tampoco", "ni", "sin", "not", "never", "without", "dont", "cannot"}
+PARTIES = {
+    "arrendador": ["arrendador", "casero", "propietari", "dueno", "landlord"],
+    "inquilino": ["inquilin", "arrendatari", "tenant"],
+    "patron": ["patron", "empleador", "jefe", "empresa", "employer", "boss"],
+    "conyuge": ["esposo", "esposa", "conyuge", "pareja", "spouse", "husband", "wife"],
+}
+_PARTY_STEMS = sorted(((stem, party) for party, stems in PARTIES.items() for stem in stems), key=lambda p: -len(p[0]))
+MEXICAN_STATES = [
+    "aguascalientes", "baja california sur", "baja california", "campeche", "chiapas", "chihuahua",
+    "ciudad de mexico", "cdmx", "coahuila", "colima", "durango", "estado de mexico", "edomex", "guanajuato",
+    "guerrero", "hidalgo", "jalisco", "michoacan", "morelos", "nayarit", "nuevo leon", "oaxaca", "puebla",
+    "queretaro", "quintana roo", "san luis potosi", "sinaloa", "sonora", "tabasco", "tamaulipas", "tlaxcala",
+    "veracruz", "yucatan", "zacatecas",
+]
+_STATE_PATTERN = re.compile(r"\b(" + "|".join(MEXICAN_STATES) + r")\b")
+
+
+class HashingEmbedder:
+    """Local, dependency-free text embedder.
+
+    Tokens are folded into concepts via a small legal-Spanish synonym table,
+    then concept unigrams, bigrams and character trigrams are hashed into a
+    fixed-size signed vector (the hashing trick) and L2-normalized.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    @staticmethod
+    def _concept(token: str) -> str:
+        for size in (6, 5, 4):
+            concept = _STEM_TO_CONCEPT.get(token[:size])
+            if concept:
+                return concept
+        return token[:6]
+
+    def _features(self, text: str) -> Iterable[tuple]:
+        tokens = [t for t in tokenize(text) if t not in STOPWORDS and len(t) > 1]
+        terms = [self._concept(t) for t in tokens]
+        for term in terms:
+            yield term, GENERIC_CONCEPTS.get(term, 1.0)
+        for first, second in zip(terms, terms[1:]):
+            yield f"{first}_{second}", 0.5
+        # Character trigrams of the raw tokens tolerate typos and unseen inflections
+        for token in tokens:
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield f"3:{padded[i:i + 3]}", 0.1
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if digest & 1 else -1.0
+            vector[(digest >> 1) % self.dim] += sign * weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        return np.stack([self.embed(text) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+    def guard_terms(self, text: str) -> frozenset:
+        """Negation, jurisdiction, party and topic markers two questions must share to share an answer.
+
+        The hashing embedding scores "no quiero terminar mi contrato" or the
+        same question about another state above most genuine paraphrases, so
+        similarity alone cannot tell them apart.
+        """
+        tokens = tokenize(text)
+        terms = {"negation" for t in tokens if t in NEGATIONS}
+        terms.update(f"state:{m}" for m in _STATE_PATTERN.findall(normalize_text(text)))
+        for token in tokens:
+            party = next((party for stem, party in _PARTY_STEMS if token.startswith(stem)), None)
+            if party:
+                terms.add(f"party:{party}")
+            elif token not in STOPWORDS and len(token) > 1:
+                concept = self._concept(token)
+                if concept in CONCEPTS and concept not in GENERIC_CONCEPTS:
+                    terms.add(f"topic:{concept}")
+        return frozenset(terms)
+
+
+@dataclass
+class SemanticMatch:
+    question: str
+    answer: str
+    scope: str
+    score: float
+
+
+class _IndexGeneration:
+    """One immutable, memory-mapped index build.
+
+    Vectors are grouped by k-means cluster (an inverted-file index), so a
+    lookup only scans the few lists whose centroids are closest to the query.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.centroids = np.load(path / "centroids.npy")
+        self.offsets = np.load(path / "offsets.npy")
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self.scopes = np.load(path / "scopes.npy", mmap_mode="r")
+        self.positions = np.load(path / "positions.npy", mmap_mode="r")
+        with open(path / "scopes.json", encoding="utf-8") as f:
+            self.scope_codes: Dict[str, int] = json.load(f)
+
+    def search(self, query: np.ndarray, scope_codes: List[int], nprobe: int) -> Optional[tuple]:
+        if not len(self.centroids):
+            return None
+        nprobe = min(nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        best_score, best_position = -1.0, None
+        for cluster in lists:
+            start, end = int(self.offsets[cluster]), int(self.offsets[cluster + 1])
+            if start == end:
+                continue
+            scores = (self.vectors[start:end].astype(np.float32) @ query) * (1.0 / QUANTIZATION_SCALE)
+            allowed = np.isin(self.scopes[start:end], scope_codes)
+            if not allowed.any():
+                continue
+            scores = np.where(allowed, scores, -1.0)
+            i = int(np.argmax(scores))
+            if scores[i] > best_score:
+                best_score, best_position = float(scores[i]), int(self.positions[start + i])
+        return (best_score, best_position) if best_position is not None else None
+
+
+class SemanticAnswerStore:
+    """Nearest-neighbour store of previously approved answers.
+
+    Answers the agents give are proposed to `proposed.jsonl` and served to
+    nobody until an operator approves them; decisions are appended to
+    `reviews.jsonl` and approved answers to `answers.jsonl`. A background
+    rebuild periodically embeds them into a clustered, memory-mapped index in
+    a new generation directory and flips the `CURRENT` pointer, so readers
+    switch without locking. Answers approved since the last rebuild, by this
+    or any other process, are read from the end of `answers.jsonl` and
+    searched by brute force until they are indexed.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        threshold: float = 0.72,
+        nprobe: int = 8,
+        rebuild_interval: float = 300.0,
+        rebuild_min_pending: int = 100,
+        embedder: Optional[HashingEmbedder] = None,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.answers_path = self.directory / "answers.jsonl"
+        self.proposed_path = self.directory / "proposed.jsonl"
+        self.reviews_path = self.directory / "reviews.jsonl"
+        self.threshold = threshold
+        self.nprobe = nprobe
+        self.rebuild_interval = rebuild_interval
+        self.rebuild_min_pending = rebuild_min_pending
+        self.embedder = embedder or HashingEmbedder()
+
+        self._generation: Optional[_IndexGeneration] = None
+        self._generation_name: Optional[str] = None
+        self._indexed_bytes = 0
+        # How far answers.jsonl has been read into the index or _unindexed
+        self._read_until = 0
+        self._unindexed: List[tuple] = []  # (vector, scope, offset)
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._last_rebuild = time.monotonic()
+        self._last_pointer_check = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._load_current()
+        self._read_new_answers()
+
+    # --- reading ---------------------------------------------------------
+
+    def _load_current(self):
+        """Switch to the generation named in CURRENT if another build replaced it."""
+        pointer = self.directory / "CURRENT"
+        try:
+            name = pointer.read_text().strip()
+        except FileNotFoundError:
+            return
+        if name == self._generation_name:
+            return
+        try:
+            generation = _IndexGeneration(self.directory / name)
+            with open(self.directory / name / "indexed_bytes") as f:
+                indexed_bytes = int(f.read())
+        except Exception as e:
+            logger.error(f"Error loading semantic index {name}: {e}")
+            return
+        with self._lock:
+            self._generation, self._generation_name = generation, name
+            self._indexed_bytes = indexed_bytes
+            self._unindexed = [p for p in self._unindexed if p[2] >= indexed_bytes]
+        logger.info(f"Loaded semantic index {name} ({len(generation.positions)} answers)")
+
+    def _read_new_answers(self):
+        """Queue answers appended to answers.jsonl since the last read, by any process, for brute-force search."""
+        with self._lock:
+            start = max(self._read_until, self._indexed_bytes)
+        try:
+            if self.answers_path.stat().st_size <= start:
+                return
+        except FileNotFoundError:
+            return
+        found, position = [], start
+        with open(self.answers_path, "rb") as f:
+            f.seek(start)
+            for line in iter(f.readline, b""):
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                found.append((self.embedder.embed(entry["question"]), entry["scope"], position))
+                position += len(line)
+        with self._lock:
+            # Another thread may have read some of them meanwhile
+            floor = max(self._read_until, self._indexed_bytes)
+            self._unindexed.extend(p for p in found if p[2] >= floor)
+            self._read_until = max(self._read_until, position)
+
+    def refresh(self):
+        """Pick up a newer index generation and answers approved elsewhere."""
+        self._load_current()
+        self._read_new_answers()
+
+    def _read_answer(self, offset: int) -> Dict:
+        with open(self.answers_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def lookup(self, question: str, scopes: Sequence[str]) -> Optional[SemanticMatch]:
+        """Return the closest approved answer within `scopes` above the similarity threshold.
+
+        The closest answer is not served if its question differs in negation,
+        state, party or topic (see `HashingEmbedder.guard_terms`).
+        """
+        now = time.monotonic()
+        if now - self._last_pointer_check > 5:
+            self._last_pointer_check = now
+            self.refresh()
+
+        query = self.embedder.embed(question)
+        if not query.any():
+            return None
+
+        best_score, best_offset = -1.0, None
+        generation = self._generation
+        if generation is not None:
+            codes = [generation.scope_codes[s] for s in scopes if s in generation.scope_codes]
+            if codes:
+                hit = generation.search(query, codes, self.nprobe)
+                if hit:
+                    best_score, best_offset = hit
+
+        with self._lock:
+            unindexed = list(self._unindexed)
+        for vector, scope, offset in unindexed:
+            if scope in scopes:
+                score = float(vector @ query)
+                if score > best_score:
+                    best_score, best_offset = score, offset
+
+        if best_offset is None or best_score < self.threshold:
+            return None
+        entry = self._read_answer(best_offset)
+        if self.embedder.guard_terms(entry["question"]) != self.embedder.guard_terms(question):
+            logger.debug(f"Semantic match rejected by guard terms (score={best_score:.2f})")
+            return None
+        return SemanticMatch(entry["question"], entry["answer"], entry["scope"], best_score)
+
+    # --- writing ---------------------------------------------------------
+
+    @staticmethod
+    def _append(path: Path, entry: Dict) -> int:
+        """Append `entry` as one JSON line and return its offset."""
+        line = json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+        # O_APPEND keeps concurrent writers from interleaving within a line
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            os.write(fd, line)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        return offset
+
+    @staticmethod
+    def _read_lines(path: Path) -> Iterable[Dict]:
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield json.loads(line)
+
+    def propose(self, question: str, answer: str, scope: str) -> str:
+        """Record an answer for review and return its id; it is not served until approved."""
+        entry_id = uuid.uuid4().hex
+        self._append(self.proposed_path, {
+            "id": entry_id, "question": question, "answer": answer, "scope": scope, "created_at": time.time()
+        })
+        return entry_id
+
+    def _reviewed(self) -> Dict[str, str]:
+        return {review["id"]: review["decision"] for review in self._read_lines(self.reviews_path)}
+
+    def proposals(self, limit: int = 50) -> List[Dict]:
+        """The oldest answers still awaiting review."""
+        reviewed = self._reviewed()
+        found = []
+        for entry in self._read_lines(self.proposed_path):
+            if entry["id"] not in reviewed:
+                found.append(entry)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def review(self, entry_id: str, approved: bool, answer: Optional[str] = None) -> bool:
+        """Approve a proposed answer, optionally with an edited `answer`, or reject it; False if it is unknown or already reviewed."""
+        if entry_id in self._reviewed():
+            return False
+        entry = next((e for e in self._read_lines(self.proposed_path) if e["id"] == entry_id), None)
+        if entry is None:
+            return False
+        self._append(self.reviews_path, {"id": entry_id, "decision": "approved" if approved else "rejected", "at": time.time()})
+        if approved:
+            self.add(entry["question"], answer or entry["answer"], entry["scope"])
+        return True
+
+    def add(self, question: str, answer: str, scope: str):
+        """Record an approved answer; it is searchable immediately in this process, and in others once they refresh."""
+        self._append(self.answers_path, {"question": question, "answer": answer, "scope": scope, "created_at": time.time()})
+        self._read_new_answers()
+        self.maybe_rebuild()
+
+    def maybe_rebuild(self):
+        """Start a background rebuild when enough answers are pending or the interval elapsed."""
+        with self._lock:
+            pending = len(self._unindexed)
+            due = time.monotonic() - self._last_rebuild > self.rebuild_interval
+            if self._rebuilding or not pending or (pending < self.rebuild_min_pending and not due):
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+                self.maybe_rebuild()
+            except Exception as e:
+                logger.error(f"Error refreshing semantic cache: {e}")
+
+    def start(self, interval: float = 5.0):
+        """Refresh every `interval` seconds and rebuild when due, so every worker serves answers approved in any of them."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Error rebuilding semantic index: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._last_rebuild = time.monotonic()
+
+    def rebuild(self):
+        """Embed every approved answer and publish a new index generation."""
+        lock_fd = os.open(self.directory / "rebuild.lock", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            # Only one process rebuilds at a time; the others pick up the result via CURRENT
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            questions, scopes, offsets = [], [], []
+            indexed_bytes = 0
+            if self.answers_path.exists():
+                with open(self.answers_path, "rb") as f:
+                    for line in iter(f.readline, b""):
+                        if not line.endswith(b"\n"):
+                            break
+                        entry = json.loads(line)
+                        questions.append(entry["question"])
+                        scopes.append(entry["scope"])
+                        offsets.append(indexed_bytes)
+                        indexed_bytes += len(line)
+
+            vectors = np.zeros((len(questions), self.embedder.dim), dtype=np.float32)
+            for i, question in enumerate(questions):
+                vectors[i] = self.embedder.embed(question)
+            self.write_index(vectors, scopes, np.asarray(offsets, dtype=np.int64), indexed_bytes)
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def write_index(self, vectors: np.ndarray, scopes: Sequence[str], positions: np.ndarray, indexed_bytes: int):
+        """Cluster `vectors` and write them as a new generation, then flip CURRENT."""
+        scope_codes = {scope: code for code, scope in enumerate(sorted(set(scopes)))}
+        if len(scope_codes) > MAX_SCOPES:
+            raise ValueError(f"{len(scope_codes)} scopes exceed the index's limit of {MAX_SCOPES}")
+        scope_array = np.fromiter((scope_codes[s] for s in scopes), dtype=np.uint16, count=len(scopes))
+
+        centroids, assignments = _kmeans(vectors)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=offsets[1:])
+
+        name = f"index-{int(time.time() * 1000)}"
+        tmp = self.directory / f".{name}.tmp"
+        tmp.mkdir()
+        np.save(tmp / "centroids.npy", centroids.astype(np.float32))
+        np.save(tmp / "offsets.npy", offsets)
+        np.save(tmp / "vectors.npy", np.round(vectors[order] * QUANTIZATION_SCALE).astype(np.int8))
+        np.save(tmp / "scopes.npy", scope_array[order])
+        np.save(tmp / "positions.npy", positions[order])
+        with open(tmp / "scopes.json", "w", encoding="utf-8") as f:
+            json.dump(scope_codes, f)
+        with open(tmp / "indexed_bytes", "w") as f:
+            f.write(str(indexed_bytes))
+        os.rename(tmp, self.directory / name)
+
+        pointer_tmp = self.directory / "CURRENT.tmp"
+        pointer_tmp.write_text(name)
+        os.replace(pointer_tmp, self.directory / "CURRENT")
+        logger.info(f"Published semantic index {name} with {len(vectors)} answers in {len(centroids)} lists")
+
+        previous = self._generation_name
+        self._load_current()
+        self._remove_old_generations(keep={name, previous})
+
+    def _remove_old_generations(self, keep: set):
+        for path in self.directory.glob("index-*"):
+            if path.name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def _kmeans(vectors: np.ndarray, iterations: int = 8, sample_size: int = 50_000, batch: int = 65_536) -> tuple:
+    """Spherical k-means with about sqrt(n) clusters, trained on a sample."""
+    n = len(vectors)
+    if n == 0:
+        return np.zeros((0, vectors.shape[1]), np.float32), np.zeros(0, np.int64)
+    k = int(min(4096, max(1, np.sqrt(n))))
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.choice(n, size=min(n, sample_size), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty clusters keep their previous centroid
+        nonempty = norms > 0
+        centroids[nonempty] = sums[nonempty] / norms[nonempty, None]
+
+    assignments = np.empty(n, dtype=np.int64)
+    for start in range(0, n, batch):
+        assignments[start:start + batch] = np.argmax(vectors[start:start + batch] @ centroids.T, axis=1)
+    return centroids, assignments
+
+
+# Global instance
+semantic_cache = SemanticAnswerStore(
+    Config.SEMANTIC_CACHE_DIR,
+    threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+    rebuild_interval=Config.SEMANTIC_CACHE_REBUILD_SECONDS,
+)
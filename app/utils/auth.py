@@ -0,0 +1,25 @@
+import hmac
+import logging
+from functools import wraps
+
+from quart import request
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(handler):
+    """Only let requests carrying `Authorization: Bearer <ADMIN_TOKEN>` through.
+
+    Every request is refused while ADMIN_TOKEN is unset.
+    """
+    @wraps(handler)
+    async def wrapper(*args, **kwargs):
+        expected = Config.ADMIN_TOKEN
+        supplied = request.headers.get("Authorization", "")
+        if not expected or not hmac.compare_digest(supplied.encode(), f"Bearer {expected}".encode()):
+            logger.warning(f"Rejected unauthorized request to {request.path}")
+            return {"error": "Unauthorized"}, 401
+        return await handler(*args, **kwargs)
+    return wrapper
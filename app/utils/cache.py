@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by entry count."""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SizedLRUCache:
+    """Thread-safe least-recently-used cache bounded by the total size of its values.
+
+    `sizeof` returns the approximate size in bytes of a value.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int]):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.size -= evicted
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+            self.size -= entry[1]
+            return entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+class AsyncTTLCache:
+    """Async cache with per-entry TTLs, stale-while-revalidate and single-flight loading.
+
+    - A fresh entry is returned directly.
+    - A stale entry (past its TTL but within its stale window) is returned
+      immediately while one background task refreshes it.
+    - A missing or expired entry is loaded once; concurrent callers for the
+      same key await the same load instead of starting their own.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self._entries = LRUCache(max_entries)
+        self._inflight: Dict[Hashable, "asyncio.Future"] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float) -> "asyncio.Future":
+        """Start (or join) the single in-flight load for `key`."""
+        future = self._inflight.get(key)
+        if future is not None:
+            return future
+
+        async def run():
+            try:
+                value = await fetch()
+                now = time.monotonic()
+                self._entries.set(key, (value, now + ttl, now + ttl + stale_ttl))
+                return value
+            finally:
+                self._inflight.pop(key, None)
+
+        future = asyncio.ensure_future(run())
+        future.add_done_callback(_log_load_failure)
+        self._inflight[key] = future
+        return future
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float = 0.0,
+    ) -> Any:
+        """Return the cached value for `key`, calling `fetch` when it must be (re)loaded."""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self.hits += 1
+                return value
+            if now < stale_until:
+                self.stale_hits += 1
+                self._load(key, fetch, ttl, stale_ttl)
+                return value
+
+        self.misses += 1
+        # shield() keeps a cancelled caller from cancelling the load other callers share
+        return await asyncio.shield(self._load(key, fetch, ttl, stale_ttl))
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+
+def _log_load_failure(future: "asyncio.Future"):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Cache load failed: {future.exception()}")
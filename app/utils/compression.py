@@ -0,0 +1,223 @@
+"""Dictionary compression for stored conversation messages.
+
+Usage:
+    python -m app.utils.compression train --out app/data/compression/legal_es_v2.dict
+    python -m app.utils.compression train --out legal_es_v2.dict --samples answers.jsonl
+
+Messages at or above a size threshold are stored with their content
+compressed against a dictionary built from our own legal Spanish text, and an
+`encoding` marker such as "zstd:legal_es_v1". Dictionaries are never changed
+once messages reference them; train a new id instead and keep the old file.
+"""
+import argparse
+import json
+import re
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zlib can only use the last 32 KiB of a preset dictionary
+MAX_DICTIONARY_BYTES = 32 * 1024
+
+_PHRASE_TOKENS = re.compile(r"\S+\s*")
+
+
+class MessageCodec:
+    """Compresses message content against versioned dictionaries.
+
+    Writes use the dictionary `dictionary_id`; reads look up whichever
+    dictionary the message's marker names, so older messages stay readable
+    after a new dictionary is rolled out.
+    """
+
+    def __init__(self, threshold: int, dictionary_dir: str, dictionary_id: Optional[str] = None, level: int = 3):
+        self.threshold = threshold
+        self.dictionary_dir = Path(dictionary_dir)
+        self.dictionary_id = dictionary_id
+        self.level = level
+        self._dictionaries: Dict[str, bytes] = {}
+        self._local = threading.local()
+
+    def _dictionary(self, dictionary_id: str) -> bytes:
+        data = self._dictionaries.get(dictionary_id)
+        if data is None:
+            data = (self.dictionary_dir / f"{dictionary_id}.dict").read_bytes()[-MAX_DICTIONARY_BYTES:]
+            self._dictionaries[dictionary_id] = data
+        return data
+
+    def _zstd(self, dictionary_id: str, compress: bool):
+        # zstandard contexts must not be used from two threads at once
+        contexts = getattr(self._local, "contexts", None)
+        if contexts is None:
+            contexts = self._local.contexts = {}
+        key = (dictionary_id, compress)
+        context = contexts.get(key)
+        if context is None:
+            dictionary = zstandard.ZstdCompressionDict(self._dictionary(dictionary_id), dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+            if compress:
+                context = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+            else:
+                context = zstandard.ZstdDecompressor(dict_data=dictionary)
+            contexts[key] = context
+        return context
+
+    def encode(self, content: str) -> Optional[tuple]:
+        """Return (compressed bytes, marker), or None if the content should be stored as is."""
+        if not self.threshold or not self.dictionary_id:
+            return None
+        data = content.encode("utf-8")
+        if len(data) < self.threshold:
+            return None
+        if zstandard is not None:
+            compressed, codec = self._zstd(self.dictionary_id, True).compress(data), "zstd"
+        else:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15, zdict=self._dictionary(self.dictionary_id))
+            compressed, codec = compressor.compress(data) + compressor.flush(), "zlib"
+        if len(compressed) >= len(data):
+            return None
+        return compressed, f"{codec}:{self.dictionary_id}"
+
+    def decode(self, data: bytes, marker: str) -> str:
+        codec, dictionary_id = marker.split(":", 1)
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Message was compressed with zstd; install the 'zstandard' package to read it")
+            return self._zstd(dictionary_id, False).decompress(data).decode("utf-8")
+        if codec == "zlib":
+            decompressor = zlib.decompressobj(-15, zdict=self._dictionary(dictionary_id))
+            return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+        raise ValueError(f"Unknown message encoding: {marker}")
+
+    def encode_message(self, message: Dict) -> Dict:
+        """Return the message as it should be stored."""
+        if "encoding" in message or not isinstance(message.get("content"), str):
+            return message
+        encoded = self.encode(message["content"])
+        if encoded is None:
+            return message
+        return {**message, "content": encoded[0], "encoding": encoded[1]}
+
+    def stored_message(self, message: Dict) -> Dict:
+        """Wrap a message read from storage so its content is decompressed on first access."""
+        return StoredMessage(message, self) if "encoding" in message else message
+
+
+class StoredMessage(dict):
+    """A history message whose compressed content is decoded when first read.
+
+    Code that only looks at `role` or counts messages never pays for
+    decompression. Use plain() before serializing the message.
+    """
+
+    def __init__(self, message: Dict, codec: MessageCodec):
+        super().__init__(message)
+        self._codec = codec
+
+    def _decode(self):
+        if super().__contains__("encoding"):
+            content = self._codec.decode(bytes(super().__getitem__("content")), super().pop("encoding"))
+            super().__setitem__("content", content)
+
+    def __getitem__(self, key):
+        if key == "content":
+            self._decode()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == "content":
+            self._decode()
+        return super().get(key, default)
+
+    def plain(self) -> Dict:
+        self._decode()
+        return dict(self)
+
+
+def plain_message(message: Dict) -> Dict:
+    """A copy of the message with its content as text."""
+    return message.plain() if isinstance(message, StoredMessage) else dict(message)
+
+
+def train_dictionary(samples: Iterable[str], size: int = 16 * 1024, max_phrase_tokens: int = 32) -> bytes:
+    """Build a raw-content dictionary from sample messages.
+
+    Picks word phrases that recur across many samples, weighted by length,
+    and places the most valuable ones last, where zlib and zstd reach them
+    with the shortest offsets.
+    """
+    document_frequency: Counter = Counter()
+    for sample in samples:
+        tokens = _PHRASE_TOKENS.findall(sample)
+        phrases = set()
+        for n in range(2, max_phrase_tokens + 1):
+            for i in range(len(tokens) - n + 1):
+                phrases.add("".join(tokens[i:i + n]))
+        document_frequency.update(phrases)
+
+    scored = sorted(
+        ((count - 1) * len(phrase.encode("utf-8")), phrase)
+        for phrase, count in document_frequency.items()
+        if count > 1
+    )
+    chosen: List[str] = []
+    chosen_text = ""
+    used = 0
+    for score, phrase in reversed(scored):
+        # Skip phrases already covered, including shifted windows of a chosen phrase
+        half = len(phrase) // 2
+        if phrase in chosen_text or (half >= 24 and (phrase[:half] in chosen_text or phrase[half:] in chosen_text)):
+            continue
+        length = len(phrase.encode("utf-8"))
+        if used + length > size:
+            continue
+        chosen.append(phrase)
+        chosen_text += "\0" + phrase
+        used += length
+    return "".join(reversed(chosen)).encode("utf-8")
+
+
+def default_corpus(clause_dir: str, corpus_dir: str) -> List[str]:
+    """Clause library texts plus the sample answers kept with the dictionaries."""
+    samples = []
+    for path in sorted(Path(clause_dir).glob("*.json")):
+        for clause in json.loads(path.read_text(encoding="utf-8")).get("clauses", []):
+            samples.append(f"{clause.get('title', '')}\n{clause.get('text', '')}")
+    for path in sorted(Path(corpus_dir).glob("*.txt")):
+        samples.extend(s.strip() for s in path.read_text(encoding="utf-8").split("\n\n\n") if s.strip())
+    return samples
+
+
+def main(argv: List[str] = None):
+    from ..config import Config
+
+    parser = argparse.ArgumentParser(description="Train a message compression dictionary.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="Build a dictionary from our own legal text")
+    train.add_argument("--out", required=True, help="Dictionary file to write, named <id>.dict")
+    train.add_argument("--samples", action="append", default=[], help="JSON lines file of stored messages to add to the corpus")
+    train.add_argument("--size", type=int, default=16 * 1024)
+    args = parser.parse_args(argv)
+
+    samples = default_corpus(Config.CLAUSE_LIBRARY_DIR, Path(Config.COMPRESSION_DICTIONARY_DIR) / "corpus")
+    for path in args.samples:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    message = json.loads(line)
+                    if message.get("role") == "assistant":
+                        samples.append(message["content"])
+
+    dictionary = train_dictionary(samples, args.size)
+    Path(args.out).write_bytes(dictionary)
+    print(f"Wrote {len(dictionary)} byte dictionary from {len(samples)} samples to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
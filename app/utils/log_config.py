@@ -0,0 +1,172 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import sys
+from datetime import datetime, UTC
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# E.164 phone numbers, with or without a whatsapp: prefix. Nothing without a
+# "+" is matched, so dates, token counts and years are left alone.
+PHONE_PATTERN = re.compile(r"(?<![\d+])((?:whatsapp:)?\+)(\d{10,15})(?!\d)")
+
+_listener: Optional[QueueListener] = None
+
+
+def redact_phone_numbers(text: str) -> str:
+    """Mask every digit of a phone number except the last four."""
+    def _mask(match: re.Match) -> str:
+        prefix, digits = match.groups()
+        return f"{prefix}{'*' * (len(digits) - 4)}{digits[-4:]}"
+    return PHONE_PATTERN.sub(_mask, text)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG/INFO records from selected loggers.
+
+    `rates` maps logger-name prefixes to the fraction of records kept; the
+    longest matching prefix wins. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self._cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = next((r for prefix, r in self.rates if name == prefix or name.startswith(prefix + ".")), 1.0)
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class RedactingFilter(logging.Filter):
+    """Render the message once, truncate large payloads and mask phone numbers.
+
+    Tracebacks and stack info are rendered here too, into `exc_text`, which
+    formatters use instead of formatting the exception again, so they are
+    masked as well.
+    """
+
+    _formatter = logging.Formatter()
+
+    def __init__(self, max_chars: int = 2000, redact: bool = True):
+        super().__init__()
+        self.max_chars = max_chars
+        self.redact = redact
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [truncated {len(message) - self.max_chars} chars]"
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._formatter.formatException(record.exc_info)
+        if self.redact:
+            message = redact_phone_numbers(message)
+            if record.exc_text:
+                record.exc_text = redact_phone_numbers(record.exc_text)
+            if record.stack_info:
+                record.stack_info = redact_phone_numbers(record.stack_info)
+        record.msg, record.args = message, None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_text or record.exc_info:
+            payload["exc"] = record.exc_text or self.formatException(record.exc_info)
+        if record.stack_info:
+            payload["stack"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Enqueue records without formatting them; the listener thread does all the work."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Dropping a log line is better than blocking the event loop
+            pass
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse 'app.db.mongo_store=0.05,app.app=0.5' into a dict."""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    sample_rates: Optional[Dict[str, float]] = None,
+    max_chars: int = 2000,
+    redact: bool = True,
+    stream=None,
+    queue_size: int = 10000,
+):
+    """Route all logging through one queue drained by a background writer.
+
+    Safe to call more than once; later calls replace the previous pipeline.
+    """
+    global _listener
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    output.addFilter(RedactingFilter(max_chars=max_chars, redact=redact))
+
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    handler = _DeferredQueueHandler(records)
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    root.addHandler(handler)
+    root.setLevel(level)
+    _listener = QueueListener(records, output, respect_handler_level=False)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,213 @@
+"""On-demand CPU and memory profiling of a running worker.
+
+Nothing here runs until an operator asks for it. The CPU sampler is a
+thread that exists only for the duration of a profile; it reads every
+thread's stack at a fixed interval and folds identical stacks into counts,
+in the collapsed format flamegraph.pl and speedscope read. Memory profiling
+uses tracemalloc, which slows allocation while it traces, so it is started
+and stopped explicitly; while it runs, each request also records how much
+memory and how many allocated blocks the process gained while it was
+served, and the slowest requests are kept with those numbers.
+"""
+import heapq
+import itertools
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+from quart import Quart, g, request
+
+from ..config import Config
+
+# Frames of the profilers themselves, left out of memory statistics
+_IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class ProfilerBusy(Exception):
+    """A profile of the same kind is already running."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the stacks of every thread, one profile at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float, interval: float = 0.005, main_thread_only: bool = False) -> Counter:
+        """Collapsed stacks ("thread;outer;...;inner") with the number of samples each was seen in.
+
+        Blocks for `seconds`; call it from a worker thread.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A CPU profile is already running")
+        try:
+            own_id = threading.get_ident()
+            main_id = threading.main_thread().ident
+            counts: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id or (main_thread_only and thread_id != main_id):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    counts[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+            return counts
+        finally:
+            self._lock.release()
+
+
+def collapsed(counts: Counter) -> str:
+    """One "stack count" line per stack, most sampled first."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class MemoryProfiler:
+    """tracemalloc snapshots and diffs against a baseline."""
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        """Start tracing with `frames` frames per allocation and take the baseline."""
+        with self._lock:
+            if tracemalloc.is_tracing():
+                raise ProfilerBusy("Memory tracing is already running")
+            tracemalloc.start(frames)
+            self._baseline = self._snapshot()
+
+    def stop(self):
+        with self._lock:
+            self._baseline = None
+            tracemalloc.stop()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+
+    def status(self) -> Dict:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_kib": round(current / 1024, 1),
+            "peak_kib": round(peak / 1024, 1),
+            "overhead_kib": round(tracemalloc.get_tracemalloc_memory() / 1024, 1)
+        }
+
+    def top(self, limit: int = 30, group_by: str = "lineno") -> List[Dict]:
+        """Where the memory traced right now was allocated, largest first."""
+        stats = self._snapshot().statistics(group_by)
+        return [_stat_record(stat) for stat in stats[:limit]]
+
+    def diff(self, limit: int = 30, group_by: str = "lineno", rebase: bool = False) -> List[Dict]:
+        """Growth since the baseline, largest first; `rebase` makes this snapshot the new baseline."""
+        with self._lock:
+            if self._baseline is None:
+                raise RuntimeError("Memory tracing is not running")
+            snapshot = self._snapshot()
+            stats = snapshot.compare_to(self._baseline, group_by)
+            if rebase:
+                self._baseline = snapshot
+        return [_stat_record(stat, diff=True) for stat in stats[:limit]]
+
+
+def _stat_record(stat, diff: bool = False) -> Dict:
+    frames = [f"{frame.filename}:{frame.lineno}" if frame.lineno else frame.filename for frame in stat.traceback]
+    record = {
+        "location": frames[0] if frames else "?",
+        "size_kib": round(stat.size / 1024, 1),
+        "count": stat.count
+    }
+    if len(frames) > 1:
+        record["traceback"] = frames
+    if diff:
+        record["size_diff_kib"] = round(stat.size_diff / 1024, 1)
+        record["count_diff"] = stat.count_diff
+    return record
+
+
+class SlowRequests:
+    """The `keep` slowest requests served while memory tracing runs, with the memory gained meanwhile.
+
+    Requests are served concurrently, so memory and block deltas include
+    whatever else the process allocated in the same interval; they point at
+    suspects rather than measure a request exactly.
+    """
+
+    def __init__(self, keep: int = 20):
+        self.keep = keep
+        self._heap: List = []
+        self._order = itertools.count()
+
+    def begin(self):
+        return time.perf_counter(), tracemalloc.get_traced_memory()[0], sys.getallocatedblocks()
+
+    def end(self, started, method: str, path: str, status: int):
+        began, traced, blocks = started
+        record = {
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - began) * 1000, 1),
+            "traced_kib": round((tracemalloc.get_traced_memory()[0] - traced) / 1024, 1),
+            "allocated_blocks": sys.getallocatedblocks() - blocks,
+            "at": time.time()
+        }
+        entry = (record["duration_ms"], next(self._order), record)
+        if len(self._heap) < self.keep:
+            heapq.heappush(self._heap, entry)
+        elif entry[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def slowest(self) -> List[Dict]:
+        return [record for _, _, record in sorted(self._heap, reverse=True)]
+
+    def clear(self):
+        self._heap = []
+
+
+def install_request_accounting(app: Quart, slow_requests: SlowRequests):
+    """Record every request in `slow_requests` while memory tracing runs; a flag check otherwise."""
+
+    @app.before_request
+    async def start_accounting():
+        if tracemalloc.is_tracing():
+            g.profile_started = slow_requests.begin()
+
+    @app.after_request
+    async def finish_accounting(response):
+        started = g.get("profile_started")
+        if started is not None and tracemalloc.is_tracing():
+            slow_requests.end(started, request.method, request.path, response.status_code)
+        return response
+
+
+# Global instances
+sampler = StackSampler()
+memory_profiler = MemoryProfiler()
+slow_requests = SlowRequests(Config.PROFILE_SLOW_REQUESTS)
@@ -0,0 +1,21 @@
+import re
+import unicodedata
+from typing import List
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text and strip accents so 'Cláusula' and 'clausula' match."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized search tokens."""
+    return _TOKEN_PATTERN.findall(normalize_text(text))
+
+
+def normalize_phone_number(phone_number: str) -> str:
+    """Normalize phone number by removing 'whatsapp:' prefix and spaces."""
+    return phone_number.replace('whatsapp:', '').strip()
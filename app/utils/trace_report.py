@@ -0,0 +1,134 @@
+"""Aggregate locally recorded agent spans into timing reports.
+
+Usage:
+    python -m app.utils.trace_report traces/
+    python -m app.utils.trace_report traces/spans-worker0.jsonl.gz --collapsed flame.txt
+
+Reads the files written by the local trace processor (gzip or plain JSON
+lines, or a JSON array saved from /debug/traces). A directory stands for
+every span file in it, those of all launcher workers and their rotations and prints per-span
+timings grouped by span type and name. With --collapsed it also writes
+self-time per call stack in the collapsed format used by flamegraph.pl
+and speedscope.
+"""
+import argparse
+import gzip
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+
+def _open(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def read_spans(paths: Iterable[str]) -> Iterator[Dict]:
+    """Yield span records from files, and from every span file of each directory."""
+    for raw in paths:
+        path = Path(raw)
+        files = sorted(path.glob("spans*.jsonl*")) if path.is_dir() else [path]
+        for file in files:
+            with _open(file) as f:
+                first = f.read(1)
+                f.seek(0)
+                if first == "[":
+                    yield from json.load(f)
+                    continue
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            # A file still being written may end mid-line
+                            continue
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def build_report(spans: List[Dict]) -> Dict:
+    """Compute per-(type, name) timings and collapsed self-time stacks."""
+    by_id = {span["id"]: span for span in spans}
+    children_time: Dict[str, float] = defaultdict(float)
+    for span in spans:
+        if span.get("parent_id") in by_id and span.get("duration_ms") is not None:
+            children_time[span["parent_id"]] += span["duration_ms"]
+
+    timings: Dict[tuple, List[float]] = defaultdict(list)
+    self_times: Dict[tuple, float] = defaultdict(float)
+    errors: Dict[tuple, int] = defaultdict(int)
+    stacks: Dict[str, float] = defaultdict(float)
+
+    for span in spans:
+        duration = span.get("duration_ms")
+        if duration is None:
+            continue
+        key = (span["type"], span["name"])
+        timings[key].append(duration)
+        self_ms = max(0.0, duration - children_time.get(span["id"], 0.0))
+        self_times[key] += self_ms
+        if span.get("error") or span.get("triggered"):
+            errors[key] += 1
+
+        frames = []
+        node, seen = span, set()
+        while node is not None and node["id"] not in seen:
+            seen.add(node["id"])
+            frames.append(f"{node['type']}:{node['name']}".replace(";", ","))
+            node = by_id.get(node.get("parent_id"))
+        stacks[";".join(reversed(frames))] += self_ms
+
+    rows = []
+    for key, values in timings.items():
+        rows.append({
+            "type": key[0],
+            "name": key[1],
+            "count": len(values),
+            "total_ms": sum(values),
+            "self_ms": self_times[key],
+            "mean_ms": sum(values) / len(values),
+            "p50_ms": _percentile(values, 50),
+            "p95_ms": _percentile(values, 95),
+            "max_ms": max(values),
+            "errors": errors[key],
+        })
+    rows.sort(key=lambda row: row["self_ms"], reverse=True)
+    return {"traces": len({s["trace_id"] for s in spans}), "rows": rows, "stacks": stacks}
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Summarize locally recorded agent spans.")
+    parser.add_argument("paths", nargs="+", help="Span files or trace directories")
+    parser.add_argument("--collapsed", help="Write collapsed stacks (self time in microseconds) to this file")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = build_report(list(read_spans(args.paths)))
+
+    if args.collapsed:
+        with open(args.collapsed, "w", encoding="utf-8") as f:
+            for stack, self_ms in sorted(report["stacks"].items()):
+                f.write(f"{stack} {int(self_ms * 1000)}\n")
+
+    if args.json:
+        json.dump({"traces": report["traces"], "rows": report["rows"]}, sys.stdout, indent=2)
+        return
+
+    print(f"{report['traces']} traces")
+    print(f"{'type':<11}{'name':<40}{'count':>7}{'self_ms':>12}{'mean_ms':>10}{'p50_ms':>10}{'p95_ms':>10}{'max_ms':>10}{'err':>5}")
+    for row in report["rows"]:
+        print(
+            f"{row['type']:<11}{row['name'][:39]:<40}{row['count']:>7}{row['self_ms']:>12.1f}"
+            f"{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['max_ms']:>10.1f}{row['errors']:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
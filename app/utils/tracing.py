@@ -0,0 +1,242 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agents import RunConfig, set_trace_processors, set_tracing_disabled
+from agents.tracing import Span, Trace, TracingProcessor, default_processor
+
+from ..agents.prompt_cache import provider
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Marks traces whose sampling decision was already made when the run started
+HEAD_SAMPLED = "head"
+
+
+def _duration_ms(started_at: Optional[str], ended_at: Optional[str]) -> Optional[float]:
+    if not started_at or not ended_at:
+        return None
+    return (datetime.fromisoformat(ended_at) - datetime.fromisoformat(started_at)).total_seconds() * 1000
+
+
+def span_record(span: Span) -> Dict[str, Any]:
+    """Reduce a finished span to the fields the timing report needs."""
+    data = span.span_data
+    kind = data.type
+    if kind == "handoff":
+        name = f"{data.from_agent}->{data.to_agent}"
+    elif kind in ("response", "generation"):
+        response = getattr(data, "response", None)
+        name = getattr(response, "model", None) or getattr(data, "model", None) or kind
+    else:
+        name = getattr(data, "name", kind)
+
+    record = {
+        "trace_id": span.trace_id,
+        "id": span.span_id,
+        "parent_id": span.parent_id,
+        "type": kind,
+        "name": name,
+        "started_at": span.started_at,
+        "ended_at": span.ended_at,
+        "duration_ms": _duration_ms(span.started_at, span.ended_at),
+    }
+    if kind == "guardrail":
+        record["triggered"] = data.triggered
+    if span.error:
+        record["error"] = span.error.get("message")
+    return record
+
+
+class RotatingGzipSink:
+    """Writes span records as gzip-compressed JSON lines from a background thread.
+
+    Records go to `<name>.jsonl.gz`. When it reaches `max_bytes` of
+    uncompressed data it is rotated to `<name>.1.jsonl.gz`, shifting older
+    files up to `backups`. Each process must use its own `name`: files are
+    appended to and rotated without coordination. Records are dropped rather
+    than blocking the caller when the queue is full.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 50 * 1024 * 1024,
+        backups: int = 5,
+        queue_size: int = 10000,
+        name: str = "spans"
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.name = name
+        self.path = self.directory / f"{name}.jsonl.gz"
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._written = 0
+        self._thread = threading.Thread(target=self._run, name="trace-sink", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self):
+        self._file = gzip.open(self.path, "at", encoding="utf-8", compresslevel=6)
+        self._written = 0
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            older = self.directory / f"{self.name}.{i}.jsonl.gz"
+            if older.exists():
+                os.replace(older, self.directory / f"{self.name}.{i + 1}.jsonl.gz")
+        os.replace(self.path, self.directory / f"{self.name}.1.jsonl.gz")
+        self._open()
+
+    def _run(self):
+        self._open()
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            try:
+                line = json.dumps(record, separators=(",", ":")) + "\n"
+                self._file.write(line)
+                self._written += len(line)
+                if self._queue.empty():
+                    self._file.flush()
+                if self._written >= self.max_bytes:
+                    self._rotate()
+            except Exception as e:
+                logger.error(f"Error writing trace span: {e}")
+        self._file.close()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class RingBufferSink:
+    """Keeps the most recent span records in memory."""
+
+    def __init__(self, capacity: int = 10000):
+        self._records = deque(maxlen=capacity)
+
+    def write(self, record: Dict[str, Any]):
+        self._records.append(record)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return list(self._records)
+
+    def close(self):
+        pass
+
+
+class LocalTraceProcessor(TracingProcessor):
+    """Agents SDK trace processor that records sampled spans to a local sink.
+
+    Sampling is head-based: the keep/drop decision is made once per trace, so
+    a kept trace always has all of its spans.
+    """
+
+    def __init__(self, sink, sample_rate: float = 1.0):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self._sampled = set()
+        self._lock = threading.Lock()
+
+    def on_trace_start(self, trace: Trace) -> None:
+        metadata = getattr(trace, "metadata", None) or {}
+        if metadata.get("sampled") == HEAD_SAMPLED or random.random() < self.sample_rate:
+            with self._lock:
+                self._sampled.add(trace.trace_id)
+
+    def on_trace_end(self, trace: Trace) -> None:
+        with self._lock:
+            self._sampled.discard(trace.trace_id)
+
+    def on_span_start(self, span: Span) -> None:
+        pass
+
+    def on_span_end(self, span: Span) -> None:
+        if span.trace_id not in self._sampled:
+            return
+        try:
+            self.sink.write(span_record(span))
+        except Exception as e:
+            logger.error(f"Error recording trace span: {e}")
+
+    def shutdown(self) -> None:
+        self.sink.close()
+
+    def force_flush(self) -> None:
+        pass
+
+
+# Set by configure_tracing() when spans are recorded locally
+local_processor: Optional[LocalTraceProcessor] = None
+
+
+def configure_tracing():
+    """Install trace processors according to Config.
+
+    DISABLE_TRACING turns tracing off entirely. Otherwise spans go to the
+    local sink selected by TRACE_SINK ("file", "ring" or "none") and, only
+    when TRACE_REMOTE_EXPORT is set, to the OpenAI tracing backend.
+    """
+    global local_processor
+
+    processors: List[TracingProcessor] = []
+    if not Config.DISABLE_TRACING:
+        if Config.TRACE_SINK == "file":
+            # One set of files per launcher worker
+            name = f"spans-worker{Config.WORKER_ID}" if Config.WORKER_ID else "spans"
+            sink = RotatingGzipSink(Config.TRACE_DIR, max_bytes=Config.TRACE_MAX_BYTES, backups=Config.TRACE_BACKUPS, name=name)
+            processors.append(LocalTraceProcessor(sink, Config.TRACE_SAMPLE_RATE))
+        elif Config.TRACE_SINK == "ring":
+            processors.append(LocalTraceProcessor(RingBufferSink(Config.TRACE_RING_SIZE), Config.TRACE_SAMPLE_RATE))
+        if Config.TRACE_REMOTE_EXPORT:
+            processors.append(default_processor())
+
+    if not Config.TRACE_REMOTE_EXPORT or Config.DISABLE_TRACING:
+        # Stop the SDK's idle export thread as well
+        default_processor().shutdown()
+
+    set_trace_processors(processors)
+    set_tracing_disabled(not processors)
+    local_processor = next((p for p in processors if isinstance(p, LocalTraceProcessor)), None)
+    logger.info(f"Tracing configured: sink={Config.TRACE_SINK if processors else 'disabled'}, remote={Config.TRACE_REMOTE_EXPORT and not Config.DISABLE_TRACING}")
+
+
+def sampled_run_config(workflow_name: str, group_key: Optional[str] = None) -> RunConfig:
+    """Make the head sampling decision before a run starts.
+
+    Unsampled runs get tracing disabled, so the SDK does not even build spans
+    for them. `group_key` (e.g. a phone number) is hashed before use. Runs
+    use the provider that records prompt cache hits either way.
+    """
+    enabled = not Config.DISABLE_TRACING and (local_processor is not None or Config.TRACE_REMOTE_EXPORT)
+    sampled = enabled and random.random() < Config.TRACE_SAMPLE_RATE
+    group_id = hashlib.sha256(group_key.encode("utf-8")).hexdigest()[:16] if group_key else None
+    return RunConfig(
+        workflow_name=workflow_name,
+        group_id=group_id,
+        tracing_disabled=not sampled,
+        trace_metadata={"sampled": HEAD_SAMPLED},
+        model_provider=provider,
+    )
@@ -0,0 +1,133 @@
+"""Throughput and memory of the broadcast engine over a large SQLite audience.
+
+    python bench_broadcast.py --recipients 1000000 --latency 0.05 --pause-after 5
+
+Fills a scratch SQLite store with `--recipients` conversations, every other
+one opted in to alerts, then broadcasts to the opted-in half through a fake
+sender that takes `--latency` seconds per message. The broadcast is paused
+after `--pause-after` seconds and resumed from its checkpoint, and the run
+reports messages per second, how many recipients got the message twice
+across the pause, and the process's resident memory as it goes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, UTC
+
+from app.db.base import ALERTS_OPT_IN
+from app.db.sqlite_store import SQLiteStore
+from app.services.broadcast import BroadcastEngine
+
+TEMPLATE = "Hola {name}: se publicó una reforma a la {law}. Responde ALERTAS NO para dejar de recibir avisos."
+AGENTS = ["Legal Agent", "Contract Agent", "Research Agent"]
+
+
+def rss_mib() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def fill(store: SQLiteStore, count: int):
+    now = datetime.now(UTC).isoformat()
+    conn = store._connection()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO conversations (phone_number, current_agent, metadata, last_updated) VALUES (?, ?, ?, ?)",
+        (
+            (
+                f"+52155{i:08d}",
+                AGENTS[i % len(AGENTS)],
+                json.dumps({ALERTS_OPT_IN: i % 2 == 0, "name": f"Usuario {i}", "law": "Ley Federal del Trabajo"}),
+                now
+            )
+            for i in range(count)
+        )
+    )
+    conn.execute("COMMIT")
+
+
+class FakeSender:
+    def __init__(self, latency: float, recipients: int):
+        self.latency = latency
+        self.sent = 0
+        # One byte per number, only to count duplicates; the engine itself keeps no per-recipient state
+        self.seen = bytearray(recipients)
+        self.duplicates = 0
+
+    async def send(self, to: str, body: str, content_sid=None, variables=None) -> str:
+        await asyncio.sleep(self.latency)
+        number = int(to[-8:])
+        self.duplicates += self.seen[number]
+        self.seen[number] = 1
+        self.sent += 1
+        return f"SM{self.sent}"
+
+    async def close(self):
+        pass
+
+
+async def watch(engine: BroadcastEngine, job_id: str, peak: list):
+    while True:
+        await asyncio.sleep(2)
+        job = engine.get(job_id)
+        peak[0] = max(peak[0], rss_mib())
+        print(f"  {job['status']:<9} sent={job['sent']:>8}  cursor={job['cursor']}  "
+              f"{job['messages_per_second']:>8.0f} msg/s  rss={rss_mib():6.1f} MiB")
+
+
+async def broadcast(args, store: SQLiteStore):
+    sender = FakeSender(args.latency, args.recipients)
+    engine = BroadcastEngine(
+        store,
+        sender,
+        messages_per_second=args.rate,
+        concurrency=args.concurrency,
+        checkpoint_seconds=1.0
+    )
+    job = engine.create(TEMPLATE, metadata={}, name="bench")
+    peak = [rss_mib()]
+    watcher = asyncio.create_task(watch(engine, job["_id"], peak))
+    started = time.perf_counter()
+
+    await engine.start(job["_id"])
+    if args.pause_after:
+        await asyncio.sleep(args.pause_after)
+        await engine.pause(job["_id"])
+        await asyncio.gather(*engine._tasks.values())
+        paused = engine.get(job["_id"])
+        print(f"  paused at {paused['cursor']} after {paused['sent']} messages; resuming")
+        await engine.start(job["_id"])
+    await asyncio.gather(*engine._tasks.values())
+    elapsed = time.perf_counter() - started
+    watcher.cancel()
+
+    job = engine.get(job["_id"])
+    print(f"{job['status']}: {job['sent']} sent, {job['failed']} failed in {elapsed:.1f}s "
+          f"({job['sent'] / elapsed:,.0f} messages/s overall)")
+    print(f"distinct recipients {sum(sender.seen)}, sent twice across the pause {sender.duplicates}")
+    print(f"peak rss {peak[0]:.1f} MiB")
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Broadcast throughput and memory over a SQLite audience.")
+    parser.add_argument("--recipients", type=int, default=1_000_000, help="conversations in the store; half opted in")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake sender takes per message")
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--rate", type=float, default=0, help="messages per second; 0 sends as fast as possible")
+    parser.add_argument("--pause-after", type=float, default=5, help="seconds before pausing and resuming; 0 to skip")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, "bench.db"))
+        started = time.perf_counter()
+        fill(store, args.recipients)
+        print(f"filled {args.recipients} conversations in {time.perf_counter() - started:.1f}s, rss={rss_mib():.1f} MiB")
+        asyncio.run(broadcast(args, store))
+        store.close()
+
+
+if __name__ == "__main__":
+    bench()
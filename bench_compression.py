@@ -0,0 +1,130 @@
+"""Storage savings and codec throughput for compressed messages.
+
+The dictionary is trained here on part of the text and every figure is
+measured on the rest, so the savings are those of text the dictionary has
+never seen. The shipped dictionary was trained on the whole corpus and would
+overstate them.
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import bson
+
+from app.config import Config
+from app.utils import compression
+from app.utils.compression import MessageCodec, default_corpus, train_dictionary
+
+# Name of the dictionary trained on the training split
+BENCH_DICTIONARY = "bench_holdout"
+
+QUESTIONS = [
+    "Mi arrendador no me quiere devolver el depósito, ¿qué hago?",
+    "Me despidieron sin liquidación después de 3 años",
+    "¿Qué cláusulas debe tener un contrato de prestación de servicios?",
+    "¿Cuáles son las reformas recientes a la Ley Federal del Trabajo?",
+    "Necesito un contrato de arrendamiento para un local comercial",
+    "¿Cómo solicito la pensión alimenticia para mis hijos?",
+]
+
+
+def split(items: List, holdout: float, seed: int = 7) -> Tuple[List, List]:
+    """(training, test) after a seeded shuffle, with at least one item in each."""
+    items = list(items)
+    random.Random(seed).shuffle(items)
+    test_size = min(len(items) - 1, max(1, round(len(items) * holdout)))
+    return items[test_size:], items[:test_size]
+
+
+def production_like_dataset(samples: List[str], conversations: int, seed: int = 7) -> List[List[Dict]]:
+    """Conversations shaped like production: short questions, multi-kilobyte answers built from `samples`."""
+    rng = random.Random(seed)
+    dataset = []
+    for _ in range(conversations):
+        history = []
+        for _ in range(rng.randint(2, 8)):
+            history.append({"role": "user", "content": rng.choice(QUESTIONS)})
+            answer = "\n\n".join(rng.sample(samples, min(len(samples), rng.randint(1, 3))))
+            # Vary amounts and dates the way real answers do
+            answer = answer.replace("treinta", str(rng.randint(5, 90))).replace("2022", str(rng.randint(2015, 2025)))
+            history.append({"role": "assistant", "content": answer})
+        dataset.append(history)
+    return dataset
+
+
+def load_dataset(path: str) -> List[List[Dict]]:
+    """JSON lines of {"phone_number", "role", "content"} exported from production."""
+    conversations = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                message = json.loads(line)
+                conversations[message["phone_number"]].append({"role": message["role"], "content": message["content"]})
+    return list(conversations.values())
+
+
+def measure(label: str, dataset: List[List[Dict]], codec: MessageCodec, window: int):
+    start = time.perf_counter()
+    documents = [bson.encode({"conversation_history": [codec.encode_message(m) for m in history]}) for history in dataset]
+    write_seconds = time.perf_counter() - start
+    messages = sum(len(history) for history in dataset)
+
+    start = time.perf_counter()
+    for document in documents:
+        history = [codec.stored_message(m) for m in bson.decode(document)["conversation_history"]]
+        for message in history[-window:] if window else history:
+            message["content"]
+    read_seconds = time.perf_counter() - start
+
+    stored = sum(len(d) for d in documents)
+    print(f"{label:<32} {stored / 1024:>10.0f} KiB {messages / write_seconds:>12.0f} msg/s {len(dataset) / read_seconds:>10.0f} conv/s")
+    return stored
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Storage savings and codec throughput for compressed messages.")
+    parser.add_argument("--dataset", help="JSON lines export of real messages; a synthetic dataset is used otherwise")
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--window", type=int, default=Config.HISTORY_WINDOW, help="messages read per conversation; 0 reads all")
+    parser.add_argument("--threshold", type=int, default=Config.MESSAGE_COMPRESSION_THRESHOLD)
+    parser.add_argument("--holdout", type=float, default=0.25, help="share of the text kept out of dictionary training")
+    args = parser.parse_args()
+
+    corpus = default_corpus(Config.CLAUSE_LIBRARY_DIR, f"{Config.COMPRESSION_DICTIONARY_DIR}/corpus")
+    if args.dataset:
+        # Trained like `compression train --samples`: the corpus plus the training conversations' answers
+        training, dataset = split(load_dataset(args.dataset), args.holdout)
+        samples = corpus + [m["content"] for history in training for m in history if m["role"] == "assistant"]
+    else:
+        samples, test_samples = split(corpus, args.holdout)
+        dataset = production_like_dataset(test_samples, args.conversations)
+    print(f"dictionary trained on {len(samples)} samples, measured on {args.holdout:.0%} held out")
+    with tempfile.TemporaryDirectory(prefix="bench-compression-") as dictionary_dir:
+        Path(dictionary_dir, f"{BENCH_DICTIONARY}.dict").write_bytes(train_dictionary(samples))
+
+        contents = [m["content"].encode("utf-8") for history in dataset for m in history]
+        large = [c for c in contents if len(c) >= args.threshold]
+        print(f"{len(dataset)} conversations, {len(contents)} messages, {len(large)} at or above {args.threshold} bytes")
+        large_bytes = max(1, sum(map(len, large)))
+        print(f"large messages with zlib and no dictionary: {sum(len(zlib.compress(c, 6)) for c in large) / large_bytes:.0%} of their size")
+        print(f"{'':<32} {'stored':>14} {'write':>16} {'read':>14}")
+
+        dictionary = BENCH_DICTIONARY
+        plain = measure("plain", dataset, MessageCodec(0, dictionary_dir), args.window)
+        codecs = [("zstd", compression.zstandard), ("zlib", None)] if compression.zstandard else [("zlib", None)]
+        for name, module in codecs:
+            compression.zstandard = module
+            codec = MessageCodec(args.threshold, dictionary_dir, dictionary)
+            stored = measure(f"{name} + {dictionary}", dataset, codec, args.window)
+            compressed_large = sum(len(codec.encode(c.decode("utf-8"))[0]) for c in large)
+            print(f"{'':<32} {stored / plain:>13.0%} of plain; large messages {compressed_large / large_bytes:.0%} of their size")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.document_review import ChunkFindings, DocumentReviewer, LocalMediaFetcher
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PAGE_SIZES = [5, 50, 200]
+CLAUSES_PER_PAGE = 3
+MODEL_LATENCY = (0.4, 1.2)  # seconds per simulated chunk analysis
+SUMMARY_LATENCY = 2.0
+
+ORDINALS = ["PRIMERA", "SEGUNDA", "TERCERA", "CUARTA", "QUINTA", "SEXTA", "SÉPTIMA", "OCTAVA", "NOVENA", "DÉCIMA"]
+PARAGRAPH = (
+    "Las partes convienen que EL ARRENDATARIO pagará la renta mensual pactada dentro de los primeros cinco días "
+    "de cada mes, en el domicilio de EL ARRENDADOR o mediante transferencia electrónica a la cuenta que éste designe. "
+)
+
+
+def build_document(pages: int) -> str:
+    """Build a plain-text lease with form-feed page breaks."""
+    rng = random.Random(pages)
+    out = []
+    clause = 0
+    for _ in range(pages):
+        body = []
+        for _ in range(CLAUSES_PER_PAGE):
+            clause += 1
+            body.append(f"CLÁUSULA {ORDINALS[clause % 10]} ({clause}).\n" + PARAGRAPH * rng.randint(2, 6))
+        out.append("\n\n".join(body))
+    return "\f".join(out)
+
+
+async def fake_analyze(chunk: str) -> ChunkFindings:
+    await asyncio.sleep(random.uniform(*MODEL_LATENCY))
+    return ChunkFindings(summary=chunk[:80], risks=["Pago de renta sin recibo"], unusual_terms=[])
+
+
+async def fake_summarize(findings: str, question: str) -> str:
+    await asyncio.sleep(SUMMARY_LATENCY)
+    return f"Summary of {findings.count('Section')} sections"
+
+
+async def bench():
+    with tempfile.TemporaryDirectory() as tmp:
+        fetcher = LocalMediaFetcher(tmp)
+        print(f"{'pages':>6} {'conc':>5} {'chunks':>7} {'cold_s':>8} {'warm_s':>8} {'serial_s':>9}")
+        for pages in PAGE_SIZES:
+            name = f"lease-{pages}.txt"
+            Path(tmp, name).write_text(build_document(pages), encoding="utf-8")
+            for concurrency in (1, 8, 32):
+                reviewer = DocumentReviewer(
+                    fetcher,
+                    analyze_chunk=fake_analyze,
+                    summarize=fake_summarize,
+                    concurrency=concurrency,
+                )
+                start = time.perf_counter()
+                cold = await reviewer.review(name, "text/plain", "¿Es justo este contrato?")
+                cold_s = time.perf_counter() - start
+
+                # Follow-up with a different question reuses the cached findings
+                start = time.perf_counter()
+                await reviewer.review(name, "text/plain", "¿Puedo terminarlo antes?")
+                warm_s = time.perf_counter() - start
+
+                serial_s = cold["chunks"] * sum(MODEL_LATENCY) / 2 + SUMMARY_LATENCY
+                print(f"{pages:>6} {concurrency:>5} {cold['chunks']:>7} {cold_s:>8.2f} {warm_s:>8.2f} {serial_s:>9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
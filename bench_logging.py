@@ -0,0 +1,84 @@
+import io
+import logging
+import os
+import time
+
+from app.utils.log_config import configure_logging, stop_logging
+
+REQUESTS = 2000
+PHONE = "+5215512345678"
+HISTORY = [{"role": "user", "content": "Necesito ayuda con mi contrato de arrendamiento " * 20}] * 30
+
+store_logger = logging.getLogger("app.db.mongo_store")
+app_logger = logging.getLogger("app.app")
+
+
+def simulated_request():
+    """The log calls one webhook request makes today: app, store and debug lines."""
+    app_logger.info(f"Received message from whatsapp:{PHONE}: Hola, necesito ayuda con mi renta...")
+    store_logger.info(f"Getting conversation history for {PHONE}")
+    store_logger.info(f"Retrieved {len(HISTORY)} messages for {PHONE}")
+    app_logger.info(f"Retrieved {len(HISTORY)} messages from history for {PHONE}")
+    app_logger.info("Processing message with triage agent...")
+    app_logger.info("Got response from agent: Claro, con gusto te ayudo con tu contrato de arrendamiento...")
+    for _ in range(2):
+        store_logger.info(f"Appending message to history for {PHONE}")
+        store_logger.info(f"Appended message to history for {PHONE}: matched=1, modified=1, upserted=False")
+        store_logger.info(f"Successfully verified message storage for {PHONE}")
+        app_logger.info(f"Updated conversation history for {PHONE}")
+    app_logger.info("Updated conversation history in MongoDB")
+    app_logger.info(f"Created TwiML response: <?xml version=\"1.0\"?><Response><Message>{HISTORY[0]['content'][:100]}")
+    # The debug endpoint used to log the whole conversation document
+    app_logger.info(f"Retrieved conversation data: {HISTORY}")
+
+
+def measure(label: str):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        simulated_request()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / REQUESTS * 1e6:>9.1f} us/request (caller side)")
+
+
+def before(sink):
+    """Previous setup: root at DEBUG plus a duplicate handler on the app logger."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    logging.basicConfig(stream=sink, level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', force=True)
+    duplicate = logging.StreamHandler(sink)
+    duplicate.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    app_logger.addHandler(duplicate)
+    return duplicate
+
+
+class SlowSink(io.TextIOBase):
+    """A log collector that takes `latency` seconds per flush, like a busy pipe or network driver."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+    def flush(self):
+        time.sleep(self.latency)
+
+
+def bench(label: str, sink):
+    print(f"-- {label}")
+    duplicate = before(sink)
+    measure("before: sync handlers, duplicated lines")
+    app_logger.removeHandler(duplicate)
+
+    configure_logging(level="INFO", fmt="json", sample_rates={"app.db.mongo_store": 0.05}, stream=sink, queue_size=1_000_000)
+    measure("after: queue + json + sampling")
+    start = time.perf_counter()
+    stop_logging()
+    print(f"{'background drain time':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms total")
+
+
+if __name__ == "__main__":
+    with open(os.devnull, "w") as devnull:
+        bench("/dev/null", devnull)
+    bench("sink with 50us flush latency", SlowSink(0.00005))
@@ -0,0 +1,80 @@
+"""What the profiling hooks cost a request when profiling is off, and when it is on.
+
+    python bench_profiling.py --requests 5000
+
+Serves a small JSON endpoint through the Quart test client three ways:
+without the request accounting hooks, with them installed but memory
+tracing off (the normal state), and with memory tracing on. Then measures
+how much a CPU profile slows the same requests while it samples.
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from quart import Quart
+
+from app.utils import profiling
+
+
+def make_app(accounting: bool) -> Quart:
+    app = Quart(__name__)
+
+    @app.route("/work")
+    async def work():
+        return {"items": [{"n": i, "text": f"item {i}"} for i in range(50)]}
+
+    if accounting:
+        profiling.install_request_accounting(app, profiling.SlowRequests(20))
+    return app
+
+
+async def serve(app: Quart, requests: int) -> float:
+    """Microseconds per request."""
+    client = app.test_client()
+    for _ in range(200):
+        await client.get("/work")
+    started = time.perf_counter()
+    for _ in range(requests):
+        await client.get("/work")
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Request overhead of the profiling hooks.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--frames", type=int, default=1, help="tracemalloc frames per allocation when tracing")
+    args = parser.parse_args()
+
+    bare = asyncio.run(serve(make_app(False), args.requests))
+    hooked = make_app(True)
+    off = asyncio.run(serve(hooked, args.requests))
+    print(f"no hooks           {bare:7.1f} us/request")
+    print(f"hooks, tracing off {off:7.1f} us/request ({(off / bare - 1) * 100:+.1f}%)")
+
+    profiling.memory_profiler.start(args.frames)
+    try:
+        on = asyncio.run(serve(hooked, args.requests))
+    finally:
+        profiling.memory_profiler.stop()
+    print(f"hooks, tracing on  {on:7.1f} us/request ({(on / bare - 1) * 100:+.1f}%)")
+
+    stop = threading.Event()
+
+    def sample_until_stopped():
+        # On a thread, like the endpoint, for as long as the requests take
+        while not stop.is_set():
+            profiling.sampler.sample(0.5, 0.005)
+
+    sampling = threading.Thread(target=sample_until_stopped)
+    sampling.start()
+    try:
+        cpu = asyncio.run(serve(hooked, args.requests))
+    finally:
+        stop.set()
+        sampling.join()
+    print(f"CPU profile, 5 ms  {cpu:7.1f} us/request ({(cpu / bare - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    bench()
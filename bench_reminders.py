@@ -0,0 +1,130 @@
+"""Firing precision of the reminder scheduler with millions of reminders pending.
+
+    python bench_reminders.py --pending 1000000 --due 20000 --window 20
+
+Queues `--pending` reminders due over the next year, plus `--due` reminders
+spread over the next `--window` seconds, in the in-memory queue. Then runs
+the scheduler with a sender that records when each message went out, and
+reports how late reminders fired (p50, p99, max), how long each poll took to
+lease the coming reminders, and the process's resident memory.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta, UTC
+
+from app.db.reminders import MemoryReminderQueue
+from app.services.reminders import ReminderScheduler, TimingWheel
+
+
+def rss_mib() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+class NullSender:
+    async def send(self, to: str, body: str, content_sid=None, variables=None) -> str:
+        return "SM"
+
+    async def close(self):
+        pass
+
+
+class TimedScheduler(ReminderScheduler):
+    """Records lateness at the moment of sending and the time spent leasing per poll."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.late = []
+        self.load_seconds = []
+
+    async def _fire(self, reminder):
+        self.late.append(time.time() - reminder["due_at"].timestamp())
+        await super()._fire(reminder)
+
+    async def _load(self) -> int:
+        started = time.perf_counter()
+        loaded = await super()._load()
+        self.load_seconds.append(time.perf_counter() - started)
+        return loaded
+
+
+def fill(queue: MemoryReminderQueue, pending: int, due: int, window: float, lead: float):
+    rng = random.Random(7)
+    now = datetime.now(UTC)
+    for i in range(pending):
+        queue.add({
+            "_id": f"p{i}", "phone_number": f"+52155{i % 10**8:08d}", "message": "Renovación del contrato",
+            "due_at": now + timedelta(days=1 + rng.random() * 364), "status": "pending", "attempts": 0
+        })
+    # Measured from now, after the slow part
+    now = datetime.now(UTC)
+    for i in range(due):
+        queue.add({
+            "_id": f"d{i}", "phone_number": f"+52155{i:08d}", "message": "Vence el plazo para demandar",
+            "due_at": now + timedelta(seconds=lead + rng.random() * window), "status": "pending", "attempts": 0
+        })
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def wheel_ops(count: int = 200_000):
+    wheel = TimingWheel(0.1, 1024, 0.0)
+    started = time.perf_counter()
+    for i in range(count):
+        wheel.add(i * 0.0005, i)
+    added = time.perf_counter() - started
+    started = time.perf_counter()
+    fired = 0
+    for step in range(1, 1001):
+        fired += len(wheel.advance(step * 0.1))
+    assert fired == count
+    return added / count * 1e9, (time.perf_counter() - started) / 1000 * 1e6
+
+
+async def run(args, queue: MemoryReminderQueue):
+    scheduler = TimedScheduler(
+        queue, NullSender(), tick=args.tick, horizon=args.horizon, poll_interval=args.poll, concurrency=64
+    )
+    scheduler.start()
+    await asyncio.sleep(args.lead + args.window + 1)
+    await scheduler.stop()
+    return scheduler
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Reminder firing precision with many reminders pending.")
+    parser.add_argument("--pending", type=int, default=1_000_000, help="reminders due later in the year")
+    parser.add_argument("--due", type=int, default=20_000, help="reminders due during the run")
+    parser.add_argument("--window", type=float, default=20, help="seconds over which --due reminders fall")
+    parser.add_argument("--lead", type=float, default=2, help="seconds before the first reminder falls due")
+    parser.add_argument("--tick", type=float, default=0.1)
+    parser.add_argument("--horizon", type=float, default=60)
+    parser.add_argument("--poll", type=float, default=5)
+    args = parser.parse_args()
+
+    add_ns, advance_us = wheel_ops()
+    print(f"timing wheel: add {add_ns:.0f} ns, advance one tick {advance_us:.1f} us (200 timers per tick)")
+
+    queue = MemoryReminderQueue()
+    baseline = rss_mib()
+    started = time.perf_counter()
+    fill(queue, args.pending, args.due, args.window, args.lead)
+    print(f"queued {args.pending + args.due} reminders in {time.perf_counter() - started:.1f}s, "
+          f"queue {rss_mib() - baseline:.0f} MiB")
+
+    scheduler = asyncio.run(run(args, queue))
+    late_ms = [late * 1000 for late in scheduler.late]
+    print(f"fired {len(late_ms)} of {args.due}; lateness p50 {percentile(late_ms, 0.5):.0f} ms, "
+          f"p99 {percentile(late_ms, 0.99):.0f} ms, max {max(late_ms):.0f} ms; early {sum(1 for l in late_ms if l < 0)}")
+    print(f"lease per poll: max {max(scheduler.load_seconds) * 1000:.0f} ms over {len(scheduler.load_seconds)} polls")
+    print(f"rss {rss_mib():.0f} MiB")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,67 @@
+import logging
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.semantic_cache import SemanticAnswerStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ENTRIES = 1_000_000
+TOPICS = 2_000
+SCOPES = ["Legal Agent", "Research Agent", "Contract Agent"]
+QUERIES = [
+    "quiero cancelar mi arrendamiento",
+    "me corrieron del trabajo sin liquidación",
+    "¿cuánto es la pensión alimenticia?",
+    "no me devuelven el depósito del departamento",
+    "¿cómo hago un testamento?",
+]
+
+
+def synthetic_vectors(store: SemanticAnswerStore, n: int) -> np.ndarray:
+    """Clustered unit vectors around real question embeddings, like a production corpus."""
+    rng = np.random.default_rng(42)
+    dim = store.embedder.dim
+    centers = rng.standard_normal((TOPICS, dim)).astype(np.float32)
+    centers[:len(QUERIES)] = store.embedder.embed_batch(QUERIES) * 4
+    vectors = centers[rng.integers(0, TOPICS, n)] + rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def bench():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SemanticAnswerStore(tmp, threshold=0.0)
+        store.answers_path.write_text('{"question": "q", "answer": "a", "scope": "Legal Agent"}\n')
+
+        vectors = synthetic_vectors(store, ENTRIES)
+        scopes = [SCOPES[i % len(SCOPES)] for i in range(ENTRIES)]
+        start = time.perf_counter()
+        # Every entry points at the single stored answer; only the search path is measured
+        store.write_index(vectors, scopes, np.zeros(ENTRIES, dtype=np.int64), indexed_bytes=0)
+        print(f"Built index of {ENTRIES} entries in {time.perf_counter() - start:.1f}s")
+
+        for query in QUERIES:
+            store.lookup(query, ["Legal Agent"])  # warm the page cache
+        timings = []
+        for _ in range(200):
+            for query in QUERIES:
+                start = time.perf_counter()
+                store.lookup(query, ["Legal Agent"])
+                timings.append((time.perf_counter() - start) * 1000)
+
+        timings = np.array(timings)
+        print(f"lookup latency over {len(timings)} queries: "
+              f"p50={np.percentile(timings, 50):.2f}ms p95={np.percentile(timings, 95):.2f}ms "
+              f"p99={np.percentile(timings, 99):.2f}ms max={timings.max():.2f}ms")
+
+
+if __name__ == "__main__":
+    bench()
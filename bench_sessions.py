@@ -0,0 +1,120 @@
+"""Memory of resident conversations: ConversationSession against lists of message dicts.
+
+    python bench_sessions.py --sessions 100000 --messages 10
+
+Builds `--sessions` conversations twice, once as the per-message dicts with
+ISO timestamp strings the webhook used to keep and once as
+ConversationSession objects, and reports the memory each takes (measured
+with tracemalloc) and the time to turn a history window into model input.
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, UTC
+
+from app.agents.context import ConversationSession
+
+QUESTIONS = [
+    "Mi arrendador no me quiere devolver el depósito, ¿qué hago?",
+    "Me despidieron sin liquidación después de 3 años",
+    "¿Qué cláusulas debe tener un contrato de prestación de servicios?",
+    "¿Cuáles son las reformas recientes a la Ley Federal del Trabajo?",
+]
+ANSWER = (
+    "De acuerdo con el artículo {n} del Código Civil, el arrendador debe devolver el depósito dentro de los "
+    "{days} días siguientes a la entrega del inmueble, salvo que existan daños o adeudos comprobables. "
+)
+
+
+def conversations(count: int, messages: int, seed: int = 7):
+    """(phone number, [(role, content, datetime)]) with distinct strings, as if each was read from the database."""
+    rng = random.Random(seed)
+    started = datetime(2025, 1, 1, tzinfo=UTC)
+    for i in range(count):
+        at = started + timedelta(minutes=i)
+        history = []
+        for j in range(messages):
+            if j % 2 == 0:
+                content = f"{rng.choice(QUESTIONS)} ({i}.{j})"
+            else:
+                content = ANSWER.format(n=rng.randint(1, 3000), days=rng.randint(5, 60)) * rng.randint(1, 3)
+            history.append(("user" if j % 2 == 0 else "assistant", content, at + timedelta(seconds=30 * j)))
+        yield f"+52155{i:08d}", history
+
+
+def as_dicts(count: int, messages: int):
+    return {
+        phone: {
+            "current_agent": None,
+            "conversation_history": [{"role": r, "content": c, "timestamp": t.isoformat()} for r, c, t in history],
+            "metadata": {}
+        }
+        for phone, history in conversations(count, messages)
+    }
+
+
+def as_sessions(count: int, messages: int):
+    sessions = {}
+    for phone, history in conversations(count, messages):
+        session = sessions[phone] = ConversationSession(phone)
+        for r, c, t in history:
+            session.add_message(r, c, t.timestamp())
+    return sessions
+
+
+def resident_bytes(build, count: int, messages: int):
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    data = build(count, messages)
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return data, used
+
+
+def input_items_from_dicts(conversation, window: int):
+    return [{"role": m["role"], "content": m["content"]} for m in conversation["conversation_history"][-window:]]
+
+
+def input_items_from_session(session: ConversationSession, window: int):
+    return list(session.get_recent_history(window).input_items())
+
+
+def time_per_call(fn, items, window: int) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(item, window)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Memory of resident sessions, dicts against ConversationSession.")
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--messages", type=int, default=10, help="messages per conversation")
+    parser.add_argument("--window", type=int, default=20, help="history window turned into model input")
+    args = parser.parse_args()
+
+    results = {}
+    for label, build, to_input in (
+        ("message dicts", as_dicts, input_items_from_dicts),
+        ("ConversationSession", as_sessions, input_items_from_session),
+    ):
+        data, used = resident_bytes(build, args.sessions, args.messages)
+        sample = list(data.values())[:10_000]
+        results[label] = used
+        print(f"{label:<20} {used / 2**20:8.1f} MiB  {used / args.sessions:7.0f} B/session  "
+              f"{used / (args.sessions * args.messages):5.0f} B/message  "
+              f"input items {time_per_call(to_input, sample, args.window):5.1f} us/turn")
+        del data, sample
+
+    content = sum(
+        len(c.encode("utf-8")) for _, history in conversations(args.sessions, args.messages) for _, c, _ in history
+    )
+    print(f"content alone        {content / 2**20:8.1f} MiB")
+    print(f"saved {1 - results['ConversationSession'] / results['message dicts']:.0%} of resident memory")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,192 @@
+"""Load test for the web chat channel: thousands of concurrent SSE streams on one process.
+
+    python bench_web_chat.py --streams 5000 --slow-fraction 0.1
+
+Starts one Hypercorn worker serving the web chat blueprint with a fake
+runner that streams a canned answer token by token (no OpenAI calls), opens
+`--streams` concurrent chat turns against it and reports time to first
+token, total turn time, and the server's event loop lag and memory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACbench")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "bench")
+os.environ.setdefault("DISABLE_TRACING", "true")
+os.environ.setdefault("ADMISSION_MESSAGES_PER_MINUTE", "1000000")
+os.environ.setdefault("WEB_CHAT_NEW_SESSIONS_PER_MINUTE", "1000000")
+
+ANSWER = (
+    "De acuerdo con la Ley Federal del Trabajo, en caso de despido injustificado tiene derecho a una "
+    "indemnización de tres meses de salario, veinte días por cada año de servicio y la prima de antigüedad. "
+) * 4
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class FakeStreamedResult:
+    def __init__(self, agent, token_interval: float):
+        self.last_agent = agent
+        self.final_output = ANSWER
+        self.raw_responses = []
+        self.token_interval = token_interval
+
+    async def stream_events(self):
+        from agents.stream_events import AgentUpdatedStreamEvent, RawResponsesStreamEvent
+        yield AgentUpdatedStreamEvent(new_agent=self.last_agent)
+        for word in ANSWER.split(" "):
+            await asyncio.sleep(self.token_interval)
+            yield RawResponsesStreamEvent(data=SimpleNamespace(type="response.output_text.delta", delta=word + " "))
+
+
+class FakeRunner:
+    def __init__(self, token_interval: float):
+        self.token_interval = token_interval
+
+    def run_streamed(self, agent, input, run_config=None):
+        return FakeStreamedResult(agent, self.token_interval)
+
+
+def serve(port: int, token_interval: float):
+    """Child process: the blueprint alone, under Hypercorn, reporting its stats on SIGTERM."""
+    from agents import Agent
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.config import Config as HypercornConfig
+    from quart import Quart
+
+    from app.api.web_chat import create_web_chat_blueprint
+    from app.services.container import build_services
+
+    raise_fd_limit()
+    app = Quart(__name__)
+    services = build_services(triage_agent=Agent(name="Legal Agent", model="fake"))
+    web_chat = create_web_chat_blueprint(services, FakeRunner(token_interval))
+    app.register_blueprint(web_chat)
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        stats = {"max_lag_ms": 0.0, "max_open_turns": 0}
+
+        async def monitor():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.05)
+                stats["max_lag_ms"] = max(stats["max_lag_ms"], (time.perf_counter() - started - 0.05) * 1000)
+                stats["max_open_turns"] = max(stats["max_open_turns"], len(web_chat.turns))
+
+        config = HypercornConfig()
+        config.bind = [f"127.0.0.1:{port}"]
+        config.backlog = 4096
+        config.accesslog = None
+        config.errorlog = None
+        monitor_task = asyncio.create_task(monitor())
+        print("ready", flush=True)
+        await hypercorn_serve(app, config, shutdown_trigger=stop.wait)
+        monitor_task.cancel()
+        stats["max_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(json.dumps(stats), flush=True)
+
+    asyncio.run(main())
+
+
+async def client(session, url: str, slow: bool, results: list):
+    started = time.perf_counter()
+    first_token = None
+    async with session.post(url, json={"message": "Me despidieron sin liquidación, ¿qué hago?"}) as response:
+        if response.status != 200:
+            results.append({"status": response.status})
+            return
+        events = 0
+        async for line in response.content:
+            if line.startswith(b"event: delta") and first_token is None:
+                first_token = time.perf_counter() - started
+            if line.startswith(b"event: "):
+                events += 1
+            if slow:
+                # A reader on a bad mobile link
+                await asyncio.sleep(0.05)
+    results.append({"status": 200, "first_token": first_token, "total": time.perf_counter() - started, "events": events})
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+async def run_clients(port: int, streams: int, slow_fraction: float, ramp_seconds: float):
+    import aiohttp
+
+    results = []
+    url = f"http://127.0.0.1:{port}/chat/stream"
+    slow_every = int(1 / slow_fraction) if slow_fraction > 0 else 0
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None)) as session:
+        tasks = []
+        for i in range(streams):
+            slow = bool(slow_every) and i % slow_every == 0
+            tasks.append(asyncio.create_task(client(session, url, slow, results)))
+            if ramp_seconds:
+                await asyncio.sleep(ramp_seconds / streams)
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    errors = [o for o in outcomes if isinstance(o, Exception)]
+    return results, errors
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Concurrent SSE streams against one web chat worker.")
+    parser.add_argument("--streams", type=int, default=2000)
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    parser.add_argument("--token-interval", type=float, default=0.02, help="seconds between fake tokens")
+    parser.add_argument("--ramp-seconds", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.token_interval)
+        return
+
+    raise_fd_limit()
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", "--port", str(args.port), "--token-interval", str(args.token_interval)],
+        stdout=subprocess.PIPE, text=True
+    )
+    try:
+        server.stdout.readline()
+        started = time.perf_counter()
+        results, errors = asyncio.run(run_clients(args.port, args.streams, args.slow_fraction, args.ramp_seconds))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        stats = json.loads(server.stdout.readline() or "{}")
+        server.wait()
+
+    ok = [r for r in results if r.get("status") == 200]
+    first = [r["first_token"] for r in ok if r["first_token"] is not None]
+    total = [r["total"] for r in ok]
+    print(f"{args.streams} streams ({args.slow_fraction:.0%} slow readers) in {elapsed:.1f}s: "
+          f"{len(ok)} completed, {len(results) - len(ok)} rejected, {len(errors)} failed")
+    print(f"time to first token  p50 {statistics.median(first) * 1000:.0f} ms  p99 {percentile(first, 0.99) * 1000:.0f} ms")
+    print(f"turn time            p50 {statistics.median(total):.2f} s  p99 {percentile(total, 0.99):.2f} s")
+    print(f"events per stream    min {min(r['events'] for r in ok)}  max {max(r['events'] for r in ok)}")
+    print(f"server: max open turns {stats.get('max_open_turns')}, max event loop lag {stats.get('max_lag_ms', 0):.0f} ms, "
+          f"peak RSS {stats.get('max_rss_mib', 0):.0f} MiB")
+
+
+if __name__ == "__main__":
+    bench()
@@ -1,4 +1,6 @@
 from app.app import app
+from app.config import Config
 
+# Development server; use `python -m app.server.launcher` in production
 if __name__ == "__main__":
-    app.run(debug=True, port=5001) 
\ No newline at end of file
+    app.run(debug=Config.DEBUG, port=Config.PORT)
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+
+from app.services.admission import AdmissionController, TokenBucket
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PHONE = "+5215512345678"
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(3, 2.0)
+    assert [bucket.consume() for _ in range(4)] == [True, True, True, False]
+
+    # Half a second later one token is back, and never more than the capacity
+    bucket.updated -= 0.5
+    assert bucket.consume()
+    assert not bucket.consume()
+    bucket.updated -= 60
+    assert [bucket.consume() for _ in range(4)] == [True, True, True, False]
+    logger.info("The token bucket refills at its rate up to its capacity")
+
+
+def test_bursts_are_rejected_and_notified_once():
+    async def scenario():
+        controller = AdmissionController(messages_per_minute=3, tokens_per_day=1000)
+        return [await controller.admit(PHONE) for _ in range(6)], await controller.admit("+5215587654321")
+
+    decisions, other = asyncio.run(scenario())
+    assert [d.allowed for d in decisions] == [True, True, True, False, False, False]
+    assert [d.reason for d in decisions[3:]] == ["rate"] * 3
+    assert [d.notify for d in decisions[3:]] == [True, False, False]
+    assert other.allowed
+    logger.info("Bursts are rejected and only the first rejection is answered")
+
+
+def test_daily_token_budget():
+    async def scenario():
+        controller = AdmissionController(messages_per_minute=60, tokens_per_day=1000)
+        first = await controller.admit(PHONE)
+        await controller.record_usage(PHONE, 600)
+        second = await controller.admit(PHONE)
+        await controller.record_usage(PHONE, 600)
+        over = await controller.admit(PHONE)
+
+        # A new day starts a new budget
+        controller._senders[PHONE].day = "2000-01-01"
+        next_day = await controller.admit(PHONE)
+        return first, second, over, next_day
+
+    first, second, over, next_day = asyncio.run(scenario())
+    assert first.allowed and second.allowed
+    assert (over.allowed, over.reason) == (False, "tokens")
+    assert next_day.allowed
+    logger.info("Senders are stopped once they spend their daily tokens")
+
+
+def test_allowlisted_senders_are_never_limited():
+    async def scenario():
+        controller = AdmissionController(messages_per_minute=1, tokens_per_day=10, allowlist=[PHONE])
+        await controller.record_usage(PHONE, 1000)
+        return [await controller.admit(PHONE) for _ in range(5)]
+
+    assert all(d.allowed for d in asyncio.run(scenario()))
+    logger.info("Allow-listed senders are never limited")
+
+
+if __name__ == "__main__":
+    test_token_bucket_refills_at_its_rate()
+    test_bursts_are_rejected_and_notified_once()
+    test_daily_token_budget()
+    test_allowlisted_senders_are_never_limited()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+from app.db.base import ALERTS_OPT_IN
+from app.db.memory_store import MemoryStore
+from app.services.broadcast import BroadcastEngine, _Progress
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+RECIPIENTS = 40
+
+
+class GatedSender:
+    """Sends instantly until `hold_after` messages went out, then waits until released."""
+
+    def __init__(self, hold_after: int = -1):
+        self.hold_after = hold_after
+        self.held = asyncio.Event()
+        self.release = asyncio.Event()
+        self.sent = []
+
+    async def send(self, to: str, body: str, content_sid=None, variables=None) -> str:
+        if len(self.sent) == self.hold_after:
+            self.held.set()
+            await self.release.wait()
+        self.sent.append((to, body))
+        return f"SM{len(self.sent)}"
+
+    async def close(self):
+        pass
+
+
+def audience() -> MemoryStore:
+    store = MemoryStore()
+    for i in range(RECIPIENTS):
+        store.update_conversation(f"+52155{i:08d}", "Legal Agent", metadata={ALERTS_OPT_IN: True, "name": f"Usuario {i}"})
+    # Not opted in
+    store.update_conversation("+5215599999999", "Legal Agent", metadata={"name": "Sin alertas"})
+    return store
+
+
+def test_checkpoint_never_skips_a_recipient_in_flight():
+    progress = _Progress({"cursor": "+0", "sent": 3})
+    first, second, third = progress.track("+1"), progress.track("+2"), progress.track("+3")
+
+    progress.done(second, sent=True)
+    progress.done(third, sent=False)
+    assert progress.cursor == "+0"
+
+    progress.done(first, sent=True)
+    checkpoint = progress.checkpoint()
+    assert checkpoint["cursor"] == "+3"
+    assert (checkpoint["sent"], checkpoint["failed"]) == (5, 1)
+    logger.info("The checkpoint only advances past finished recipients")
+
+
+def test_paused_broadcast_resumes_from_its_checkpoint():
+    async def scenario():
+        store = audience()
+        sender = GatedSender(hold_after=15)
+        engine = BroadcastEngine(store, sender, messages_per_second=0, concurrency=1, batch_size=8, checkpoint_seconds=60)
+        job = engine.create("Hola {name}", metadata={})
+
+        assert await engine.start(job["_id"])
+        await sender.held.wait()
+        assert await engine.pause(job["_id"])
+        await asyncio.gather(*engine._tasks.values())
+        paused = engine.get(job["_id"])
+        assert paused["status"] == "paused"
+        assert paused["sent"] == 15
+        assert paused["cursor"] == sender.sent[-1][0]
+
+        sender.release.set()
+        assert await engine.start(job["_id"])
+        await asyncio.gather(*engine._tasks.values())
+        return engine.get(job["_id"]), sender.sent
+
+    job, sent = asyncio.run(scenario())
+    assert job["status"] == "completed"
+    assert (job["sent"], job["failed"]) == (RECIPIENTS, 0)
+    assert [to for to, _ in sent] == [f"+52155{i:08d}" for i in range(RECIPIENTS)]
+    assert sent[7][1] == "Hola Usuario 7"
+    logger.info("A paused broadcast resumes where it stopped, sending each message once")
+
+
+def test_recipients_that_cannot_be_rendered_are_counted_as_failed():
+    async def scenario():
+        store = audience()
+        store.update_conversation("+5215500000003", metadata={ALERTS_OPT_IN: True, "name": 3})
+        sender = GatedSender()
+        engine = BroadcastEngine(store, sender, messages_per_second=0, concurrency=4, checkpoint_seconds=60)
+        job = engine.create("Hola {name:>10s}", metadata={})
+        await engine.start(job["_id"])
+        await asyncio.gather(*engine._tasks.values())
+        return engine.get(job["_id"]), sender.sent
+
+    job, sent = asyncio.run(scenario())
+    assert job["status"] == "completed"
+    assert (job["sent"], job["failed"]) == (RECIPIENTS - 1, 1)
+    assert "+5215500000003" not in {to for to, _ in sent}
+    logger.info("Recipients whose message cannot be rendered are counted as failed")
+
+
+if __name__ == "__main__":
+    test_checkpoint_never_skips_a_recipient_in_flight()
+    test_paused_broadcast_resumes_from_its_checkpoint()
+    test_recipients_that_cannot_be_rendered_are_counted_as_failed()
@@ -0,0 +1,233 @@
+import logging
+
+from app.db.cached_store import CachedStore
+from app.db.invalidation import ALL_CONVERSATIONS, LocalInvalidationChannel
+from app.db.memory_store import MemoryStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PHONE = "+5215512345678"
+OTHER_PHONE = "+5215587654321"
+MAX_BYTES = 1024 * 1024
+
+
+class RecordingChannel(LocalInvalidationChannel):
+    """Keeps the callbacks so a test can deliver invalidations from another worker."""
+
+    def __init__(self, fail_publish: bool = False):
+        super().__init__()
+        self.published = []
+        self.fail_publish = fail_publish
+        self.on_invalidate = None
+        self.on_reset = None
+
+    def publish(self, phone_number: str):
+        if self.fail_publish:
+            raise ConnectionError("invalidation feed unavailable")
+        self.published.append(phone_number)
+
+    def start(self, on_invalidate, on_reset):
+        self.on_invalidate = on_invalidate
+        self.on_reset = on_reset
+
+
+class InvalidatingStore(MemoryStore):
+    """A backend where another worker writes while this one is reading or appending."""
+
+    def __init__(self):
+        super().__init__()
+        self.during_read = None
+        self.during_append = None
+
+    def get_history_page(self, phone_number, before, limit):
+        page = super().get_history_page(phone_number, before, limit)
+        if self.during_read:
+            self.during_read(phone_number)
+        return page
+
+    def append_to_history(self, phone_number, role, content):
+        super().append_to_history(phone_number, role, content)
+        if self.during_append:
+            self.during_append(phone_number)
+
+
+def contents(messages) -> list:
+    return [message["content"] for message in messages]
+
+
+def page(store, phone_number: str, before, limit: int):
+    # The cache stamps appended messages itself, so timestamps may differ by a few microseconds
+    messages, start = store.get_history_page(phone_number, before, limit)
+    return [(message["role"], message["content"]) for message in messages], start
+
+
+def fill(store, phone_number: str, count: int, prefix: str = "message"):
+    for i in range(count):
+        store.append_to_history(phone_number, "user" if i % 2 == 0 else "assistant", f"{prefix} {i}")
+
+
+def test_appends_update_the_cached_window():
+    inner = MemoryStore()
+    fill(inner, PHONE, 12)
+    channel = RecordingChannel()
+    store = CachedStore(inner, channel, MAX_BYTES, window=5)
+
+    assert contents(store.get_conversation_history(PHONE, 5)) == [f"message {i}" for i in range(7, 12)]
+    assert (store.hits, store.misses) == (0, 1)
+
+    store.append_to_history(PHONE, "user", "follow-up")
+    assert contents(store.get_conversation_history(PHONE, 5)) == contents(inner.get_conversation_history(PHONE, 5))
+    assert (store.hits, store.misses) == (1, 1)
+    assert channel.published == [PHONE]
+
+    # More than the window is read from the backend
+    assert len(store.get_conversation_history(PHONE, 10)) == 10
+    assert page(store, PHONE, None, 3) == page(inner, PHONE, None, 3)
+    assert page(store, PHONE, 6, 3) == page(inner, PHONE, 6, 3)
+    logger.info("Appends update the cached window")
+
+
+def test_window_is_trimmed_as_it_grows():
+    inner = MemoryStore()
+    store = CachedStore(inner, RecordingChannel(), MAX_BYTES, window=3)
+    store.get_session(PHONE, 3)
+    fill(store, PHONE, 20)
+
+    session = store.get_session(PHONE, 3)
+    assert len(session) < 2 * 3
+    assert session.total == 20
+    assert contents(store.get_conversation_history(PHONE, 3)) == ["message 17", "message 18", "message 19"]
+    assert store.misses == 1
+    logger.info("Cached windows are trimmed")
+
+
+def test_remote_invalidation_drops_the_entry():
+    inner = MemoryStore()
+    channel = RecordingChannel()
+    store = CachedStore(inner, channel, MAX_BYTES, window=5)
+    fill(inner, PHONE, 3)
+    fill(inner, OTHER_PHONE, 3)
+    store.get_session(PHONE, 5)
+    store.get_session(OTHER_PHONE, 5)
+
+    # Another worker answers the user
+    inner.append_to_history(PHONE, "assistant", "from another worker")
+    channel.on_invalidate(PHONE)
+    assert contents(store.get_conversation_history(PHONE, 5))[-1] == "from another worker"
+    assert store.misses == 3
+
+    store.get_session(OTHER_PHONE, 5)
+    assert store.hits == 1
+    channel.on_invalidate(ALL_CONVERSATIONS)
+    assert store.stats()["entries"] == 0
+
+    store.get_session(PHONE, 5)
+    channel.on_reset()
+    assert store.stats()["entries"] == 0
+    logger.info("Remote invalidations drop cached entries")
+
+
+def test_read_racing_an_invalidation_is_not_cached():
+    inner = InvalidatingStore()
+    channel = RecordingChannel()
+    store = CachedStore(inner, channel, MAX_BYTES, window=5)
+    fill(inner, PHONE, 3)
+
+    inner.during_read = channel.on_invalidate
+    store.get_session(PHONE, 5)
+    assert store.stats()["entries"] == 0
+
+    inner.during_read = None
+    store.get_session(PHONE, 5)
+    assert store.stats()["entries"] == 1
+    logger.info("Reads that raced an invalidation are not cached")
+
+
+def test_append_racing_an_invalidation_drops_the_entry():
+    inner = InvalidatingStore()
+    channel = RecordingChannel()
+    store = CachedStore(inner, channel, MAX_BYTES, window=5)
+    fill(inner, PHONE, 3)
+    store.get_session(PHONE, 5)
+
+    def other_worker_writes(phone_number):
+        MemoryStore.append_to_history(inner, phone_number, "assistant", "from another worker")
+        channel.on_invalidate(phone_number)
+
+    inner.during_append = other_worker_writes
+    store.append_to_history(PHONE, "user", "mine")
+    inner.during_append = None
+    assert store.stats()["entries"] == 0
+    assert contents(store.get_conversation_history(PHONE, 5))[-2:] == ["mine", "from another worker"]
+    logger.info("Appends that raced an invalidation drop the cached window")
+
+
+def test_failed_publish_clears_the_cache():
+    inner = MemoryStore()
+    channel = RecordingChannel()
+    store = CachedStore(inner, channel, MAX_BYTES, window=5)
+    fill(store, PHONE, 3)
+    store.get_session(PHONE, 5)
+    store.get_session(OTHER_PHONE, 5)
+
+    channel.fail_publish = True
+    store.append_to_history(PHONE, "user", "unpublished")
+    assert store.stats()["entries"] == 0
+    assert contents(store.get_conversation_history(PHONE, 5))[-1] == "unpublished"
+    logger.info("A failed publish clears the cache")
+
+
+def test_least_recently_used_windows_are_evicted():
+    inner = MemoryStore()
+    for n in range(10):
+        fill(inner, f"+52155000000{n:02d}", 4, prefix="x" * 200)
+    one_window = CachedStore(inner, RecordingChannel(), MAX_BYTES, window=4)
+    one_window.get_session("+5215500000000", 4)
+    size = one_window.stats()["bytes"]
+
+    store = CachedStore(inner, RecordingChannel(), 3 * size, window=4)
+    for n in range(10):
+        store.get_session(f"+52155000000{n:02d}", 4)
+    stats = store.stats()
+    assert stats["entries"] == 3
+    assert stats["bytes"] <= 3 * size
+
+    store.get_session("+5215500000009", 4)
+    store.get_session("+5215500000000", 4)
+    assert store.hits == 1
+    assert store.misses == 11
+    logger.info("Windows are evicted least recently used first")
+
+
+def test_whole_conversations_are_cached_without_a_window():
+    inner = MemoryStore()
+    fill(inner, PHONE, 50)
+    store = CachedStore(inner, RecordingChannel(), MAX_BYTES, window=None)
+
+    assert contents(store.get_conversation_history(PHONE)) == [f"message {i}" for i in range(50)]
+    store.append_to_history(PHONE, "user", "follow-up")
+    history = store.get_conversation_history(PHONE)
+    assert len(history) == 51
+    assert contents(history) == contents(inner.get_conversation_history(PHONE))
+    assert page(store, PHONE, None, 10) == page(inner, PHONE, None, 10)
+    assert (store.hits, store.misses) == (2, 1)
+
+    # The cached session is a copy, not the backend's own
+    assert store.get_session(PHONE) is not inner.get_session(PHONE)
+    logger.info("Whole conversations are cached when no window is set")
+
+
+if __name__ == "__main__":
+    test_appends_update_the_cached_window()
+    test_window_is_trimmed_as_it_grows()
+    test_remote_invalidation_drops_the_entry()
+    test_read_racing_an_invalidation_is_not_cached()
+    test_append_racing_an_invalidation_drops_the_entry()
+    test_failed_publish_clears_the_cache()
+    test_least_recently_used_windows_are_evicted()
+    test_whole_conversations_are_cached_without_a_window()
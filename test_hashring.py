@@ -0,0 +1,63 @@
+import logging
+from collections import Counter
+
+from app.server.hashring import HashRing
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+KEYS = [f"+52155{i:08d}" for i in range(20_000)]
+WORKERS = [f"worker-{i}" for i in range(4)]
+
+
+def owners(ring: HashRing) -> dict:
+    return {key: ring.node_for(key) for key in KEYS}
+
+
+def test_keys_are_spread_over_the_nodes():
+    counts = Counter(owners(HashRing(WORKERS)).values())
+    assert set(counts) == set(WORKERS)
+    share = len(KEYS) / len(WORKERS)
+    assert all(0.7 * share < count < 1.3 * share for count in counts.values())
+    assert HashRing().node_for(KEYS[0]) is None
+    logger.info(f"Keys per node: {dict(counts)}")
+
+
+def test_placement_does_not_depend_on_the_order_nodes_were_added():
+    assert owners(HashRing(WORKERS)) == owners(HashRing(reversed(WORKERS)))
+    logger.info("Placement is the same whatever order nodes are added in")
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    ring = HashRing(WORKERS)
+    before = owners(ring)
+    ring.add("worker-4")
+    after = owners(ring)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == "worker-4" for key in moved)
+    assert 0.1 * len(KEYS) < len(moved) < 0.3 * len(KEYS)
+    logger.info(f"Adding a fifth node moved {len(moved) / len(KEYS):.0%} of keys")
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(WORKERS)
+    before = owners(ring)
+    ring.remove("worker-2")
+    after = owners(ring)
+    assert all(after[key] == before[key] for key in KEYS if before[key] != "worker-2")
+    assert "worker-2" not in after.values()
+
+    ring.add("worker-2")
+    assert owners(ring) == before
+    logger.info("Removing a node only moves the keys it owned")
+
+
+if __name__ == "__main__":
+    test_keys_are_spread_over_the_nodes()
+    test_placement_does_not_depend_on_the_order_nodes_were_added()
+    test_adding_a_node_only_moves_keys_to_it()
+    test_removing_a_node_only_moves_its_keys()
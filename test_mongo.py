@@ -1,5 +1,5 @@
 import logging
-from app.db.mongo_store import store
+from app.db import store
 
 # Configure logging
 logging.basicConfig(
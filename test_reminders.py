@@ -0,0 +1,78 @@
+import logging
+
+from app.services.reminders import TimingWheel
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Exact in binary, so tick boundaries are not blurred by rounding
+TICK = 0.25
+SLOTS = 8
+
+
+def test_timers_fire_on_their_tick_and_not_before():
+    wheel = TimingWheel(TICK, SLOTS, now=100.0)
+    wheel.add(100.5, "a")
+    wheel.add(100.4, "b")
+    wheel.add(100.1, "c")
+    assert len(wheel) == 3
+
+    assert wheel.advance(100.0) == []
+    assert wheel.advance(100.25) == ["c"]
+    assert wheel.advance(100.45) == []
+    assert sorted(wheel.advance(100.5)) == ["a", "b"]
+    assert len(wheel) == 0
+    logger.info("Timers fire on their tick")
+
+
+def test_overdue_timers_fire_on_the_next_advance():
+    wheel = TimingWheel(TICK, SLOTS, now=100.0)
+    wheel.advance(101.0)
+    wheel.add(99.0, "late")
+    assert wheel.advance(101.25) == ["late"]
+    logger.info("Overdue timers fire on the next advance")
+
+
+def test_timers_beyond_one_revolution_wait_for_their_round():
+    wheel = TimingWheel(TICK, SLOTS, now=100.0)
+    # Shares a bucket with 100.25 but is two revolutions later
+    wheel.add(100.25 + 2 * SLOTS * TICK, "far")
+    wheel.add(100.25, "near")
+    assert wheel.advance(100.25) == ["near"]
+    assert wheel.advance(100.25 + SLOTS * TICK) == []
+    assert wheel.advance(100.25 + 2 * SLOTS * TICK) == ["far"]
+    logger.info("Timers further than one revolution wait for their round")
+
+
+def test_long_pause_fires_everything_due():
+    wheel = TimingWheel(TICK, SLOTS, now=100.0)
+    due = [100.0 + i * 0.125 for i in range(40)]
+    for i, when in enumerate(due):
+        wheel.add(when, i)
+    fired = wheel.advance(103.0)
+    assert sorted(fired) == [i for i, when in enumerate(due) if when <= 103.0]
+    assert sorted(fired + wheel.advance(105.0)) == list(range(40))
+    assert wheel.advance(99.0) == []
+    logger.info("A long pause fires everything due")
+
+
+def test_drain_returns_waiting_timers():
+    wheel = TimingWheel(TICK, SLOTS, now=100.0)
+    for i in range(5):
+        wheel.add(101.0 + i, i)
+    assert sorted(wheel.drain()) == list(range(5))
+    assert len(wheel) == 0
+    assert wheel.advance(110.0) == []
+    logger.info("Draining hands back waiting timers")
+
+
+if __name__ == "__main__":
+    test_timers_fire_on_their_tick_and_not_before()
+    test_overdue_timers_fire_on_the_next_advance()
+    test_timers_beyond_one_revolution_wait_for_their_round()
+    test_long_pause_fires_everything_due()
+    test_drain_returns_waiting_timers()
@@ -0,0 +1,86 @@
+import logging
+import tempfile
+
+from app.config import Config
+from app.services.semantic_cache import SemanticAnswerStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SCOPE = "Legal Agent"
+
+# (cached question, new question, hashing-embedder similarity): questions that
+# must not share an answer although they score above the threshold
+DIFFERENT_QUESTIONS = [
+    ("¿cuánto tiempo tengo para demandar por despido?", "¿cuánto tiempo tengo para demandar por divorcio?", 0.775),
+    ("quiero terminar mi contrato de renta", "no quiero terminar mi contrato de renta", 0.83),
+    ("quiero cancelar mi arrendamiento", "mi arrendador quiere cancelar mi arrendamiento", 0.828),
+    ("¿cuánto es la pensión alimenticia?", "¿cuánto es la pensión alimenticia en Jalisco?", 0.896),
+]
+# A paraphrase that should be answered from the cache
+PARAPHRASE = ("quiero cancelar mi arrendamiento", "termino mi contrato de renta", 0.735)
+
+
+def approved_store(directory: str, question: str) -> SemanticAnswerStore:
+    store = SemanticAnswerStore(directory, threshold=Config.SEMANTIC_CACHE_THRESHOLD)
+    entry_id = store.propose(question, f"answer to: {question}", SCOPE)
+    assert store.review(entry_id, approved=True)
+    return store
+
+
+def score(store: SemanticAnswerStore, first: str, second: str) -> float:
+    return round(float(store.embedder.embed(first) @ store.embedder.embed(second)), 3)
+
+
+def test_proposed_answers_are_not_served():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SemanticAnswerStore(tmp, threshold=Config.SEMANTIC_CACHE_THRESHOLD)
+        question = "quiero cancelar mi arrendamiento"
+        entry_id = store.propose(question, "answer", SCOPE)
+        assert store.lookup(question, [SCOPE]) is None
+        assert [p["id"] for p in store.proposals()] == [entry_id]
+
+        assert store.review(entry_id, approved=False)
+        assert not store.review(entry_id, approved=True)
+        assert store.proposals() == []
+        assert store.lookup(question, [SCOPE]) is None
+
+        entry_id = store.propose(question, "answer", SCOPE)
+        assert store.review(entry_id, approved=True, answer="edited answer")
+        assert store.lookup(question, [SCOPE]).answer == "edited answer"
+        logger.info("Only approved answers are served")
+
+
+def test_different_questions_are_not_matched():
+    for cached, asked, expected in DIFFERENT_QUESTIONS:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = approved_store(tmp, cached)
+            similarity = score(store, cached, asked)
+            assert similarity == expected, (cached, asked, similarity)
+            assert similarity >= store.threshold
+            assert store.lookup(asked, [SCOPE]) is None, (cached, asked)
+            logger.info(f"Not matched at {similarity}: {cached!r} / {asked!r}")
+
+
+def test_paraphrase_is_matched():
+    cached, asked, expected = PARAPHRASE
+    with tempfile.TemporaryDirectory() as tmp:
+        store = approved_store(tmp, cached)
+        assert score(store, cached, asked) == expected
+        match = store.lookup(asked, [SCOPE])
+        assert match is not None and match.question == cached
+        # The index built by a rebuild applies the same check
+        store.rebuild()
+        assert store.lookup(asked, [SCOPE]) is not None
+        assert store.lookup(DIFFERENT_QUESTIONS[2][1], [SCOPE]) is None
+        logger.info(f"Matched paraphrase at {match.score:.3f}")
+
+
+if __name__ == "__main__":
+    test_proposed_answers_are_not_served()
+    test_different_questions_are_not_matched()
+    test_paraphrase_is_matched()
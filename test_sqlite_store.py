@@ -0,0 +1,81 @@
+import logging
+import os
+import tempfile
+
+from app.db.base import ALERTS_OPT_IN
+from app.db.sqlite_store import SQLiteStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PHONE = "+5215512345678"
+
+
+def contents(messages) -> list:
+    return [message["content"] for message in messages]
+
+
+def test_pages_walk_back_through_the_history():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, "test.db"))
+        for i in range(25):
+            store.append_to_history(PHONE, "user" if i % 2 == 0 else "assistant", f"message {i}")
+
+        messages, start = store.get_history_page(PHONE, None, 10)
+        assert (contents(messages), start) == ([f"message {i}" for i in range(15, 25)], 15)
+        messages, start = store.get_history_page(PHONE, start, 10)
+        assert (contents(messages), start) == ([f"message {i}" for i in range(5, 15)], 5)
+        messages, start = store.get_history_page(PHONE, start, 10)
+        assert (contents(messages), start) == ([f"message {i}" for i in range(5)], 0)
+        assert store.get_history_page(PHONE, 0, 10) == ([], 0)
+        assert store.get_history_page("+5215500000000", None, 10) == ([], 0)
+
+        assert contents(store.get_conversation_history(PHONE, 3)) == ["message 22", "message 23", "message 24"]
+        assert store.get_conversation_summary(PHONE)["message_count"] == 25
+        store.close()
+    logger.info("History pages walk back through the conversation")
+
+
+def test_positions_restart_when_the_history_is_replaced():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, "test.db"))
+        for i in range(5):
+            store.append_to_history(PHONE, "user", f"old {i}")
+
+        store.update_conversation(PHONE, conversation_history=[{"role": "user", "content": "kept"}])
+        store.append_to_history(PHONE, "assistant", "new")
+        messages, start = store.get_history_page(PHONE, None, 10)
+        assert (contents(messages), start) == (["kept", "new"], 0)
+
+        store.clear_conversation(PHONE)
+        store.append_to_history(PHONE, "user", "after clear")
+        assert store.get_history_page(PHONE, None, 10)[1] == 0
+        assert contents(store.get_conversation_history(PHONE)) == ["after clear"]
+        store.close()
+    logger.info("Positions restart when the history is replaced")
+
+
+def test_recipients_resume_after_a_phone_number():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, "test.db"))
+        for i in range(10):
+            agent = "Legal Agent" if i % 2 == 0 else "Contract Agent"
+            store.update_conversation(f"+52155{i:08d}", agent, metadata={ALERTS_OPT_IN: i != 4})
+
+        opted_in = {ALERTS_OPT_IN: True}
+        phones = [r["phone_number"] for r in store.iter_recipients("Legal Agent", opted_in, batch_size=2)]
+        assert phones == ["+5215500000000", "+5215500000002", "+5215500000006", "+5215500000008"]
+        after = [r["phone_number"] for r in store.iter_recipients("Legal Agent", opted_in, after=phones[1], batch_size=2)]
+        assert after == phones[2:]
+        store.close()
+    logger.info("Recipients are read in phone number order from a cursor")
+
+
+if __name__ == "__main__":
+    test_pages_walk_back_through_the_history()
+    test_positions_restart_when_the_history_is_replaced()
+    test_recipients_resume_after_a_phone_number()
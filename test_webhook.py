@@ -1,7 +1,7 @@
 import logging
 import asyncio
 from app.app import app, normalize_phone_number
-from app.db.mongo_store import store
+from app.db import store
 from werkzeug.datastructures import MultiDict
 
 # Configure logging